@@ -0,0 +1,1975 @@
+import flvfx as vfx  # VFX Script API, for FL <-> Python communication
+from dataclasses import dataclass
+from typing import Callable
+from functools import lru_cache
+from operator import attrgetter
+import random
+import math
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import deque, OrderedDict
+
+
+script_text = """Sharpend's Chain
+KeyMod -> Harmonizer -> Harp in a single script: every played note runs through the 3 stages in order,
+the same as 3 VFX Script instances linked in Patcher, with one control read per tick.
+The Harmonizer & Harp share one Key & Scale.
+----------------------------
+KeyMod / Harmonize / Harp: Enable/Disable a stage - a disabled stage passes its notes through.
+
+Transpose Semi: Note Pitch offset in Semitones.
+Transpose Oct: Note Pitch offset in Octaves.
+
+Enable: Enable Velocity Randomization.
+Mode: Velocity Randomization Mode: Absolute, Relative % or Relative +/-.
+Relative Above: Random Range for Velocity Above played Velocity.
+Relative Below: Random Range for Velocity Below played Velocity.
+Seed: Randomization Seed - the same seed repeats the same random velocities. 0 - Unseeded.
+
+Multiplier: Velocity Multiplier.
+Base Offset: Velocity Base Offset.
+
+Curve: Velocity Response Curve: Linear, Exponential, Logarithmic, S-Curve or Breakpoints.
+Amount: Strength of the Exponential, Logarithmic & S-Curve curves.
+Point 25% / Point 50% / Point 75%: Output Velocity at 25% / 50% / 75% played Velocity, for Breakpoints.
+
+Min: Velocity Minimum.
+Max: Velocity Maximum.
+
+Update Ticks: Ticks between following slides & pitch bend of the played notes. Higher is lighter on CPU.
+
+Voice: Enable/Disable A harmony voice.
+Transpose: Transpose Harmony voice by x Semitones.
+Velocity Multiplier: Multiplier of harmony voices' velocity.
+Strum: Defines time it takes for harmony voices to strum, by division of 1/16th notes.
+Voice Limit: Max harmony voices playing at once, across all played notes (0 - Unlimited).
+Steal: Which harmony voice is stopped once the Voice Limit is reached - Oldest, Quietest or Farthest from its played note.
+Chord Dedupe: Build the harmony of notes played together as one chord, dropping harmony notes that double each other or played notes.
+    The harmony comes in 1 tick after the played notes, once the whole chord has arrived, even with Strum at 0.
+
+Key: Key to quantize the harmony & Harp notes to.
+Scale: Scale to quantize the harmony & Harp notes to.
+
+Range Above: Randomization range of harmony note above played note.
+Range Below: Randomization range of harmony note below played note.
+Random Relative: Enable Randomization based on a range above/below played note.
+
+Min: Randomization minimum threshold for harmony note.
+Max: Randomization maximum threshold for harmony note.
+Random Min Max: Enable Randomization based on min/max thresholds.
+
+Seed: Randomization Seed - the same seed repeats the same random harmony. 0 - Unseeded.
+
+Time Base: Note length to determine the Harp Crescendo base length.
+Time Multiplier: Multiplier of Time Base to determine the Harp Crescendo length.
+Polyphony Safe: Ensure every note played only starts playing after the previous note finished.
+Timing Curve: Affect the timing relationship between notes. 0 - Linear | < 0 Logarithmic | > 0 Exponential.
+
+Harp Direction: Determines the Harp Crescendo direction.
+Velocity Multiplier: Velocity Multiplier of Harp notes.
+Lower Limit: Lowest MIDI note the harp will start from (0-126)
+Higher Limit: Highest MIDI note the harp will start from (1-127)
+Max Notes: Maximum notes per harp, thinned evenly across the sweep. 0 - Unlimited.
+Release Mode: What happens to harp notes that haven't played yet when the key is released.
+    Burst - play them all at once | Drop - skip them | Compress - play them in a short tail.
+"""
+
+
+class Group:
+    NAME: str
+
+class ChainGroup(Group):
+    NAME: str = "Chain"
+    KEYMOD: str = "KeyMod"
+    HARMONIZE: str = "Harmonize"
+    HARP: str = "Harp"
+
+class PitchGroup(Group):
+    NAME: str = "Pitch"
+    PITCH_SEMITONES: str = "Transpose Semi"
+    PITCH_OCTAVE: str = "Transpose Oct"
+
+class VelocityRandomGroup(Group):
+    NAME: str = "Velocity Randomization"
+    ENABLE_RANDOMIZATION: str = "Enable"
+    RANDOMIZE_RELATIVE_PERCENT: str = "Relative %"
+    RANDOMIZE_RELATIVE_OFFSET: str = "Relative +/-"
+    RANDOMIZE_ABSOLUTE: str = "Absolute"
+    RANDOMIZATION_MODE: str = "Mode"
+    RANDOMIZATION_MODE_OPTIONS = [
+        RANDOMIZE_ABSOLUTE,
+        RANDOMIZE_RELATIVE_PERCENT,
+        RANDOMIZE_RELATIVE_OFFSET
+    ]
+    RANDOM_RELATIVE_ABOVE: str = "Relative Above"
+    RANDOM_RELATIVE_BELOW: str = "Relative Below"
+    SEED: str = "Seed"
+
+class VelocityMultOffsetGroup(Group):
+    NAME: str = "Velocity Multiplier & Offset"
+    VELOCITY_MULTIPLIER: str = "Multiplier"
+    VELOCITY_BASE: str = "Base Offset"
+
+class VelocityCurveGroup(Group):
+    NAME: str = "Velocity Curve"
+    CURVE: str = "Curve"
+    CURVE_LINEAR: str = "Linear"
+    CURVE_EXPONENTIAL: str = "Exponential"
+    CURVE_LOGARITHMIC: str = "Logarithmic"
+    CURVE_S: str = "S-Curve"
+    CURVE_BREAKPOINTS: str = "Breakpoints"
+    CURVE_OPTIONS = [
+        CURVE_LINEAR,
+        CURVE_EXPONENTIAL,
+        CURVE_LOGARITHMIC,
+        CURVE_S,
+        CURVE_BREAKPOINTS
+    ]
+    AMOUNT: str = "Amount"
+    POINT_25: str = "Point 25%"
+    POINT_50: str = "Point 50%"
+    POINT_75: str = "Point 75%"
+
+class VelocityThresholdGroup(Group):
+    NAME: str = "Velocity Thresholds"
+    VELOCITY_MIN: str = "Min"
+    VELOCITY_MAX: str = "Max"
+
+class VoiceUpdateGroup(Group):
+    NAME: str = "Voice Update"
+    UPDATE_TICKS: str = "Update Ticks"
+
+class VoiceGroup(Group):
+    NAME: str = "Voices"
+    VOICE: str = "Voice"
+    TRANSPOSE: str = "Transpose"
+    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
+    STRUM: str = "Strum"
+    CHORD_DEDUPE: str = "Chord Dedupe"
+    VOICE_LIMIT: str = "Voice Limit"
+    STEAL_MODE: str = "Steal"
+
+class QuantizeGroup(Group):
+    NAME: str = "Quantize"
+    KEY: str = "Key"
+    SCALE: str = "Scale"
+
+class RandomRelativeGroup(Group):
+    NAME: str = "Random Relative"
+    RANDOM_RANGE_ABOVE: str = "Range Above"
+    RANDOM_RANGE_BELOW: str = "Range Below"
+
+class RandomMinMaxGroup(Group):
+    NAME: str = "Random Min Max"
+    RANDOM_MIN: str = "Min"
+    RANDOM_MAX: str = "Max"
+
+class RandomSeedGroup(Group):
+    NAME: str = "Random Seed"
+    SEED: str = "Seed"
+
+class TimeGroup(Group):
+    NAME: str = "Time"
+    TIME_BASE: str = "Time Base"
+    TIME_MULTIPLIER: str = "Time Multiplier"
+    POLYPHONY_SAFE: str = "Polyphony Safe"
+    TIMING_CURVE: str = "Timing Curve"
+
+class HarpSettingsGroup(Group):
+    NAME: str = "Harp Settings"
+    HARP_DIRECTION: str = "Harp Direction"
+    HARP_LOW_LIMIT: str = "Lower Limit"
+    HARP_HIGH_LIMIT: str = "Higher Limit"
+    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
+    MAX_NOTES: str = "Max Notes"
+    RELEASE_MODE: str = "Release Mode"
+
+
+class Groups:
+    CHAIN: ChainGroup = ChainGroup()
+    PITCH: PitchGroup = PitchGroup()
+    VELOCITY_RANDOM: VelocityRandomGroup = VelocityRandomGroup()
+    VELOCITY_MULT_OFFSET: VelocityMultOffsetGroup = VelocityMultOffsetGroup()
+    VELOCITY_CURVE: VelocityCurveGroup = VelocityCurveGroup()
+    VELOCITY_THRESHOLD: VelocityThresholdGroup = VelocityThresholdGroup()
+    VOICE_UPDATE: VoiceUpdateGroup = VoiceUpdateGroup()
+    VOICE: VoiceGroup = VoiceGroup()
+    QUANTIZE: QuantizeGroup = QuantizeGroup()
+    RANDOM_RELATIVE: RandomRelativeGroup = RandomRelativeGroup()
+    RANDOM_MIN_MAX: RandomMinMaxGroup = RandomMinMaxGroup()
+    RANDOM_SEED: RandomSeedGroup = RandomSeedGroup()
+    TIME: TimeGroup = TimeGroup()
+    HARP_SETTINGS: HarpSettingsGroup = HarpSettingsGroup()
+
+class Interface:
+    GROUPS: Groups = Groups()
+
+    SCALE_MAJOR = "Major"
+    SCALE_MINOR = "Minor"
+    SCALE_PENTATONIC_MAJOR = "Pentatonic Major"
+    SCALE_PENTATONIC_MINOR = "Pentatonic Minor"
+    SCALE_HIJAZ = "Hijaz"
+    SCALE_CHROMATIC = "Chromatic"
+
+    STEAL_OLDEST = "Oldest"
+    STEAL_QUIETEST = "Quietest"
+    STEAL_FARTHEST = "Farthest"
+
+    HARP_DIRECTION_UP: str = "Upwards"
+    HARP_DIRECTION_DOWN: str = "Downwards"
+    RELEASE_MODE_BURST: str = "Burst"
+    RELEASE_MODE_DROP: str = "Drop"
+    RELEASE_MODE_COMPRESS: str = "Compress"
+
+
+class Const:
+    CONTROL_POLL_TICKS: int = max(1, int(vfx.context.PPQ) // 16)  # Ticks between control change checks in onTick
+    VELOCITY_CURVE_RESOLUTION: int = 1024  # Velocity curve lookup table steps
+    RANDOM_BUFFER_SIZE: int = 256
+    NUM_OF_VOICES: int = 4
+    DEFAULT_TRANSPOSE_VALUES: tuple[int, ...] = (3, 7, 12, -12)
+    MIN_GAP = 3 * NUM_OF_VOICES
+    STRUM_MAX_LEN: int = vfx.context.PPQ * 4 * 32
+    STRUM_RELEASE_MULTIPLIER: int = vfx.context.PPQ / 16
+    UI_POLL_TICKS: int = max(1, int(vfx.context.PPQ) // 16) # Check UI constraints every 1/64th note
+    MAX_VOICE_LIMIT: int = 64
+    HARP_LEN: int = int(vfx.context.PPQ) // 4
+    VOICE_MAX_LEN: int = vfx.context.PPQ * 4 * 32
+    VOICE_POOL_SIZE: int = 512  # Max released voices kept for reuse, per voice type
+    DELAY_CURVE_CACHE_SIZE: int = 256
+    RELEASE_TAIL_LEN: int = max(1, int(vfx.context.PPQ) // 8)  # Length of the Compress release mode tail
+
+
+@dataclass
+class TimeDiv:
+    key: int
+    value: float
+
+class TimeDivisions:
+    divisions_dict = {
+        "1/32": TimeDiv(key=0, value=1/32),
+        "1/16": TimeDiv(key=1, value=1/16),
+        "1/8": TimeDiv(key=2, value=1/8),
+        "1/4": TimeDiv(key=3, value=1/4),
+        "1/2": TimeDiv(key=4, value=1/2),
+        "1 Bar": TimeDiv(key=5, value=1),
+        "2 Bars": TimeDiv(key=6, value=2),
+        "4 Bars": TimeDiv(key=7, value=4),
+    }
+    divisions_list_interface = [div for div in divisions_dict.keys()]
+    divisions_list = [div for div in divisions_dict.values()]
+
+
+@dataclass
+class HarpDir:
+    key: str
+    value: int
+
+
+class HarpDirection:
+    UP: HarpDir = HarpDir(key=Interface.HARP_DIRECTION_UP, value=0)
+    DOWN: HarpDir = HarpDir(key=Interface.HARP_DIRECTION_DOWN, value=1)
+    harp_direction_list = [UP, DOWN]
+    harp_direction_list_interface = [harp_direction.key for harp_direction in harp_direction_list]
+
+
+@dataclass
+class ReleaseMode:
+    key: str
+    value: int
+
+
+class ReleaseModes:
+    BURST: ReleaseMode = ReleaseMode(key=Interface.RELEASE_MODE_BURST, value=0)
+    DROP: ReleaseMode = ReleaseMode(key=Interface.RELEASE_MODE_DROP, value=1)
+    COMPRESS: ReleaseMode = ReleaseMode(key=Interface.RELEASE_MODE_COMPRESS, value=2)
+    release_modes_list = [BURST, DROP, COMPRESS]
+    release_modes_list_interface = [release_mode.key for release_mode in release_modes_list]
+
+@dataclass
+class Key:
+    key: str
+    value: int
+
+
+class Keys:
+    key_name_list = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+    keys_list: list[Key] = [Key(key=key, value=index) for index, key in enumerate(key_name_list)]
+    keys_list_interface = [key_obj.key for key_obj in keys_list]
+
+
+@dataclass
+class Scale:
+    key: str
+    value: list
+
+class Scales:
+    scales_dict = {
+        Interface.SCALE_MAJOR: Scale(key=Interface.SCALE_MAJOR, value=[1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1]),
+        Interface.SCALE_MINOR: Scale(key=Interface.SCALE_MINOR, value=[1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0]),
+        Interface.SCALE_PENTATONIC_MAJOR: Scale(key=Interface.SCALE_PENTATONIC_MAJOR, value=[1, 0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 0]),
+        Interface.SCALE_PENTATONIC_MINOR: Scale(key=Interface.SCALE_PENTATONIC_MINOR, value=[1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0]),
+        Interface.SCALE_HIJAZ: Scale(key=Interface.SCALE_HIJAZ, value=[1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 0]),
+        Interface.SCALE_CHROMATIC: Scale(key=Interface.SCALE_CHROMATIC, value=[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]),
+    }
+    scales_list_interface = [scale.key for scale in scales_dict.values()]
+    scales_list = [scale for scale in scales_dict.values()]
+
+
+class StealModes:
+    OLDEST = 0
+    QUIETEST = 1
+    FARTHEST = 2
+    steal_modes_list_interface = [Interface.STEAL_OLDEST, Interface.STEAL_QUIETEST, Interface.STEAL_FARTHEST]
+
+
+class ScaleQuantize:
+    """Quantize notes to key & scale through (key x scale) rows of a note lookup table.
+    Rows are built lazily on the first note in their key & scale, and dropped when the scale set changes.
+    Every (key x scale) also keeps its sorted distinct notes, so sweeps walk scale degrees only."""
+    NOTE_RANGE_LOW = -12  # Any lower note quantizes & limits to 0 anyway
+    NOTE_RANGE_HIGH = 143  # Any higher note quantizes & limits to 131 anyway
+
+    def __init__(self):
+        self.scales = Scales()
+        self.keys = Keys()
+
+        self.key_list = self.keys.keys_list
+        self.scale_list = self.scales.scales_list
+
+        self.key_list_interface = self.keys.keys_list_interface
+        self.scale_list_interface = self.scales.scales_list_interface
+
+        self.rows: list[list[int] | None] = []
+        self.scale_notes: list[tuple[int, ...] | None] = []
+        self.build_table()
+
+    def build_table(self):
+        """Reset the quantize table - call again whenever the scale set changes"""
+        self.scale_list = self.scales.scales_list
+        self.rows = [None] * (len(self.key_list) * len(self.scale_list))
+        self.scale_notes = [None] * len(self.rows)
+
+    def _build_row(self, key_index, scale_index) -> list[int]:
+        tonic = self.key_list[key_index].value
+        scale = self.scale_list[scale_index].value
+        row = [limit_note(self._calc_quantized_note(note, tonic, scale))
+               for note in range(self.NOTE_RANGE_LOW, self.NOTE_RANGE_HIGH + 1)]
+        self.rows[key_index * len(self.scale_list) + scale_index] = row
+        return row
+
+    @staticmethod
+    def _calc_quantized_note(note, tonic, scale):
+        degree = (note - tonic) % 12
+
+        if scale[degree] == 1:
+            return note
+        else:
+            i = 1
+            while scale[(degree + i) % 12] != 1:
+                i += 1
+            offset = i
+        return note + offset
+
+    def quantize_note(self, note, key_index, scale_index):
+        note = int(note)
+        if note < self.NOTE_RANGE_LOW:
+            note = self.NOTE_RANGE_LOW
+        elif note > self.NOTE_RANGE_HIGH:
+            note = self.NOTE_RANGE_HIGH
+        row = self.rows[key_index * len(self.scale_list) + scale_index]
+        if row is None:
+            row = self._build_row(key_index, scale_index)
+        return row[note - self.NOTE_RANGE_LOW]
+
+    def _get_scale_notes(self, key_index, scale_index) -> tuple[int, ...]:
+        """Sorted distinct quantized notes of the MIDI range (0 - 127) in a key & scale"""
+        row_index = key_index * len(self.scale_list) + scale_index
+        notes = self.scale_notes[row_index]
+        if notes is None:
+            row = self.rows[row_index] or self._build_row(key_index, scale_index)
+            notes = tuple(sorted(set(row[-self.NOTE_RANGE_LOW:128 - self.NOTE_RANGE_LOW])))
+            self.scale_notes[row_index] = notes
+        return notes
+
+    def get_sweep_notes(self, range_start, range_end, range_step, key_index, scale_index) -> list[int]:
+        """Distinct quantized notes of range(range_start, range_end, range_step), in sweep order"""
+        if range_step > 0:
+            low_note, high_note = range_start, range_end - 1
+        else:
+            low_note, high_note = range_end + 1, range_start
+        if low_note > high_note:
+            return []
+        notes = self._get_scale_notes(key_index, scale_index)
+        sweep = notes[bisect_left(notes, self.quantize_note(low_note, key_index, scale_index)):
+                      bisect_right(notes, self.quantize_note(high_note, key_index, scale_index))]
+        return list(sweep) if range_step > 0 else list(reversed(sweep))
+
+
+def limit_note(note: int):
+    """Make sure notes are never above 131(B10), or below 0(C0)"""
+    return max(0, min(note, 131))
+
+
+class Logger:
+    """Level-gated logger for the real-time callbacks. Messages are only formatted when their level is enabled,
+    and are kept in a bounded ring buffer that can be dumped to the script console with dump()."""
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    OFF = 100
+
+    def __init__(self, level: int = INFO, buffer_size: int = 256, echo: bool = False):
+        self.level = level
+        self.echo = echo  # Also print every kept message as it comes in
+        self.buffer: deque[str] = deque(maxlen=buffer_size)
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        self.buffer.append(message)
+        if self.echo:
+            print(message)
+
+    def debug(self, message: str, *args):
+        self.log(self.DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(self.INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(self.WARNING, message, *args)
+
+    def dump(self):
+        """Print & clear the buffered messages"""
+        while self.buffer:
+            print(self.buffer.popleft())
+
+
+log = Logger()  # Set log.level = Logger.DEBUG & log.echo = True to trace notes in the console
+
+
+def get_group_controller_str(group, name = ''):
+    """Get group controller string without acquiring value - for static definitions"""
+    name = name if name else group.NAME
+    return f"{group.NAME}: {name}"
+
+def get_group_controller(group, name = ''):
+    return vfx.context.form.getInputValue(get_group_controller_str(group, name))
+
+def set_group_controller(group, value, name = ''):
+    """Set group controller value"""
+    log.debug("set %s = %s", get_group_controller_str(group, name), value)
+    vfx.context.form.setNormalizedValue(get_group_controller_str(group, name), value)
+
+
+class RandomBuffer:
+    """Per-stage random source. Values are generated in batches into a buffer that onTick tops up,
+    so notes only read values out of it. A non-zero seed makes the sequence reproducible -
+    it starts over whenever the song position jumps back, so every playback from the start plays the same."""
+    def __init__(self, size: int = Const.RANDOM_BUFFER_SIZE):
+        self.size = size
+        self.seed = None
+        self._generator = random.Random()
+        self._values: deque[float] = deque()
+        self._song_tick = None
+
+    def set_seed(self, seed: int):
+        """Restart the sequence from seed (0 - unseeded), only when the seed changed"""
+        if seed == self.seed:
+            return
+        self.seed = seed
+        self.restart()
+
+    def restart(self):
+        """Start the sequence over from the seed - an unseeded source draws a new random seed"""
+        self._generator.seed(self.seed if self.seed else random.getrandbits(64))
+        self._values.clear()
+        self.refill()
+
+    def follow_transport(self, song_tick: int):
+        """Restart when the song position went back since the last tick, e.g. when playback restarts"""
+        if self._song_tick is not None and song_tick < self._song_tick:
+            self.restart()
+        self._song_tick = song_tick
+
+    def refill(self):
+        """Top the buffer up once it's half empty - call outside the note path"""
+        if len(self._values) <= self.size // 2:
+            generate = self._generator.random
+            self._values.extend([generate() for _ in range(self.size - len(self._values))])
+
+    def random(self) -> float:
+        if not self._values:
+            self.refill()
+        return self._values.popleft()
+
+    def uniform(self, a, b) -> float:
+        return a + (b - a) * self.random()
+
+    def _index(self, length: int) -> int:
+        return min(int(self.random() * length), length - 1)
+
+    def choice(self, values):
+        return values[self._index(len(values))]
+
+    def sample(self, population, k: int) -> list:
+        values = list(population)
+        for i in range(k):
+            j = i + self._index(len(values) - i)
+            values[i], values[j] = values[j], values[i]
+        return values[:k]
+
+
+keymod_random = RandomBuffer()  # Velocity randomization, seeded by the KeyMod Seed
+harmony_random = RandomBuffer()  # Random harmony notes, seeded by the Harmonizer Seed
+
+
+@dataclass(frozen=True, slots=True)
+class KeyModControls:
+    """Every control value a played note needs in the KeyMod stage"""
+    offset_semi: int
+    offset_oct: int
+    is_randomization_enabled: bool
+    randomization_mode: int
+    random_relative_above: float
+    random_relative_below: float
+    random_seed: int
+    velocity_multiplier: float
+    velocity_base: float
+    velocity_curve: int
+    velocity_curve_amount: float
+    velocity_curve_points: tuple[float, float, float]
+    velocity_min: float
+    velocity_max: float
+    update_ticks: int
+
+
+KEYMOD_CONTROL_KEYS = (
+    get_group_controller_str(PitchGroup, PitchGroup.PITCH_SEMITONES),
+    get_group_controller_str(PitchGroup, PitchGroup.PITCH_OCTAVE),
+    get_group_controller_str(VelocityRandomGroup, VelocityRandomGroup.ENABLE_RANDOMIZATION),
+    get_group_controller_str(VelocityRandomGroup, VelocityRandomGroup.RANDOMIZATION_MODE),
+    get_group_controller_str(VelocityRandomGroup, VelocityRandomGroup.RANDOM_RELATIVE_ABOVE),
+    get_group_controller_str(VelocityRandomGroup, VelocityRandomGroup.RANDOM_RELATIVE_BELOW),
+    get_group_controller_str(VelocityRandomGroup, VelocityRandomGroup.SEED),
+    get_group_controller_str(VelocityMultOffsetGroup, VelocityMultOffsetGroup.VELOCITY_MULTIPLIER),
+    get_group_controller_str(VelocityMultOffsetGroup, VelocityMultOffsetGroup.VELOCITY_BASE),
+    get_group_controller_str(VelocityCurveGroup, VelocityCurveGroup.CURVE),
+    get_group_controller_str(VelocityCurveGroup, VelocityCurveGroup.AMOUNT),
+    get_group_controller_str(VelocityCurveGroup, VelocityCurveGroup.POINT_25),
+    get_group_controller_str(VelocityCurveGroup, VelocityCurveGroup.POINT_50),
+    get_group_controller_str(VelocityCurveGroup, VelocityCurveGroup.POINT_75),
+    get_group_controller_str(VelocityThresholdGroup, VelocityThresholdGroup.VELOCITY_MIN),
+    get_group_controller_str(VelocityThresholdGroup, VelocityThresholdGroup.VELOCITY_MAX),
+    get_group_controller_str(VoiceUpdateGroup, VoiceUpdateGroup.UPDATE_TICKS),
+)
+
+
+def build_keymod_controls(values: tuple) -> KeyModControls:
+    """Build the KeyMod controls from values read in KEYMOD_CONTROL_KEYS order"""
+    (offset_semi, offset_oct, is_randomization_enabled, randomization_mode, random_relative_above,
+     random_relative_below, random_seed, velocity_multiplier, velocity_base, velocity_curve, velocity_curve_amount,
+     point_25, point_50, point_75, velocity_min, velocity_max, update_ticks) = values
+    return KeyModControls(offset_semi=offset_semi,
+                          offset_oct=offset_oct,
+                          is_randomization_enabled=bool(is_randomization_enabled),
+                          randomization_mode=randomization_mode,
+                          random_relative_above=random_relative_above / 100,
+                          random_relative_below=random_relative_below / 100,
+                          random_seed=int(random_seed),
+                          velocity_multiplier=velocity_multiplier,
+                          velocity_base=velocity_base,
+                          velocity_curve=velocity_curve,
+                          velocity_curve_amount=velocity_curve_amount,
+                          velocity_curve_points=(point_25, point_50, point_75),
+                          velocity_min=velocity_min,
+                          velocity_max=velocity_max,
+                          update_ticks=max(int(update_ticks), 1))
+
+
+class VelocityRandomService:
+    """Velocity randomization, with the mode & ranges resolved once per control change"""
+    def __init__(self, controls: KeyModControls):
+        self._min_velocity = controls.velocity_min
+        self._max_velocity = controls.velocity_max
+        self._above_range = controls.random_relative_above
+        self._below_range = controls.random_relative_below
+        self._randomization_type = VelocityRandomGroup.RANDOMIZATION_MODE_OPTIONS[controls.randomization_mode]
+        log.debug("velocity randomization: %s", self._randomization_type)
+        self.randomize_velocity = self._determine_strategy()
+
+    def _determine_strategy(self):
+        if self._randomization_type == VelocityRandomGroup.RANDOMIZE_ABSOLUTE:
+            return self._randomize_absolute
+        elif self._randomization_type == VelocityRandomGroup.RANDOMIZE_RELATIVE_PERCENT:
+            return self._randomize_relative_percent
+        elif self._randomization_type == VelocityRandomGroup.RANDOMIZE_RELATIVE_OFFSET:
+            return self._randomize_relative_offset
+        else:
+            raise KeyError('Non existing relative random range!')
+
+    def _randomize_absolute(self, velocity):
+        return keymod_random.uniform(self._min_velocity, self._max_velocity)
+
+    @staticmethod
+    def _get_relative_direction(above, below):
+        go_above = True
+        if above > 0 and below > 0:  # both ranges are enabled
+            go_above = keymod_random.choice([True, False])  # choose whether to go above or below played velocity
+        else:  # only 1 range is enabled
+            if above > 0:
+                go_above = True
+            elif below > 0:
+                go_above = False
+        return go_above
+
+    def _get_relative_jitter(self):
+        """Random step above (positive) or below (negative) the played velocity"""
+        below = keymod_random.uniform(0, self._below_range)
+        above = keymod_random.uniform(0, self._above_range)
+        return above if self._get_relative_direction(above, below) else -below
+
+    def _randomize_relative_percent(self, velocity):
+        return velocity * (1 + self._get_relative_jitter())
+
+    def _randomize_relative_offset(self, velocity):
+        return velocity + self._get_relative_jitter()
+
+
+class VelocityCurve:
+    """Velocity response curve, evaluated once into a lookup table of Const.VELOCITY_CURVE_RESOLUTION steps
+    over played velocities 0 - 1"""
+    def __init__(self, curve: str, amount: float, points: tuple[float, float, float]):
+        self.curve = curve
+        self.amount = amount
+        self.points = points
+        curve_function = self._get_curve_function()
+        resolution = Const.VELOCITY_CURVE_RESOLUTION
+        self.table = tuple(curve_function(step / resolution) for step in range(resolution + 1))
+
+    def _get_curve_function(self):
+        exponent = 1 + 3 * self.amount
+        if self.curve == VelocityCurveGroup.CURVE_EXPONENTIAL:
+            return lambda x: x ** exponent
+        elif self.curve == VelocityCurveGroup.CURVE_LOGARITHMIC:
+            return lambda x: 1 - (1 - x) ** exponent
+        elif self.curve == VelocityCurveGroup.CURVE_S:
+            return lambda x: x + self.amount * (x * x * (3 - 2 * x) - x)  # Blend towards smoothstep
+        elif self.curve == VelocityCurveGroup.CURVE_BREAKPOINTS:
+            return self._interpolate_breakpoints
+        else:
+            raise KeyError('Non existing velocity curve!')
+
+    def _interpolate_breakpoints(self, x):
+        breakpoints = (0, *self.points, 1)
+        segment = min(int(x * 4), 3)
+        position = x * 4 - segment
+        return breakpoints[segment] + (breakpoints[segment + 1] - breakpoints[segment]) * position
+
+    def apply(self, velocity):
+        step = int(velocity * Const.VELOCITY_CURVE_RESOLUTION + 0.5)
+        if step < 0:
+            step = 0
+        elif step > Const.VELOCITY_CURVE_RESOLUTION:
+            step = Const.VELOCITY_CURVE_RESOLUTION
+        return self.table[step]
+
+
+@lru_cache(maxsize=8)
+def get_velocity_curve(curve_index: int, amount: float, points: tuple[float, float, float]) -> VelocityCurve | None:
+    """Velocity curve by its controls - None for linear. Tables are kept, so only curve changes rebuild one"""
+    curve = VelocityCurveGroup.CURVE_OPTIONS[curve_index]
+    if curve == VelocityCurveGroup.CURVE_LINEAR:
+        return None
+    return VelocityCurve(curve, amount, points)
+
+
+class KeyModTransform:
+    """Note & velocity modification compiled from the KeyMod controls - a 128-entry note map, and the
+    velocity stages resolved to constants. Rebuilt only when a control changes."""
+    def __init__(self, controls: KeyModControls):
+        self.controls = controls
+        self._note_offset = controls.offset_semi + (controls.offset_oct * 12)
+        self.note_map = tuple(min(max(note + self._note_offset, 0), 127) for note in range(128))
+        self.random_service = VelocityRandomService(controls) if controls.is_randomization_enabled else None
+        self._multiplier = controls.velocity_multiplier
+        self._base = controls.velocity_base
+        self.velocity_curve = get_velocity_curve(controls.velocity_curve, controls.velocity_curve_amount,
+                                                 controls.velocity_curve_points)
+        self._min_velocity = controls.velocity_min
+        self._max_velocity = controls.velocity_max
+
+    def modify_note(self, note):
+        """Whole MIDI notes go through the note map, fractional & out of range notes keep the plain arithmetic"""
+        whole_note = int(note)
+        if whole_note == note and 0 <= whole_note <= 127:
+            return self.note_map[whole_note]
+        note += self._note_offset
+        return 0 if note < 0 else 127 if note > 127 else note
+
+    def modify_velocity(self, velocity) -> float:
+        """Modify velocity according to user params"""
+        if self.random_service is not None:
+            velocity = self.random_service.randomize_velocity(velocity)
+        if self.velocity_curve is not None:
+            velocity = self.velocity_curve.apply(velocity)
+        velocity = velocity * self._multiplier + self._base
+        velocity = self._min_velocity if velocity < self._min_velocity else velocity
+        return self._max_velocity if velocity > self._max_velocity else velocity
+
+
+@dataclass(frozen=True, slots=True)
+class HarmonyControls:
+    """Every control value a played note needs in the Harmonize stage"""
+    active_voices: int
+    transposes: tuple[int, ...]
+    velocity_multiplier: float
+    strum_delay: int
+    is_chord_dedupe: bool
+    voice_limit: int
+    steal_mode: int
+    key: int
+    scale: int
+    is_random_relative: bool
+    is_random_min_max: bool
+    random_range_above: int
+    random_range_below: int
+    random_min: int
+    random_max: int
+    random_seed: int
+
+    @property
+    def is_strum_enabled(self) -> bool:
+        return bool(self.strum_delay)
+
+    @property
+    def is_random_enabled(self) -> bool:
+        return self.is_random_relative or self.is_random_min_max
+
+
+HARMONY_CONTROL_KEYS = (
+    *[get_group_controller_str(VoiceGroup, f"{VoiceGroup.VOICE} {i}") for i in range(1, Const.NUM_OF_VOICES + 1)],
+    *[get_group_controller_str(VoiceGroup, f"{VoiceGroup.TRANSPOSE} {i}") for i in range(1, Const.NUM_OF_VOICES + 1)],
+    get_group_controller_str(VoiceGroup, VoiceGroup.VELOCITY_MULTIPLIER),
+    get_group_controller_str(VoiceGroup, VoiceGroup.STRUM),
+    get_group_controller_str(VoiceGroup, VoiceGroup.CHORD_DEDUPE),
+    get_group_controller_str(VoiceGroup, VoiceGroup.VOICE_LIMIT),
+    get_group_controller_str(VoiceGroup, VoiceGroup.STEAL_MODE),
+    get_group_controller_str(QuantizeGroup, QuantizeGroup.KEY),
+    get_group_controller_str(QuantizeGroup, QuantizeGroup.SCALE),
+    get_group_controller_str(RandomRelativeGroup),
+    get_group_controller_str(RandomMinMaxGroup),
+    get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE),
+    get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW),
+    get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN),
+    get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX),
+    get_group_controller_str(RandomSeedGroup, RandomSeedGroup.SEED),
+)
+
+
+def build_harmony_controls(values: tuple) -> HarmonyControls:
+    """Build the Harmonize controls from values read in HARMONY_CONTROL_KEYS order"""
+    voices_enabled = values[:Const.NUM_OF_VOICES]
+    transposes = values[Const.NUM_OF_VOICES:2 * Const.NUM_OF_VOICES]
+    (velocity_multiplier, strum_delay, is_chord_dedupe, voice_limit, steal_mode, key, scale, is_random_relative, is_random_min_max,
+     random_range_above, random_range_below, random_min, random_max, random_seed) = values[2 * Const.NUM_OF_VOICES:]
+    return HarmonyControls(active_voices=sum(1 for enabled in voices_enabled if enabled),
+                           transposes=tuple(transposes),
+                           velocity_multiplier=velocity_multiplier,
+                           strum_delay=strum_delay,
+                           is_chord_dedupe=bool(is_chord_dedupe),
+                           voice_limit=voice_limit,
+                           steal_mode=steal_mode,
+                           key=key,
+                           scale=scale,
+                           is_random_relative=bool(is_random_relative),
+                           is_random_min_max=bool(is_random_min_max),
+                           random_range_above=random_range_above,
+                           random_range_below=random_range_below,
+                           random_min=random_min,
+                           random_max=random_max,
+                           random_seed=int(random_seed))
+
+
+@dataclass(frozen=True, slots=True)
+class HarpControls:
+    """Every control value a played note needs in the Harp stage"""
+    key: int
+    scale: int
+    velocity_multiplier: float
+    direction: int
+    harp_low_limit: int
+    harp_high_limit: int
+    max_notes: int
+    release_mode: int
+    timing_curve: float
+    time_base: float
+    time_multiplier: int
+    is_polyphony_safe: int
+
+
+HARP_CONTROL_KEYS = (
+    get_group_controller_str(QuantizeGroup, QuantizeGroup.KEY),
+    get_group_controller_str(QuantizeGroup, QuantizeGroup.SCALE),
+    get_group_controller_str(HarpSettingsGroup, HarpSettingsGroup.VELOCITY_MULTIPLIER),
+    get_group_controller_str(HarpSettingsGroup, HarpSettingsGroup.HARP_DIRECTION),
+    get_group_controller_str(HarpSettingsGroup, HarpSettingsGroup.HARP_LOW_LIMIT),
+    get_group_controller_str(HarpSettingsGroup, HarpSettingsGroup.HARP_HIGH_LIMIT),
+    get_group_controller_str(HarpSettingsGroup, HarpSettingsGroup.MAX_NOTES),
+    get_group_controller_str(HarpSettingsGroup, HarpSettingsGroup.RELEASE_MODE),
+    get_group_controller_str(TimeGroup, TimeGroup.TIMING_CURVE),
+    get_group_controller_str(TimeGroup, TimeGroup.TIME_BASE),
+    get_group_controller_str(TimeGroup, TimeGroup.TIME_MULTIPLIER),
+    get_group_controller_str(TimeGroup, TimeGroup.POLYPHONY_SAFE),
+)
+
+
+def build_harp_controls(values: tuple) -> HarpControls:
+    """Build the Harp controls from values read in HARP_CONTROL_KEYS order"""
+    (key, scale, velocity_multiplier, direction, harp_low_limit, harp_high_limit, max_notes,
+     release_mode, timing_curve, time_base, time_multiplier, is_polyphony_safe) = values
+    return HarpControls(key=key,
+                        scale=scale,
+                        velocity_multiplier=velocity_multiplier,
+                        direction=direction,
+                        harp_low_limit=harp_low_limit,
+                        harp_high_limit=harp_high_limit,
+                        max_notes=int(max_notes),
+                        release_mode=int(release_mode),
+                        timing_curve=timing_curve,
+                        time_base=TimeDivisions.divisions_list[int(time_base)].value,
+                        time_multiplier=time_multiplier,
+                        is_polyphony_safe=is_polyphony_safe)
+
+
+@dataclass(frozen=True, slots=True)
+class ChainControls:
+    """Every control value of the chain, read from the form in one pass"""
+    enabled_stages: tuple[bool, bool, bool]  # KeyMod, Harmonize, Harp
+    keymod_transform: KeyModTransform
+    harmony: HarmonyControls
+    harp: HarpControls
+
+
+CHAIN_STAGE_KEYS = (
+    get_group_controller_str(ChainGroup, ChainGroup.KEYMOD),
+    get_group_controller_str(ChainGroup, ChainGroup.HARMONIZE),
+    get_group_controller_str(ChainGroup, ChainGroup.HARP),
+)
+CHAIN_CONTROL_KEYS = CHAIN_STAGE_KEYS + KEYMOD_CONTROL_KEYS + HARMONY_CONTROL_KEYS + HARP_CONTROL_KEYS
+
+
+def build_chain_controls(values: tuple) -> ChainControls:
+    """Build the controls snapshot from values read in CHAIN_CONTROL_KEYS order"""
+    keymod_start = len(CHAIN_STAGE_KEYS)
+    harmony_start = keymod_start + len(KEYMOD_CONTROL_KEYS)
+    harp_start = harmony_start + len(HARMONY_CONTROL_KEYS)
+    return ChainControls(enabled_stages=tuple(bool(enabled) for enabled in values[:keymod_start]),
+                         keymod_transform=KeyModTransform(build_keymod_controls(values[keymod_start:harmony_start])),
+                         harmony=build_harmony_controls(values[harmony_start:harp_start]),
+                         harp=build_harp_controls(values[harp_start:]))
+
+
+class ControlSnapshotService:
+    """Read the controls through precomputed keys at most once per tick, and rebuild the snapshot only when a
+    control actually changed. The version goes up on every rebuild."""
+    def __init__(self, control_keys: tuple[str, ...], build_snapshot):
+        self.control_keys = control_keys
+        self.build_snapshot = build_snapshot
+        self.version = 0
+        self.snapshot = None
+        self._values: tuple = ()
+        self._read_tick = None
+
+    def invalidate(self):
+        """Read the controls again on the next snapshot, even within the same tick"""
+        self._read_tick = None
+
+    def get_snapshot(self, tick: int):
+        if tick != self._read_tick:
+            self._read_tick = tick
+            get_input_value = vfx.context.form.getInputValue
+            values = tuple([get_input_value(control_key) for control_key in self.control_keys])
+            if values != self._values:
+                self._values = values
+                self.snapshot = self.build_snapshot(values)
+                self.version += 1
+        return self.snapshot
+
+
+controls_service = ControlSnapshotService(CHAIN_CONTROL_KEYS, build_chain_controls)
+
+
+class RoutedVoice(vfx.Voice):
+    """Script voice played into the next enabled stage, or out to FL after the last one.
+    next_stage is set as the voice is created, so a release always goes where its trigger went."""
+    next_stage = None
+
+    def trigger(self):
+        if self.next_stage is None:
+            vfx.Voice.trigger(self)
+        else:
+            self.next_stage.on_trigger_voice(self)
+
+    def release(self):
+        if self.next_stage is None:
+            vfx.Voice.release(self)
+        else:
+            self.next_stage.on_release_voice(self)
+
+
+@dataclass(slots=True)
+class VoiceState:
+    """Fixed-layout scheduling state of a script voice, reset whenever the voice is recycled"""
+    parent_voice: object = None
+    trigger_tick: int = None
+    release_tick: int = None
+    triggered: bool = False
+    released: bool = False
+    generation: int = 0
+
+    def reset(self, parent_voice):
+        self.parent_voice = parent_voice
+        self.trigger_tick = None
+        self.release_tick = None
+        self.triggered = False
+        self.released = False
+        self.generation += 1
+
+
+class BaseVoice(RoutedVoice):
+    state: VoiceState = None
+
+    @property
+    def parent_voice(self):
+        return self.state.parent_voice
+
+    def reset(self, parent_voice):
+        """Reset the per-note state, for a new or a recycled voice"""
+        if self.state is None:
+            self.state = VoiceState()
+        self.state.reset(parent_voice)
+
+class HarmonyMainVoice(BaseVoice):
+    pass
+
+
+class HarmonyVoice(BaseVoice):
+    delay = 0
+    repeat = 0
+
+    def reset(self, parent_voice):
+        super().reset(parent_voice)
+        self.delay = 0
+        self.repeat = 0
+
+class HarpMainVoice(BaseVoice):
+    pass
+
+
+class HarpVoice(BaseVoice):
+    pass
+
+
+class VoicePool:
+    """Recycle released script voices instead of allocating new ones for every note"""
+    def __init__(self, max_size: int = Const.VOICE_POOL_SIZE):
+        self.max_size = max_size
+        self._free: dict[type, list[BaseVoice]] = {}
+
+    def acquire(self, voice_class: type, source_voice: vfx.Voice, parent_voice: vfx.Voice,
+                next_stage=None) -> BaseVoice:
+        free_voices = self._free.get(voice_class)
+        voice = free_voices.pop() if free_voices else voice_class()
+        voice.copyFrom(source_voice)
+        voice.reset(parent_voice)
+        voice.next_stage = next_stage
+        return voice
+
+    def recycle(self, voice: BaseVoice):
+        if voice.next_stage is not None:
+            return  # The next stage keys its own voices on this one's id() until they end, so it's never reused
+        free_voices = self._free.setdefault(type(voice), [])
+        if len(free_voices) < self.max_size:
+            free_voices.append(voice)
+
+
+class VoiceRegistry:
+    """Index script voices by their parent voice, so triggers & releases only touch that note's own voices.
+    Voices are keyed by id(), keeping add & remove O(1)."""
+    def __init__(self):
+        self._children: dict[int, dict[int, RoutedVoice]] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for children in self._children.values():
+            yield from children.values()
+
+    def add(self, voice: RoutedVoice):
+        children = self._children.setdefault(id(voice.parent_voice), {})
+        if id(voice) not in children:
+            children[id(voice)] = voice
+            self._count += 1
+
+    def remove(self, voice: RoutedVoice):
+        parent_id = id(voice.parent_voice)
+        children = self._children.get(parent_id)
+        if children is not None and children.pop(id(voice), None) is not None:
+            self._count -= 1
+            if not children:
+                del self._children[parent_id]
+
+    def get_children(self, parent_voice) -> list[RoutedVoice]:
+        children = self._children.get(id(parent_voice))
+        return list(children.values()) if children else []
+
+    def pop_children(self, parent_voice) -> list[RoutedVoice]:
+        children = self._children.pop(id(parent_voice), None)
+        if not children:
+            return []
+        self._count -= len(children)
+        return list(children.values())
+
+
+class VoiceScheduler:
+    """Min-heap of voice triggers & releases by absolute due tick, so onTick only handles the events that are due.
+    Rescheduling or cancelling a voice just moves its due tick - stale heap entries are skipped once popped."""
+    TRIGGER = 0  # Triggers sort before releases due on the same tick
+    RELEASE = 1
+    COMPACT_MIN_EVENTS = 64
+
+    def __init__(self):
+        self.tick = 0
+        self._events: list[tuple] = []
+        self._event_count = 0
+        self._live_events = 0
+
+    def _get_due_tick(self, delay) -> int:
+        """Countdown in ticks -> absolute tick it runs out on, which is never earlier than the next tick"""
+        return self.tick + max(math.ceil(delay), 1)
+
+    def _push(self, due_tick: int, event: int, voice: BaseVoice):
+        self._event_count += 1
+        self._live_events += 1
+        heapq.heappush(self._events, (due_tick, event, self._event_count, voice, voice.state.generation))
+
+    def schedule(self, voice: BaseVoice, trigger_delay, release_delay):
+        state = voice.state
+        state.trigger_tick = self._get_due_tick(trigger_delay)
+        state.release_tick = self._get_due_tick(release_delay)
+        self._push(state.trigger_tick, self.TRIGGER, voice)
+        self._push(state.release_tick, self.RELEASE, voice)
+
+    def reschedule(self, voice: BaseVoice, trigger_delay, release_delay):
+        self.cancel(voice)
+        self.schedule(voice, trigger_delay, release_delay)
+
+    def reschedule_release(self, voice: BaseVoice, release_delay):
+        state = voice.state
+        if state.release_tick is not None and not state.released:
+            self._live_events -= 1
+        state.release_tick = self._get_due_tick(release_delay)
+        self._push(state.release_tick, self.RELEASE, voice)
+        self._compact_if_stale()
+
+    def cancel(self, voice: BaseVoice):
+        """Cancel a voice's pending events - call before releasing the voice by hand"""
+        state = voice.state
+        if state.trigger_tick is not None and not state.triggered:
+            self._live_events -= 1
+        if state.release_tick is not None and not state.released:
+            self._live_events -= 1
+        state.trigger_tick = None
+        state.release_tick = None
+        self._compact_if_stale()
+
+    def _is_event_live(self, due_tick: int, event: int, voice: BaseVoice, generation: int) -> bool:
+        state = voice.state
+        if generation != state.generation: # Voice was recycled since
+            return False
+        if event == self.TRIGGER:
+            return due_tick == state.trigger_tick and not state.triggered
+        return due_tick == state.release_tick and not state.released
+
+    def _compact_if_stale(self):
+        """Drop stale entries once they outnumber the live ones, so cancelled long releases don't pile up"""
+        if len(self._events) <= max(2 * self._live_events, self.COMPACT_MIN_EVENTS):
+            return
+        self._events = [entry for entry in self._events
+                        if self._is_event_live(entry[0], entry[1], entry[3], entry[4])]
+        heapq.heapify(self._events)
+        self._live_events = len(self._events)
+
+    def advance(self) -> list[BaseVoice]:
+        """Move to the next tick & run the events due on it, returns the voices released on this tick"""
+        self.tick += 1
+        released_voices = []
+        events = self._events
+        while events and events[0][0] <= self.tick:
+            due_tick, event, _, voice, generation = heapq.heappop(events)
+            if not self._is_event_live(due_tick, event, voice, generation):
+                continue
+            self._live_events -= 1
+            if event == self.TRIGGER:
+                voice.trigger()
+                voice.state.triggered = True
+            else:
+                voice.release()
+                voice.state.released = True
+                released_voices.append(voice)
+        return released_voices
+
+
+voice_pool = VoicePool()
+quantizer = ScaleQuantize()
+
+
+# KeyMod stage
+
+read_live_properties = attrgetter("finePitch", "pan", "fcut", "fres", "pitchofs")  # Parent properties that move while held
+
+
+class ModifiedVoice(RoutedVoice):
+    def __init__(self, incoming_voice: vfx.Voice, transform: KeyModTransform, next_stage=None):
+        self.parent_voice = incoming_voice
+        self.next_stage = next_stage
+        self.copyFrom(self.parent_voice)
+        self.parent_properties = read_live_properties(self.parent_voice)
+        self.modified_note = transform.modify_note(self.note)
+        self.modified_velocity = transform.modify_velocity(self.velocity)
+
+    def refresh(self):
+        """Follow the parent voice, keeping the modified note & velocity - only when the parent actually changed"""
+        parent_properties = read_live_properties(self.parent_voice)
+        if parent_properties == self.parent_properties:
+            return
+        self.parent_properties = parent_properties
+        self.copyFrom(self.parent_voice)
+        self.note = self.modified_note
+        self.velocity = self.modified_velocity
+
+
+class VoiceRefresher:
+    """Refresh the modified voices from their parents once every Update Ticks ticks"""
+    def __init__(self):
+        self.tick = 0
+
+    def refresh(self):
+        """Update Ticks comes from the last controls snapshot, which onTick keeps current"""
+        self.tick += 1
+        controls = controls_service.snapshot
+        update_ticks = controls.keymod_transform.controls.update_ticks if controls is not None else 1
+        if self.tick % update_ticks:
+            return
+        for v in keymod_registry:
+            v.refresh()
+
+
+keymod_registry = VoiceRegistry()  # Modified voices, by played note, until released
+voice_refresher = VoiceRefresher()  # Its tick is the chain's control read tick - KeyMod ticks first
+
+
+class KeyModStage:
+    INDEX = 0
+
+    def on_trigger_voice(self, incoming_voice: vfx.Voice):
+        keymod_random.follow_transport(vfx.context.ticks)
+        controls = controls_service.get_snapshot(voice_refresher.tick)
+        transform = controls.keymod_transform
+        keymod_random.set_seed(transform.controls.random_seed)
+        # Init the new voice immediately with incomingVoice ensures no race condition between incoming voices
+        v = ModifiedVoice(incoming_voice=incoming_voice, transform=transform,
+                          next_stage=get_next_stage(controls, self.INDEX))
+        v.note = v.modified_note
+        v.velocity = v.modified_velocity
+        v.trigger()
+        keymod_registry.add(v)
+
+    def on_release_voice(self, incoming_voice: vfx.Voice):
+        for v in keymod_registry.pop_children(incoming_voice):
+            v.release()
+
+    def on_tick(self):
+        keymod_random.follow_transport(vfx.context.ticks)
+        voice_refresher.refresh()
+        keymod_random.refill()
+        if not voice_refresher.tick % Const.CONTROL_POLL_TICKS:
+            controls_service.get_snapshot(voice_refresher.tick)  # Rebuild on control changes here, not on the next note
+
+
+# Harmonize stage
+
+class HarmonyRandomService:
+    def __init__(self, controls: HarmonyControls, incoming_voice: vfx.Voice):
+        self.controls = controls
+        self.active_voices = controls.active_voices
+        self.incoming_voice = incoming_voice
+        self.key = controls.key
+        self.scale = controls.scale
+        self.random_strategy = self._determine_strategy()
+
+
+    def _determine_strategy(self):
+        if self.controls.is_random_relative:
+            return self._relative_strategy
+        elif self.controls.is_random_min_max:
+            return self._min_max_strategy
+        else:
+            return None
+
+    def _relative_strategy(self):
+        candidate_notes = self._get_candidate_notes_relative()
+        return self._sample_unique_notes(candidate_notes)
+
+    def _min_max_strategy(self):
+        candidate_notes = self._get_candidate_notes_min_max()
+        return self._sample_unique_notes(candidate_notes)
+
+    def randomize_notes(self) -> list:
+        """Random notes for the active voices - fewer when the range has fewer distinct scale notes"""
+        random_notes = self.random_strategy()
+        for random_note in random_notes:
+            log.debug("random note = %s", random_note)
+        return random_notes
+
+    def _get_candidate_notes_min_max(self):
+        rand_min = self.controls.random_min
+        rand_max = self.controls.random_max
+        return [i for i in range(rand_min, rand_max) if i != int(self.incoming_voice.note)]
+
+    def _get_candidate_notes_relative(self):
+        random_range_above = self.controls.random_range_above
+        random_range_below = self.controls.random_range_below
+        possible_values = [i for i in range(-1 * random_range_below, random_range_above + 1) if i != 0]
+        return [int(self.incoming_voice.note) + offset for offset in possible_values]
+
+    def _get_quantized_notes(self, random_notes: list) -> list:
+        quantized_notes = []
+        for rnd_note in random_notes:
+            rnd_note = quantizer.quantize_note(rnd_note, key_index=self.key, scale_index=self.scale)
+            quantized_notes.append(rnd_note)
+        return quantized_notes
+
+    def _sample_unique_notes(self, candidate_notes: list) -> list:
+        """Sample the active voices' notes out of the distinct quantized candidates, so no retries are needed.
+        If the range holds fewer scale notes than active voices, every scale note is used once & the rest of the
+        voices are dropped, rather than doubling a note - candidates quantized onto the played note included."""
+        unique_notes = list(dict.fromkeys(self._get_quantized_notes(candidate_notes)))
+        played_note = int(self.incoming_voice.note)
+        if played_note in unique_notes:
+            unique_notes.remove(played_note)
+        return harmony_random.sample(unique_notes, min(self.active_voices, len(unique_notes)))
+
+
+class HarmonyVoiceWorker:
+    def __init__(self, incoming_voice: vfx.Voice, controls: ChainControls):
+        self.incoming_voice = incoming_voice
+        self.main_voice : vfx.Voice = None
+        self.harmony_voices: list[HarmonyVoice] = []
+        self.controls = controls.harmony
+        self.next_stage = get_next_stage(controls, HarmonizeStage.INDEX)
+        harmony_random.set_seed(self.controls.random_seed)
+        self.active_voices: int = self.controls.active_voices
+        self.is_strum_enabled = self.controls.is_strum_enabled
+        self.is_random_enabled = self.controls.is_random_enabled
+        self.key = self.controls.key
+        self.scale = self.controls.scale
+        self.velocity_multiplier = self.controls.velocity_multiplier
+        self.strum_delay = self.controls.strum_delay
+        self.random_service = HarmonyRandomService(controls=self.controls, incoming_voice=self.incoming_voice)
+
+    def acquire_voices(self, taken_notes: set[int] = None):
+        self.acquire_main_voice()
+        self.acquire_harmony_voices(taken_notes)
+
+    def acquire_main_voice(self):
+        self.main_voice = voice_pool.acquire(HarmonyMainVoice, self.incoming_voice, parent_voice=self.incoming_voice,
+                                             next_stage=self.next_stage)
+        harmony_registry.add(self.main_voice)
+
+    def acquire_harmony_voices(self, taken_notes: set[int] = None):
+        """Create the harmony voices - when taken_notes is given, voices landing on a taken note are dropped,
+        & the notes of the kept voices are added to it"""
+        for note, repeat in self.get_harmony_notes(taken_notes):
+            new_voice = voice_pool.acquire(HarmonyVoice, self.incoming_voice, parent_voice=self.incoming_voice,
+                                           next_stage=self.next_stage)
+            new_voice.velocity *= self.velocity_multiplier
+            new_voice.note = note
+            if repeat:
+                new_voice.repeat = repeat
+                new_voice.delay = self.strum_delay
+            self.harmony_voices.append(new_voice)
+
+        for voice in self.harmony_voices:
+            if self.is_strum_enabled:
+                trigger_count = voice.repeat * Const.STRUM_RELEASE_MULTIPLIER * voice.delay + 1
+                release_count = trigger_count + Const.STRUM_MAX_LEN # Release after being triggered + after MAX LEN at most
+                harmony_scheduler.schedule(voice, trigger_count, release_count)
+            harmony_registry.add(voice)
+        for voice in self.harmony_voices:
+            harmony_budget.add(voice, self.controls.voice_limit, self.controls.steal_mode)
+
+    def get_harmony_notes(self, taken_notes: set[int] = None) -> list[tuple[int, int]]:
+        """Plan the harmony of the incoming note - returns its (note, strum repeat) list, repeat is 0 when not strummed"""
+        if self.is_random_enabled:
+            notes = self.random_service.randomize_notes() if self.active_voices else []
+        else:
+            notes = []
+            for i in range(1, self.active_voices + 1):
+                note = quantizer.quantize_note(self.incoming_voice.note + self.controls.transposes[i - 1],
+                                               key_index=self.key, scale_index=self.scale)
+                log.debug("NEW NOTE: %s", note)
+                notes.append(note)
+
+        harmony_notes = [(note, i if self.is_strum_enabled else 0) for i, note in enumerate(notes, 1)]
+        if taken_notes is not None:
+            harmony_notes = self._drop_taken_notes(harmony_notes, taken_notes)
+        return harmony_notes
+
+    @staticmethod
+    def _drop_taken_notes(harmony_notes: list[tuple[int, int]], taken_notes: set[int]) -> list[tuple[int, int]]:
+        kept_notes = []
+        for note, repeat in harmony_notes:
+            if int(note) not in taken_notes:
+                taken_notes.add(int(note))
+                kept_notes.append((note, repeat))
+        return kept_notes
+
+    def trigger_voices(self):
+        self.acquire_voices()
+        self.trigger_main_voice()
+        self.trigger_harmony_voices()
+
+    def trigger_main_voice(self):
+        self.main_voice.trigger()
+        self.main_voice.state.triggered = True
+
+    def trigger_harmony_voices(self):
+        if not self.is_strum_enabled:
+            for voice in self.harmony_voices:
+                if not voice.state.triggered:
+                    voice.trigger()
+                    voice.state.triggered = True
+
+
+selected = None
+random_switches = [
+    get_group_controller_str(RandomRelativeGroup),
+    get_group_controller_str(RandomMinMaxGroup)
+]
+prev_state = [0] * len(random_switches)
+prev_above = 1
+prev_below = 1
+prev_min = 0
+prev_max = 0
+
+
+def ui_relative_limits():
+    """Get state of relative above & below ranges, ensure there's a set gap between them to prevent
+     out of range voice allocation"""
+    global prev_above, prev_below
+    relative_above = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
+    relative_below = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW)
+    if (relative_above + relative_below) < Const.MIN_GAP:
+        if prev_above != relative_above:
+            relative_below = abs(Const.MIN_GAP - relative_above)
+            set_group_controller(RandomRelativeGroup, relative_below / 48, RandomRelativeGroup.RANDOM_RANGE_BELOW)
+        elif prev_below != relative_below:
+            relative_above = abs(Const.MIN_GAP - relative_below)
+            set_group_controller(RandomRelativeGroup, relative_above / 48, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
+    prev_above = relative_above
+    prev_below = relative_below
+
+
+def ui_min_max_limits():
+    """Get state of min & max ranges, ensure there's a set gap between them to prevent out of range voice allocation"""
+    global prev_min, prev_max
+    min_val = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN)
+    max_val = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX)
+    if (max_val - min_val) < Const.MIN_GAP:
+        if prev_min != min_val:
+            max_val = min(min_val + Const.MIN_GAP, 127)
+            set_group_controller(RandomMinMaxGroup, max_val / 127, RandomMinMaxGroup.RANDOM_MAX)
+            if min_val > (127 - Const.MIN_GAP):
+                min_val = 127 - Const.MIN_GAP
+                set_group_controller(RandomMinMaxGroup, min_val / 127, RandomMinMaxGroup.RANDOM_MIN)
+        elif prev_max != max_val:
+            min_val = max(max_val - Const.MIN_GAP, 0)
+            set_group_controller(RandomMinMaxGroup, min_val / 127, RandomMinMaxGroup.RANDOM_MIN)
+            if max_val < Const.MIN_GAP:
+                max_val = Const.MIN_GAP
+                set_group_controller(RandomMinMaxGroup, max_val / 127, RandomMinMaxGroup.RANDOM_MAX)
+        prev_min = min_val
+        prev_max = max_val
+
+
+def ui_random_state():
+    """Get state of random checkboxes, ensure only 1 checkbox can be selected at most"""
+    global selected, prev_state
+    new_selected = None
+    for index, switch in enumerate(random_switches):
+        current_value = vfx.context.form.getInputValue(switch)
+        if current_value == 1 and prev_state[index] == 0:
+            new_selected = index
+        prev_state[index] = current_value
+    all_off = all(state == 0 for state in prev_state)
+    if new_selected is not None:
+        selected = new_selected
+    if not all_off and selected is not None:
+        for index, switch in enumerate(random_switches):
+            value = 1 if index == selected else 0
+            if prev_state[index] != value: # Only write switches that need to flip
+                vfx.context.form.setNormalizedValue(switch, value)
+
+
+@dataclass
+class UIRule:
+    """UI constraint, with the controls it depends on"""
+    control_keys: tuple[str, ...]
+    apply: Callable
+    last_values: tuple = ()
+
+
+class UIConstraintService:
+    """Run the UI constraints only when one of their related controls changed, instead of on every tick.
+    Polls read only the rules' own controls, not the whole controls snapshot."""
+    def __init__(self, rules: list[UIRule]):
+        self.rules = rules
+
+    def check(self, tick: int):
+        if tick % Const.UI_POLL_TICKS:
+            return
+        self.enforce()
+
+    def enforce(self):
+        """Run the rules whose controls changed since the last run"""
+        get_input_value = vfx.context.form.getInputValue
+        for rule in self.rules:
+            values = tuple([get_input_value(control_key) for control_key in rule.control_keys])
+            if values != rule.last_values:
+                rule.last_values = values
+                rule.apply()
+                controls_service.invalidate()  # The next note re-reads the controls the rule may have just moved
+
+
+ui_constraints = UIConstraintService([
+    UIRule(control_keys=tuple(random_switches), apply=ui_random_state),
+    UIRule(control_keys=(get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN),
+                         get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX)),
+           apply=ui_min_max_limits),
+    UIRule(control_keys=(get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE),
+                         get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW)),
+           apply=ui_relative_limits),
+])
+
+
+class HarmonyVoiceBudget:
+    """Global cap on live harmony voices. Past the limit, the lowest priority voice is stolen - by age, velocity
+    or distance from its played note. Uses a lazy min-heap, so bookkeeping is O(log n) per voice."""
+    COMPACT_MIN_ENTRIES = 64
+
+    def __init__(self):
+        self._voices: dict[int, int] = {}  # id(voice) -> state generation, for the voices counted
+        self._heap: list[tuple] = []
+        self._steal_mode = StealModes.OLDEST
+        self._push_count = 0
+
+    def __len__(self):
+        return len(self._voices)
+
+    def _get_priority(self, voice: HarmonyVoice) -> float:
+        if self._steal_mode == StealModes.QUIETEST:
+            return voice.velocity
+        if self._steal_mode == StealModes.FARTHEST:
+            return -abs(voice.note - voice.parent_voice.note)
+        return 0  # Oldest - the add order breaks the tie
+
+    def _push(self, voice: HarmonyVoice):
+        self._push_count += 1
+        heapq.heappush(self._heap, (self._get_priority(voice), self._push_count, voice.state.generation, voice))
+
+    def _is_entry_live(self, entry: tuple) -> bool:
+        return self._voices.get(id(entry[3])) == entry[2]
+
+    def _rebuild(self):
+        voices = [entry[3] for entry in self._heap if self._is_entry_live(entry)]
+        self._heap = []
+        for voice in voices:
+            self._push(voice)
+
+    def add(self, voice: HarmonyVoice, voice_limit: int, steal_mode: int):
+        if steal_mode != self._steal_mode:
+            self._steal_mode = steal_mode
+            self._rebuild()
+        self._voices[id(voice)] = voice.state.generation
+        self._push(voice)
+        while voice_limit and len(self._voices) > voice_limit:
+            self._steal()
+        if len(self._heap) > max(2 * len(self._voices), self.COMPACT_MIN_ENTRIES):
+            self._rebuild()
+
+    def remove(self, voice: BaseVoice):
+        self._voices.pop(id(voice), None)
+
+    def _steal(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._is_entry_live(entry):
+                steal_voice(entry[3])
+                return
+
+
+def retire_voice(voice: BaseVoice):
+    """Forget a released harmony stage voice, and return it to the pool"""
+    harmony_registry.remove(voice)
+    harmony_budget.remove(voice)
+    voice_pool.recycle(voice)
+
+
+def steal_voice(voice: HarmonyVoice):
+    """Stop a harmony voice before its time - a pending strummed voice is just never triggered"""
+    harmony_scheduler.cancel(voice)
+    if voice.state.triggered:
+        voice.release()
+    voice.state.triggered = True
+    voice.state.released = True
+    retire_voice(voice)
+
+
+class ChordBatch:
+    """Collect the notes triggered on the same tick, and build their harmony together on the next tick.
+    Harmony notes doubling another harmony note or a played note of the chord are dropped.
+    FL doesn't signal the last note of a chord, so the next onTick is the first point the chord is known whole -
+    the harmony lags the played notes by that 1 tick."""
+    def __init__(self):
+        self._workers: dict[int, HarmonyVoiceWorker] = {}
+
+    def add(self, worker: HarmonyVoiceWorker):
+        self._workers[id(worker.incoming_voice)] = worker
+
+    def discard(self, incoming_voice: vfx.Voice):
+        self._workers.pop(id(incoming_voice), None)
+
+    def flush(self):
+        if not self._workers:
+            return
+        workers = list(self._workers.values())
+        self._workers.clear()
+        taken_notes = {int(worker.incoming_voice.note) for worker in workers}
+        for worker in workers:
+            worker.acquire_harmony_voices(taken_notes)
+            worker.trigger_harmony_voices()
+
+
+harmony_registry = VoiceRegistry()  # Every Harmonize stage voice, by parent voice, until released
+harmony_scheduler = VoiceScheduler()  # Strummed voices' pending triggers & releases
+harmony_budget = HarmonyVoiceBudget()
+chord_batch = ChordBatch()
+
+
+class HarmonizeStage:
+    INDEX = 1
+
+    def on_trigger_voice(self, incoming_voice: vfx.Voice):
+        harmony_random.follow_transport(vfx.context.ticks)
+        harmony_voice_worker = HarmonyVoiceWorker(incoming_voice, controls_service.get_snapshot(voice_refresher.tick))
+        if harmony_voice_worker.controls.is_chord_dedupe:
+            harmony_voice_worker.acquire_main_voice()
+            harmony_voice_worker.trigger_main_voice()
+            chord_batch.add(harmony_voice_worker)
+        else:
+            harmony_voice_worker.trigger_voices()
+
+    def on_release_voice(self, incoming_voice: vfx.Voice):
+        chord_batch.discard(incoming_voice)
+        for voice in harmony_registry.get_children(incoming_voice):
+            if isinstance(voice, HarmonyMainVoice) or voice.repeat == 0: # If not strummed, release immediately
+                voice.release()
+                voice.state.released = True
+                retire_voice(voice)
+            else: # Live Harmony Voice is strummed, release it in strum order
+                harmony_scheduler.reschedule_release(voice, voice.repeat * Const.STRUM_RELEASE_MULTIPLIER * voice.delay + 1)
+
+    def on_tick(self):
+        harmony_random.follow_transport(vfx.context.ticks)
+        chord_batch.flush()
+        for voice in harmony_scheduler.advance():
+            retire_voice(voice)
+        ui_constraints.check(harmony_scheduler.tick)
+        harmony_random.refill()
+
+
+# Harp stage
+
+class HeldNoteMask:
+    """Bitmask of the notes held by harp main voices, for O(1) harp note collision tests.
+    A note stays set while any main voice still holds it."""
+    def __init__(self):
+        self.mask = 0
+        self._notes: dict[int, int] = {}  # Held note by main voice id()
+        self._note_counts = [0] * 132
+
+    def add(self, voice: BaseVoice):
+        if id(voice) in self._notes:
+            return
+        note = int(voice.note)
+        self._notes[id(voice)] = note
+        self._note_counts[note] += 1
+        self.mask |= 1 << note
+
+    def discard(self, voice: BaseVoice):
+        note = self._notes.pop(id(voice), None)
+        if note is None:
+            return
+        self._note_counts[note] -= 1
+        if not self._note_counts[note]:
+            self.mask &= ~(1 << note)
+
+
+class DelayCurveCache:
+    """LRU cache of normalized (0 - 1) harp delay curves, keyed on point count & timing curve.
+    Harp notes only rescale a cached curve by the harp duration."""
+    def __init__(self, max_size: int = Const.DELAY_CURVE_CACHE_SIZE):
+        self.max_size = max_size
+        self._curves: OrderedDict[tuple, tuple[float, ...]] = OrderedDict()
+
+    def get_curve(self, num_points: int, timing_curve: float) -> tuple[float, ...]:
+        key = (num_points, timing_curve)
+        curve = self._curves.get(key)
+        if curve is not None:
+            self._curves.move_to_end(key)
+            return curve
+        curve = self._build_curve(num_points, timing_curve)
+        self._curves[key] = curve
+        if len(self._curves) > self.max_size:
+            self._curves.popitem(last=False)
+        return curve
+
+    @staticmethod
+    def _build_curve(num_points: int, timing_curve: float) -> tuple[float, ...]:
+        last_point = num_points - 1
+        curve_strength = 8 ** timing_curve
+        if curve_strength == 1:
+            return tuple(i / last_point for i in range(num_points))
+        if curve_strength > 1:
+            return tuple((i / last_point) ** curve_strength for i in range(num_points))  # exponential-style
+        inverse_strength = 1 / curve_strength
+        return tuple(1 - (1 - i / last_point) ** inverse_strength for i in range(num_points))  # logarithmic-style
+
+
+class HarpVoiceWorker:
+    def __init__(self, incoming_voice: vfx.Voice, controls: ChainControls):
+        self.incoming_voice = incoming_voice
+        self.main_voice: vfx.Voice = None
+        self.controls = controls.harp
+        self.key = self.controls.key
+        self.scale = self.controls.scale
+        self.velocity_multiplier = self.controls.velocity_multiplier
+        self.direction = self.controls.direction
+        self.harp_low_limit = self.controls.harp_low_limit
+        self.harp_high_limit = self.controls.harp_high_limit
+        self.max_notes = self.controls.max_notes
+        self.timing_curve = self.controls.timing_curve
+
+        self.time_base = self.controls.time_base
+        self.time_multiplier = self.controls.time_multiplier
+        self.bar_length = vfx.context.PPQ * 4
+        self.is_polyphony_safe = self.controls.is_polyphony_safe
+
+    def acquire_voices(self):
+        self.main_voice = voice_pool.acquire(HarpMainVoice, self.incoming_voice, parent_voice=self.incoming_voice)
+        harp_registry.add(self.main_voice)
+        harp_notes, main_voice_trigger = self.get_harp_plan(held_notes.mask)
+        if not harp_notes:
+            self.main_voice.trigger()
+            self.main_voice.state.triggered = True
+            return
+        for quantized_note, delay, release_length in harp_notes:
+            new_voice = voice_pool.acquire(HarpVoice, self.main_voice, parent_voice=self.incoming_voice)
+            new_voice.velocity *= self.velocity_multiplier
+            new_voice.note = quantized_note
+            harp_scheduler.schedule(new_voice, delay, release_length)
+            harp_registry.add(new_voice)
+        harp_scheduler.schedule(self.main_voice, main_voice_trigger, main_voice_trigger + Const.VOICE_MAX_LEN)
+        held_notes.add(self.main_voice)
+        log.debug("main voice: %s", self.main_voice.state)
+
+    def get_harp_plan(self, held_mask: int) -> tuple[list[tuple[int, int, int]], int]:
+        """Plan the harp of the incoming note, skipping notes in held_mask - returns its
+        (note, trigger delay, release delay) list & the main voice trigger delay"""
+        note_list = self.get_harp_notes_list_with_direction()
+        if not note_list:
+            return [], 0
+        held_mask |= 1 << int(self.incoming_voice.note)
+        log.debug("main voices mask: %x", held_mask)
+        unique_note_list = self.thin_notes([note for note in note_list if not held_mask >> int(note) & 1])
+        log.debug("harp notes: %s", unique_note_list)
+        total = len(unique_note_list)
+        if not total:
+            return [], 0
+        fixed_total_duration = self.bar_length * self.time_base * self.time_multiplier
+        delays = self.get_delay_list(num_notes=total, max_delay=fixed_total_duration)
+        polyphony_releases = [delays[idx + 1] - delays[idx] for idx in range(total)]
+        max_release = 0
+        note_length = Const.HARP_LEN
+        harp_notes = []
+        for idx, quantized_note in enumerate(unique_note_list):
+            delay = delays[idx]
+            release_length = delay + polyphony_releases[idx] if self.is_polyphony_safe else delay + note_length
+            harp_notes.append((quantized_note, delay, release_length))
+            max_release = max(max_release, release_length)
+        latest_trigger_not_polyphony_safe = max(delays) + 1
+        main_voice_trigger = max_release + 1 if self.is_polyphony_safe else latest_trigger_not_polyphony_safe
+        return harp_notes, main_voice_trigger
+
+    def get_harp_notes_list_with_direction(self):
+        range_end = int(self.incoming_voice.note)
+        if self.direction == HarpDirection.UP.value:
+            range_start = self.harp_low_limit
+            range_end = range_end if range_end < self.harp_high_limit else self.harp_high_limit
+            range_step = 1
+
+        elif self.direction == HarpDirection.DOWN.value:
+            range_start = self.harp_high_limit
+            range_end = range_end if range_end > self.harp_low_limit else self.harp_low_limit
+            range_step = -1
+
+        return quantizer.get_sweep_notes(range_start, range_end, range_step,
+                                         key_index=self.key, scale_index=self.scale)
+
+    def thin_notes(self, note_list):
+        """Keep at most max_notes, evenly spread across the sweep & always ending next to the target note"""
+        total = len(note_list)
+        if not self.max_notes or total <= self.max_notes:
+            return note_list
+        if self.max_notes == 1:
+            return note_list[-1:]
+        step = (total - 1) / (self.max_notes - 1)
+        return [note_list[round(idx * step)] for idx in range(self.max_notes)]
+
+    def get_delay_list(self, num_notes, max_delay):
+        curve = delay_curves.get_curve(num_points=num_notes + 1, timing_curve=self.timing_curve)
+        return [int(round(y * max_delay)) for y in curve]
+
+
+def release_pending_voices(pending_voices: list[HarpVoice], release_mode: int) -> int:
+    """Handle harp voices that haven't played yet on key release, in sweep order.
+    Returns the delay in ticks the main voice should wait for the remaining harp notes."""
+    if release_mode == ReleaseModes.COMPRESS.value:
+        tail_step = Const.RELEASE_TAIL_LEN / len(pending_voices)
+        for idx, voice in enumerate(pending_voices):
+            trigger_delay = idx * tail_step
+            harp_scheduler.reschedule(voice, trigger_delay, trigger_delay + max(tail_step, 1))
+        return Const.RELEASE_TAIL_LEN
+
+    for voice in pending_voices:
+        harp_scheduler.cancel(voice)
+        if release_mode == ReleaseModes.BURST.value:
+            voice.trigger()
+            voice.release()
+        voice.state.triggered = True
+        voice.state.released = True
+        harp_registry.remove(voice)
+        voice_pool.recycle(voice)
+    return 0
+
+
+harp_registry = VoiceRegistry()  # Every Harp stage voice, by parent voice, until released
+harp_scheduler = VoiceScheduler()
+held_notes = HeldNoteMask()  # Notes of harp main voices waiting for their harp to finish
+delay_curves = DelayCurveCache()
+
+
+class HarpStage:
+    INDEX = 2
+
+    def on_trigger_voice(self, incoming_voice: vfx.Voice):
+        harp_voice_worker = HarpVoiceWorker(incoming_voice, controls_service.get_snapshot(voice_refresher.tick))
+        harp_voice_worker.acquire_voices()
+
+    def on_release_voice(self, incoming_voice: vfx.Voice):
+        main_voices = []
+        pending_voices = []
+        for voice in harp_registry.get_children(incoming_voice):
+            state = voice.state
+            if state.triggered and not state.released:
+                harp_scheduler.cancel(voice)
+                voice.release()
+                state.released = True
+                held_notes.discard(voice)
+                harp_registry.remove(voice)
+                voice_pool.recycle(voice)
+            elif isinstance(voice, HarpMainVoice):
+                main_voices.append(voice)
+            elif not state.triggered:
+                pending_voices.append(voice)
+
+        main_voice_delay = 0
+        if pending_voices:
+            release_mode = controls_service.get_snapshot(voice_refresher.tick).harp.release_mode
+            main_voice_delay = release_pending_voices(pending_voices, release_mode)
+        for voice in main_voices:
+            harp_scheduler.reschedule(voice, main_voice_delay, main_voice_delay + 1)
+
+    def on_tick(self):
+        for voice in harp_scheduler.advance():
+            held_notes.discard(voice)
+            harp_registry.remove(voice)
+            voice_pool.recycle(voice)
+
+
+# Chain
+
+class BypassStage:
+    """Entry while every stage is off - plays the notes straight through"""
+    def __init__(self):
+        self.voice_registry = VoiceRegistry()
+
+    def on_trigger_voice(self, incoming_voice: vfx.Voice):
+        voice = voice_pool.acquire(BaseVoice, incoming_voice, parent_voice=incoming_voice)
+        voice.trigger()
+        self.voice_registry.add(voice)
+
+    def on_release_voice(self, incoming_voice: vfx.Voice):
+        for voice in self.voice_registry.pop_children(incoming_voice):
+            voice.release()
+            voice_pool.recycle(voice)
+
+
+stages = (KeyModStage(), HarmonizeStage(), HarpStage())  # In chain order, by stage INDEX
+bypass_stage = BypassStage()
+entry_stages: dict[int, object] = {}  # id(played voice) -> stage it went into, for its release
+
+
+def get_next_stage(controls: ChainControls, stage_index: int):
+    """First enabled stage after stage_index, None when the notes leave the script"""
+    for index in range(stage_index + 1, len(stages)):
+        if controls.enabled_stages[index]:
+            return stages[index]
+    return None
+
+
+def onTriggerVoice(incomingVoice):
+    entry_stage = get_next_stage(controls_service.get_snapshot(voice_refresher.tick), -1) or bypass_stage
+    entry_stages[id(incomingVoice)] = entry_stage
+    entry_stage.on_trigger_voice(incomingVoice)
+
+
+def onTick():
+    """Every stage ticks, enabled or not, so notes a stage already holds still end"""
+    for stage in stages:
+        stage.on_tick()
+
+
+def onReleaseVoice(incomingVoice):
+    entry_stage = entry_stages.pop(id(incomingVoice), None)
+    if entry_stage is not None:
+        entry_stage.on_release_voice(incomingVoice)
+
+
+def createDialog():
+    form = vfx.ScriptDialog("Sharpend's Chain", script_text)
+    groups = Interface.GROUPS
+    form.addGroup(groups.CHAIN.NAME)
+    form.addInputCheckbox(groups.CHAIN.KEYMOD, 1, hint='Enable the KeyMod stage')
+    form.addInputCheckbox(groups.CHAIN.HARMONIZE, 1, hint='Enable the Harmonize stage')
+    form.addInputCheckbox(groups.CHAIN.HARP, 1, hint='Enable the Harp stage')
+    form.endGroup()
+
+    form.addGroup(groups.PITCH.NAME)
+    form.addInputKnobInt(groups.PITCH.PITCH_SEMITONES, 0, -12, 12, hint='Pitch offset in semitones')
+    form.addInputKnobInt(groups.PITCH.PITCH_OCTAVE, 0, -4, 4, hint='Pitch offset in Octaves')
+    form.endGroup()
+
+    form.addGroup(groups.VELOCITY_RANDOM.NAME)
+    form.addInputCheckbox(groups.VELOCITY_RANDOM.ENABLE_RANDOMIZATION, 0, hint='Enable Velocity Randomization')
+    form.addInputCombo(groups.VELOCITY_RANDOM.RANDOMIZATION_MODE,
+                       VelocityRandomGroup.RANDOMIZATION_MODE_OPTIONS, 1, 'Velocity Randomization Mode')
+    form.addInputKnobInt(groups.VELOCITY_RANDOM.RANDOM_RELATIVE_ABOVE, 0, 0, 100,
+                         hint="Random Range for Velocity above played Velocity")
+    form.addInputKnobInt(groups.VELOCITY_RANDOM.RANDOM_RELATIVE_BELOW, 0, 0, 100,
+                         hint="Random Range for Velocity below played Velocity")
+    form.addInputKnobInt(groups.VELOCITY_RANDOM.SEED, 0, 0, 9999, hint='Randomization Seed | 0 = Unseeded')
+    form.endGroup()
+
+    form.addGroup(groups.VELOCITY_MULT_OFFSET.NAME)
+    form.addInputKnob(groups.VELOCITY_MULT_OFFSET.VELOCITY_MULTIPLIER, 1, 0, 2, hint='Velocity Multiplier')
+    form.addInputKnob(groups.VELOCITY_MULT_OFFSET.VELOCITY_BASE, 0, -1, 1, hint='Velocity Base Offset')
+    form.endGroup()
+
+    form.addGroup(groups.VELOCITY_CURVE.NAME)
+    form.addInputCombo(groups.VELOCITY_CURVE.CURVE, VelocityCurveGroup.CURVE_OPTIONS, 0, 'Velocity Response Curve')
+    form.addInputKnob(groups.VELOCITY_CURVE.AMOUNT, 0.5, 0, 1, hint='Velocity Curve Strength')
+    form.addInputKnob(groups.VELOCITY_CURVE.POINT_25, 0.25, 0, 1, hint='Output Velocity at 25% Velocity')
+    form.addInputKnob(groups.VELOCITY_CURVE.POINT_50, 0.5, 0, 1, hint='Output Velocity at 50% Velocity')
+    form.addInputKnob(groups.VELOCITY_CURVE.POINT_75, 0.75, 0, 1, hint='Output Velocity at 75% Velocity')
+    form.endGroup()
+
+    form.addGroup(groups.VELOCITY_THRESHOLD.NAME)
+    form.addInputKnob(groups.VELOCITY_THRESHOLD.VELOCITY_MIN, 0, 0, 1, hint='Velocity Minimum')
+    form.addInputKnob(groups.VELOCITY_THRESHOLD.VELOCITY_MAX, 1, 0, 1, hint='Velocity Maximum')
+    form.endGroup()
+
+    form.addGroup(groups.VOICE_UPDATE.NAME)
+    form.addInputKnobInt(groups.VOICE_UPDATE.UPDATE_TICKS, 1, 1, 24, hint='Ticks between following slides & pitch bend')
+    form.endGroup()
+
+    form.addGroup(groups.VOICE.NAME)
+    for i in range(1, Const.NUM_OF_VOICES + 1):
+        form.addInputCheckbox(f'{groups.VOICE.VOICE} {i}', 1, hint=f'Enable Voice {i}')
+        form.addInputKnobInt(f'{groups.VOICE.TRANSPOSE} {i}', Const.DEFAULT_TRANSPOSE_VALUES[i-1], -12, 12, hint=f'Transpose Voice {i}')
+    form.addInputKnob(groups.VOICE.VELOCITY_MULTIPLIER, 0.5, 0, 2, hint='Voice Velocity Multiplier')
+    form.addInputKnobInt(groups.VOICE.STRUM, 0, 0, 16, hint='Strum Timing')
+    form.addInputKnobInt(groups.VOICE.VOICE_LIMIT, 0, 0, Const.MAX_VOICE_LIMIT, hint='Max Harmony Voices | 0 = Unlimited')
+    form.AddInputCombo(groups.VOICE.STEAL_MODE, StealModes.steal_modes_list_interface, 0, hint='Harmony Voice to Steal at the Limit')
+    form.addInputCheckbox(groups.VOICE.CHORD_DEDUPE, 0, hint='Build Chord Harmony Together & Drop Doubled Notes | Harmony comes in 1 tick late')
+    form.endGroup()
+
+    form.addGroup(groups.QUANTIZE.NAME)
+    form.AddInputCombo(groups.QUANTIZE.KEY, quantizer.key_list_interface, 0, hint='Quantize to Key')
+    form.AddInputCombo(groups.QUANTIZE.SCALE, quantizer.scale_list_interface, 2, hint='Quantize to Scale')
+    form.endGroup()
+
+    form.addGroup(groups.RANDOM_RELATIVE.NAME)
+    form.addInputKnobInt(groups.RANDOM_RELATIVE.RANDOM_RANGE_ABOVE, 12, 1, 48, hint='Random Range for Harmony Above')
+    form.addInputKnobInt(groups.RANDOM_RELATIVE.RANDOM_RANGE_BELOW, 12, 1, 48, hint='Random Range for Harmony Below')
+    form.addInputCheckbox(groups.RANDOM_RELATIVE.NAME, 0, hint='Enable Relative Harmony Randomization')
+    form.endGroup()
+
+    form.addGroup(groups.RANDOM_MIN_MAX.NAME)
+    form.addInputKnobInt(groups.RANDOM_MIN_MAX.RANDOM_MIN, 49, 0, 126, hint='Random Min Limit for Harmony')
+    form.addInputKnobInt(groups.RANDOM_MIN_MAX.RANDOM_MAX, 89, 0, 127, hint='Random Max Limit for Harmony')
+    form.addInputCheckbox(groups.RANDOM_MIN_MAX.NAME, 0, hint='Enable Min/Max Harmony Randomization')
+    form.endGroup()
+
+    form.addGroup(groups.RANDOM_SEED.NAME)
+    form.addInputKnobInt(groups.RANDOM_SEED.SEED, 0, 0, 9999, hint='Randomization Seed | 0 = Unseeded')
+    form.endGroup()
+
+    form.addGroup(groups.TIME.NAME)
+    form.addInputCombo(groups.TIME.TIME_BASE, TimeDivisions.divisions_list_interface, 2, hint='Time Base Division')
+    form.addInputKnobInt(groups.TIME.TIME_MULTIPLIER, 1, 1, 16, hint='Time Multiplier')
+    form.addInputCheckbox(groups.TIME.POLYPHONY_SAFE, 0, hint="Ensure Harp Notes don't Overlap")
+    form.addInputKnob(groups.TIME.TIMING_CURVE, 0, -1, 1, hint='Timing Curve | 0 = Linear | < 0 = Logarithmic | > 0 = Exponential')
+    form.endGroup()
+
+    form.addGroup(groups.HARP_SETTINGS.NAME)
+    form.AddInputCombo(groups.HARP_SETTINGS.HARP_DIRECTION, HarpDirection.harp_direction_list_interface,
+                       HarpDirection.UP.value, hint='Harp Direction')
+    form.addInputKnob(groups.HARP_SETTINGS.VELOCITY_MULTIPLIER, 0.5, 0, 2, hint='Voice Velocity Multiplier')
+    form.addInputKnobInt(groups.HARP_SETTINGS.HARP_LOW_LIMIT, 48, 0, 126, hint='Low Limit for Harp')
+    form.addInputKnobInt(groups.HARP_SETTINGS.HARP_HIGH_LIMIT, 96, 1, 127, hint='High Limit for Harp')
+    form.addInputKnobInt(groups.HARP_SETTINGS.MAX_NOTES, 0, 0, 128, hint='Max Harp Notes | 0 = Unlimited')
+    form.AddInputCombo(groups.HARP_SETTINGS.RELEASE_MODE, ReleaseModes.release_modes_list_interface,
+                       ReleaseModes.BURST.value, hint='Unplayed Harp Notes on Key Release')
+    form.endGroup()
+    return form
@@ -1,441 +1,1175 @@
-import flvfx as vfx
-from dataclasses import dataclass
-import random
-
-script_text = """Sharpend's Harmonizer
-Harmonizer with Quantization, Strum functionality & 2 Randomization algorithms.
-----------------------------
-Voice: Enable/Disable A harmony voice.
-Transpose: Transpose Harmony voice by x Semitones.
-Velocity Multiplier: Multiplier of harmony voices' velocity.
-Strum: Defines time it takes for harmony voices to strum, by division of 1/16th notes.
-
-Key: Key to quantize the harmony notes to.
-Scale: Scale to quantize the harmony notes to.
-
-Range Above: Randomization range of harmony note above played note.
-Range Below: Randomization range of harmony note below played note.
-Random Relative: Enable Randomization based on a range above/below played note.
-
-Min: Randomization minimum threshold for harmony note.
-Max: Randomization maximum threshold for harmony note.
-Random Min Max: Enable Randomization based on min/max thresholds.
-"""
-
-@dataclass(frozen=True)
-class Group:
-    NAME: str
-
-@dataclass(frozen=True)
-class VoiceGroup(Group):
-    NAME: str = "Voices"
-    VOICE: str = "Voice"
-    TRANSPOSE: str = "Transpose"
-    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
-    STRUM: str = "Strum"
-
-@dataclass(frozen=True)
-class RandomRelativeGroup(Group):
-    NAME: str = "Random Relative"
-    RANDOM_RANGE_ABOVE: str = "Range Above"
-    RANDOM_RANGE_BELOW: str = "Range Below"
-
-@dataclass(frozen=True)
-class RandomMinMaxGroup(Group):
-    NAME: str = "Random Min Max"
-    RANDOM_MIN: str = "Min"
-    RANDOM_MAX: str = "Max"
-
-@dataclass(frozen=True)
-class QuantizeGroup(Group):
-    NAME: str = "Quantize"
-    KEY: str = "Key"
-    SCALE: str = "Scale"
-
-
-@dataclass(frozen=True)
-class Groups:
-    QUANTIZE: QuantizeGroup = QuantizeGroup()
-    VOICE: VoiceGroup = VoiceGroup()
-    RANDOM_RELATIVE: RandomRelativeGroup = RandomRelativeGroup()
-    RANDOM_MIN_MAX: RandomMinMaxGroup = RandomMinMaxGroup()
-
-@dataclass
-class Interface:
-    GROUPS: Groups = Groups()
-
-    SCALE_MAJOR = "Major"
-    SCALE_MINOR = "Minor"
-    SCALE_PENTATONIC_MAJOR = "Pentatonic Major"
-    SCALE_PENTATONIC_MINOR = "Pentatonic Minor"
-    SCALE_HIJAZ = "Hijaz"
-    SCALE_CHROMATIC = "Chromatic"
-
-
-@dataclass(frozen=True)
-class Const:
-    NUM_OF_VOICES: int = 4
-    DEFAULT_TRANSPOSE_VALUES: tuple[int, ...] = (3, 7, 12, -12)
-    MIN_GAP = 3 * NUM_OF_VOICES
-    STRUM_MAX_LEN: int = vfx.context.PPQ * 4 * 32
-    STRUM_RELEASE_MULTIPLIER: int = vfx.context.PPQ / 16
-
-@dataclass
-class Key:
-    key: str
-    value: int
-
-class Keys:
-    key_name_list = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    keys_list: list[Key] = [Key(key=key, value=index) for index, key in enumerate(key_name_list)]
-    keys_list_interface = [key_obj.key for key_obj in keys_list]
-
-
-@dataclass
-class Scale:
-    key: str
-    value: list
-
-class Scales:
-    scales_dict = {
-        Interface.SCALE_MAJOR: Scale(key=Interface.SCALE_MAJOR, value=[1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1]),
-        Interface.SCALE_MINOR: Scale(key=Interface.SCALE_MINOR, value=[1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0]),
-        Interface.SCALE_PENTATONIC_MAJOR: Scale(key=Interface.SCALE_PENTATONIC_MAJOR, value=[1, 0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 0]),
-        Interface.SCALE_PENTATONIC_MINOR: Scale(key=Interface.SCALE_PENTATONIC_MINOR, value=[1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0]),
-        Interface.SCALE_HIJAZ: Scale(key=Interface.SCALE_HIJAZ, value=[1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 0]),
-        Interface.SCALE_CHROMATIC: Scale(key=Interface.SCALE_CHROMATIC, value=[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]),
-    }
-    scales_list_interface = [scale.key for scale in scales_dict.values()]
-    scales_list = [scale for scale in scales_dict.values()]
-
-class ScaleQuantize:
-    def __init__(self):
-        self.scales = Scales()
-        self.keys = Keys()
-
-        self.key_list = self.keys.keys_list
-        self.scale_list = self.scales.scales_list
-
-        self.key_list_interface = self.keys.keys_list_interface
-        self.scale_list_interface = self.scales.scales_list_interface
-
-    def quantize_note(self, note, key_index, scale_index):
-        note = int(note)
-        key_obj = self.key_list[key_index]
-        scale_obj = self.scale_list[scale_index]
-
-        tonic = key_obj.value
-        scale = scale_obj.value
-
-        degree = (note - tonic) % 12
-
-        if scale[degree] == 1:
-            return limit_note(note)
-        else:
-            i = 1
-            while scale[(degree + i) % 12] != 1:
-                i += 1
-            offset = i
-        return limit_note(note + offset)
-
-
-class BaseVoice(vfx.Voice):
-    parent_voice = None
-    note_offset: int = 0
-    velocity_multiplier = 1
-    trigger_count = 0
-    release_count = 0
-    triggered = False
-    released = False
-
-class HarmonyVoice(BaseVoice):
-    delay = 0
-    repeat = 0
-
-class MainVoice(BaseVoice):
-    pass
-
-def get_group_controller_str(group, name = ''):
-    """Get group controller string without acquiring value - for static definitions"""
-    name = name if name else group.NAME
-    return f"{group.NAME}: {name}"
-
-def get_group_controller(group, name = ''):
-    return vfx.context.form.getInputValue(get_group_controller_str(group, name))
-
-def set_group_controller(group, value, name = ''):
-    """Set group controller value"""
-    print(f"str: {get_group_controller_str(group, name)}")
-    print(f"value: {value}")
-    vfx.context.form.setNormalizedValue(get_group_controller_str(group, name), value)
-
-
-def limit_note(note: int):
-    """Make sure notes are never above 131(B10), or below 0(C0)"""
-    return max(0, min(note, 131))
-
-
-selected = None
-random_switches = [
-    get_group_controller_str(RandomRelativeGroup),
-    get_group_controller_str(RandomMinMaxGroup)
-]
-prev_state = [0] * len(random_switches)
-voiceList: list[HarmonyVoice] = []
-quantizer = ScaleQuantize()
-prev_above = 1
-prev_below = 1
-prev_min = 0
-prev_max = 0
-
-
-class RandomService:
-    def __init__(self, active_voices: int, incoming_voice: vfx.Voice, key: int, scale: int):
-        self.active_voices = active_voices
-        self.incoming_voice = incoming_voice
-        self.key = key
-        self.scale = scale
-        self.random_strategy = self._determine_strategy()
-
-
-    def _determine_strategy(self):
-        if get_group_controller(RandomRelativeGroup):
-            return self._relative_strategy
-        elif get_group_controller(RandomMinMaxGroup):
-            return self._min_max_strategy
-        else:
-            return None
-
-    def _relative_strategy(self):
-        random_notes = self._get_random_notes_relative()
-        quantized_notes = self._get_quantized_notes(random_notes)
-        return quantized_notes
-
-    def _min_max_strategy(self):
-        random_notes = self._get_random_notes_min_max()
-        quantized_notes = self._get_quantized_notes(random_notes)
-        return quantized_notes
-
-    def randomize_notes(self):
-        random_notes = self.random_strategy()
-        while not self._is_quantized_notes_random_truly_unique(random_notes):
-            random_notes = self.random_strategy()
-        for voice, random_note in zip([v for v in voiceList if v.parent_voice == self.incoming_voice],
-                                      random_notes):
-            voice.note = random_note
-            print(f"random note = {random_note}")
-
-    def _get_random_notes_min_max(self):
-        rand_min = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN)
-        rand_max = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX)
-        possible_values = [i for i in range(rand_min, rand_max) if i != int(self.incoming_voice.note)]
-        random_notes = random.sample(possible_values, self.active_voices)
-        return random_notes
-
-    def _get_random_notes_relative(self):
-        random_range_above = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
-        random_range_below = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW)
-        possible_values = [i for i in range(-1 * random_range_below, random_range_above + 1) if i != 0]
-        random_offsets = random.sample(possible_values, self.active_voices)
-        random_notes = [int(self.incoming_voice.note) + offset for offset in random_offsets]
-        return random_notes
-
-    def _get_quantized_notes(self, random_notes: list) -> list:
-        quantized_notes = []
-        for rnd_note in random_notes:
-            rnd_note = quantizer.quantize_note(rnd_note, key_index=self.key, scale_index=self.scale)
-            quantized_notes.append(rnd_note)
-        return quantized_notes
-
-
-    def _is_quantized_notes_random_truly_unique(self, random_notes):
-        quantized_notes = list(set(random_notes))
-        if len(quantized_notes) < self.active_voices:
-            return False
-        else:
-            return True
-
-class HarmonyVoiceWorker:
-    def __init__(self, incoming_voice: vfx.Voice):
-        self.incoming_voice = incoming_voice
-        self.main_voice : vfx.Voice = None
-        self.active_voices: int = self._get_active_voices()
-        self.is_strum_enabled = True if get_group_controller(VoiceGroup, VoiceGroup.STRUM) else False
-        self.is_random_enabled = True if get_group_controller(RandomRelativeGroup) or get_group_controller(RandomMinMaxGroup) else False
-        self.key = get_group_controller(QuantizeGroup, QuantizeGroup.KEY)
-        self.scale = get_group_controller(QuantizeGroup, QuantizeGroup.SCALE)
-        self.velocity_multiplier = get_group_controller(VoiceGroup, VoiceGroup.VELOCITY_MULTIPLIER)
-        self.strum_delay = get_group_controller(VoiceGroup, VoiceGroup.STRUM)
-        self.random_service = RandomService(active_voices=self.active_voices,
-                                            incoming_voice=self.incoming_voice,
-                                            key=self.key, scale=self.scale)
-
-    def acquire_voices(self):
-        self.main_voice = MainVoice()
-        self.main_voice.copyFrom(self.incoming_voice)
-        self.main_voice.parent_voice = self.incoming_voice
-        for i in range(1, self.active_voices + 1):
-            new_voice = HarmonyVoice()
-            new_voice.copyFrom(self.incoming_voice)
-            new_voice.parent_voice = self.incoming_voice
-            new_voice.velocity *= self.velocity_multiplier
-            if not self.is_random_enabled:
-                new_voice.note_offset = get_group_controller(VoiceGroup, f"{VoiceGroup.TRANSPOSE} {i}")
-                new_voice.note += new_voice.note_offset
-                new_voice.note = quantizer.quantize_note(new_voice.note, key_index=self.key, scale_index=self.scale)
-                print(f"NEW NOTE: {new_voice.note}")
-            if self.is_strum_enabled:
-                new_voice.repeat = i
-                new_voice.delay = self.strum_delay
-                new_voice.trigger_count = new_voice.repeat * Const.STRUM_RELEASE_MULTIPLIER * new_voice.delay + 1
-                new_voice.release_count = new_voice.trigger_count + Const.STRUM_MAX_LEN # Release after being triggered + after MAX LEN at most
-            voiceList.append(new_voice)
-
-        if self.active_voices and self.is_random_enabled:
-            self.random_service.randomize_notes()
-
-    def trigger_voices(self):
-        self.acquire_voices()
-        self.main_voice.trigger()
-        if not self.is_strum_enabled:
-            for voice in [v for v in voiceList if v.parent_voice == self.incoming_voice]:
-                if not voice.triggered:
-                    voice.trigger()
-                    voice.triggered = True
-                voiceList.remove(voice)
-
-    def _get_active_voices(self):
-        self.active_voices = 0
-        for i in range(1, Const.NUM_OF_VOICES+1):
-            if get_group_controller(VoiceGroup,f"{VoiceGroup.VOICE} {i}"):
-                self.active_voices += 1
-        return self.active_voices
-
-
-def ui_relative_limits():
-    """Get state of relative above & below ranges, ensure there's a set gap between them to prevent
-     out of range voice allocation"""
-    global prev_above, prev_below
-    relative_above = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
-    relative_below = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW)
-    if (relative_above + relative_below) < Const.MIN_GAP:
-        if prev_above != relative_above:
-            relative_below = abs(Const.MIN_GAP - relative_above)
-            set_group_controller(RandomRelativeGroup, relative_below / 48, RandomRelativeGroup.RANDOM_RANGE_BELOW)
-        elif prev_below != relative_below:
-            relative_above = abs(Const.MIN_GAP - relative_below)
-            set_group_controller(RandomRelativeGroup, relative_above / 48, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
-    prev_above = relative_above
-    prev_below = relative_below
-
-
-def ui_min_max_limits():
-    """Get state of min & max ranges, ensure there's a set gap between them to prevent out of range voice allocation"""
-    global prev_min, prev_max
-    min_val = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN)
-    max_val = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX)
-    if (max_val - min_val) < Const.MIN_GAP:
-        if prev_min != min_val:
-            max_val = min(min_val + Const.MIN_GAP, 127)
-            set_group_controller(RandomMinMaxGroup, max_val / 127, RandomMinMaxGroup.RANDOM_MAX)
-            if min_val > (127 - Const.MIN_GAP):
-                min_val = 127 - Const.MIN_GAP
-                set_group_controller(RandomMinMaxGroup, min_val / 127, RandomMinMaxGroup.RANDOM_MIN)
-        elif prev_max != max_val:
-            min_val = max(max_val - Const.MIN_GAP, 0)
-            set_group_controller(RandomMinMaxGroup, min_val / 127, RandomMinMaxGroup.RANDOM_MIN)
-            if max_val < Const.MIN_GAP:
-                max_val = Const.MIN_GAP
-                set_group_controller(RandomMinMaxGroup, max_val / 127, RandomMinMaxGroup.RANDOM_MAX)
-        prev_min = min_val
-        prev_max = max_val
-
-
-def ui_random_state():
-    """Get state of random checkboxes, ensure only 1 checkbox can be selected at most"""
-    global selected, prev_state
-    new_selected = None
-    for index, switch in enumerate(random_switches):
-        current_value = vfx.context.form.getInputValue(switch)
-        if current_value == 1 and prev_state[index] == 0:
-            new_selected = index
-        prev_state[index] = current_value
-    all_off = all(state == 0 for state in prev_state)
-    if new_selected is not None:
-        selected = new_selected
-        for switch in random_switches:
-            vfx.context.form.setNormalizedValue(switch, 0)
-    if not all_off and selected is not None:
-        vfx.context.form.setNormalizedValue(random_switches[selected], 1)
-
-
-def onTriggerVoice(incomingVoice):
-    harmony_voice_worker = HarmonyVoiceWorker(incomingVoice)
-    harmony_voice_worker.trigger_voices()
-
-def onReleaseVoice(incomingVoice):
-    for live_voice in vfx.context.voices:
-        if live_voice.parent_voice == incomingVoice:
-            if isinstance(live_voice, MainVoice):
-                live_voice.release()
-                live_voice.released = True
-            if isinstance(live_voice, HarmonyVoice):
-                if live_voice.repeat == 0: # If not strummed, release immediately
-                    live_voice.release()
-                    live_voice.released = True
-
-    harm_voices = [v for v in voiceList if v.parent_voice == incomingVoice]
-    for harm_voice in harm_voices: # Live Harmony Voice is strummed, release it in strum order
-        harm_voice.release_count = harm_voice.repeat * Const.STRUM_RELEASE_MULTIPLIER * harm_voice.delay + 1
-
-
-def onTick():
-    ui_random_state()
-
-    ui_min_max_limits()
-
-    ui_relative_limits()
-
-    for voice in voiceList[:]:
-        voice.trigger_count -=1
-        if voice.trigger_count <= 0 and not voice.triggered:
-            voice.trigger()
-            voice.triggered = True
-        voice.release_count -= 1
-        if voice.release_count <= 0 and not voice.released:
-            if voice is not None:
-                voice.release()
-                voice.released = True
-            voice.released = True
-            voiceList.remove(voice)
-
-
-def createDialog():
-    form = vfx.ScriptDialog('', script_text)
-    groups = Interface.GROUPS
-    form.addGroup(groups.VOICE.NAME)
-    for i in range(1, Const.NUM_OF_VOICES + 1):
-        form.addInputCheckbox(f'{groups.VOICE.VOICE} {i}', 1, hint=f'Enable Voice {i}')
-        form.addInputKnobInt(f'{groups.VOICE.TRANSPOSE} {i}', Const.DEFAULT_TRANSPOSE_VALUES[i-1], -12, 12, hint=f'Transpose Voice {i}')
-    form.addInputKnob(groups.VOICE.VELOCITY_MULTIPLIER, 0.5, 0, 2, hint='Voice Velocity Multiplier')
-    form.addInputKnobInt(groups.VOICE.STRUM, 0, 0, 16, hint='Strum Timing')
-    form.endGroup()
-
-
-    form.addGroup(groups.QUANTIZE.NAME)
-    form.AddInputCombo(groups.QUANTIZE.KEY, quantizer.key_list_interface, 0, hint='Quantize to Key')
-    form.AddInputCombo(groups.QUANTIZE.SCALE, quantizer.scale_list_interface, 2, hint='Quantize to Scale')
-    form.endGroup()
-
-    form.addGroup(groups.RANDOM_RELATIVE.NAME)
-    form.addInputKnobInt(groups.RANDOM_RELATIVE.RANDOM_RANGE_ABOVE, 12, 1, 48, hint=f'Random Range for Harmony Above')
-    form.addInputKnobInt(groups.RANDOM_RELATIVE.RANDOM_RANGE_BELOW, 12, 1, 48, hint=f'Random Range for Harmony Below')
-    form.addInputCheckbox(groups.RANDOM_RELATIVE.NAME, 0, hint='Enable Relative Harmony Randomization')
-    form.endGroup()
-
-    form.addGroup(groups.RANDOM_MIN_MAX.NAME)
-    form.addInputKnobInt(groups.RANDOM_MIN_MAX.RANDOM_MIN, 49, 0, 126, hint=f'Random Min Limit for Harmony')
-    form.addInputKnobInt(groups.RANDOM_MIN_MAX.RANDOM_MAX, 89, 0, 127, hint=f'Random Max Limit for Harmony')
-    form.addInputCheckbox(groups.RANDOM_MIN_MAX.NAME, 0, hint='Enable Min/Max Harmony Randomization')
-    form.endGroup()
-    return form
+import flvfx as vfx
+from dataclasses import dataclass
+from typing import Callable
+from collections import deque
+from functools import wraps
+from time import perf_counter_ns
+import random
+import heapq
+import math
+
+script_text = """Sharpend's Harmonizer
+Harmonizer with Quantization, Strum functionality & 2 Randomization algorithms.
+----------------------------
+Voice: Enable/Disable A harmony voice.
+Transpose: Transpose Harmony voice by x Semitones.
+Velocity Multiplier: Multiplier of harmony voices' velocity.
+Strum: Defines time it takes for harmony voices to strum, by division of 1/16th notes.
+Voice Limit: Max harmony voices playing at once, across all played notes (0 - Unlimited).
+Steal: Which harmony voice is stopped once the Voice Limit is reached - Oldest, Quietest or Farthest from its played note.
+Chord Dedupe: Build the harmony of notes played together as one chord, dropping harmony notes that double each other or played notes.
+    The harmony comes in 1 tick after the played notes, once the whole chord has arrived, even with Strum at 0.
+
+Key: Key to quantize the harmony notes to.
+Scale: Scale to quantize the harmony notes to.
+
+Range Above: Randomization range of harmony note above played note.
+Range Below: Randomization range of harmony note below played note.
+Random Relative: Enable Randomization based on a range above/below played note.
+
+Min: Randomization minimum threshold for harmony note.
+Max: Randomization maximum threshold for harmony note.
+Random Min Max: Enable Randomization based on min/max thresholds.
+
+Seed: Randomization Seed - the same seed repeats the same random harmony. 0 - Unseeded.
+"""
+
+class Group:
+    NAME: str
+
+class VoiceGroup(Group):
+    NAME: str = "Voices"
+    VOICE: str = "Voice"
+    TRANSPOSE: str = "Transpose"
+    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
+    STRUM: str = "Strum"
+    CHORD_DEDUPE: str = "Chord Dedupe"
+    VOICE_LIMIT: str = "Voice Limit"
+    STEAL_MODE: str = "Steal"
+
+class RandomRelativeGroup(Group):
+    NAME: str = "Random Relative"
+    RANDOM_RANGE_ABOVE: str = "Range Above"
+    RANDOM_RANGE_BELOW: str = "Range Below"
+
+class RandomMinMaxGroup(Group):
+    NAME: str = "Random Min Max"
+    RANDOM_MIN: str = "Min"
+    RANDOM_MAX: str = "Max"
+
+class RandomSeedGroup(Group):
+    NAME: str = "Random Seed"
+    SEED: str = "Seed"
+
+class QuantizeGroup(Group):
+    NAME: str = "Quantize"
+    KEY: str = "Key"
+    SCALE: str = "Scale"
+
+
+class Groups:
+    QUANTIZE: QuantizeGroup = QuantizeGroup()
+    VOICE: VoiceGroup = VoiceGroup()
+    RANDOM_RELATIVE: RandomRelativeGroup = RandomRelativeGroup()
+    RANDOM_MIN_MAX: RandomMinMaxGroup = RandomMinMaxGroup()
+    RANDOM_SEED: RandomSeedGroup = RandomSeedGroup()
+
+class Interface:
+    GROUPS: Groups = Groups()
+
+    SCALE_MAJOR = "Major"
+    SCALE_MINOR = "Minor"
+    SCALE_PENTATONIC_MAJOR = "Pentatonic Major"
+    SCALE_PENTATONIC_MINOR = "Pentatonic Minor"
+    SCALE_HIJAZ = "Hijaz"
+    SCALE_CHROMATIC = "Chromatic"
+
+    STEAL_OLDEST = "Oldest"
+    STEAL_QUIETEST = "Quietest"
+    STEAL_FARTHEST = "Farthest"
+
+
+class Const:
+    NUM_OF_VOICES: int = 4
+    DEFAULT_TRANSPOSE_VALUES: tuple[int, ...] = (3, 7, 12, -12)
+    MIN_GAP = 3 * NUM_OF_VOICES
+    STRUM_MAX_LEN: int = vfx.context.PPQ * 4 * 32
+    STRUM_RELEASE_MULTIPLIER: int = vfx.context.PPQ / 16
+    UI_POLL_TICKS: int = max(1, int(vfx.context.PPQ) // 16) # Check UI constraints every 1/64th note
+    VOICE_POOL_SIZE: int = 256 # Max released voices kept for reuse, per voice type
+    MAX_VOICE_LIMIT: int = 64
+    RANDOM_BUFFER_SIZE: int = 256
+    PROFILE: bool = False  # Time callbacks & stages - read once as the script loads, so set it here
+    PROFILE_REPORT_TICKS: int = 0  # Print the profiler report every N ticks, 0 = only on profiler.dump()
+
+@dataclass
+class Key:
+    key: str
+    value: int
+
+class Keys:
+    key_name_list = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+    keys_list: list[Key] = [Key(key=key, value=index) for index, key in enumerate(key_name_list)]
+    keys_list_interface = [key_obj.key for key_obj in keys_list]
+
+
+@dataclass
+class Scale:
+    key: str
+    value: list
+
+class Scales:
+    scales_dict = {
+        Interface.SCALE_MAJOR: Scale(key=Interface.SCALE_MAJOR, value=[1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1]),
+        Interface.SCALE_MINOR: Scale(key=Interface.SCALE_MINOR, value=[1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0]),
+        Interface.SCALE_PENTATONIC_MAJOR: Scale(key=Interface.SCALE_PENTATONIC_MAJOR, value=[1, 0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 0]),
+        Interface.SCALE_PENTATONIC_MINOR: Scale(key=Interface.SCALE_PENTATONIC_MINOR, value=[1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0]),
+        Interface.SCALE_HIJAZ: Scale(key=Interface.SCALE_HIJAZ, value=[1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 0]),
+        Interface.SCALE_CHROMATIC: Scale(key=Interface.SCALE_CHROMATIC, value=[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]),
+    }
+    scales_list_interface = [scale.key for scale in scales_dict.values()]
+    scales_list = [scale for scale in scales_dict.values()]
+
+
+class StealModes:
+    OLDEST = 0
+    QUIETEST = 1
+    FARTHEST = 2
+    steal_modes_list_interface = [Interface.STEAL_OLDEST, Interface.STEAL_QUIETEST, Interface.STEAL_FARTHEST]
+
+class ScaleQuantize:
+    """Quantize notes to key & scale through (key x scale) rows of a note lookup table.
+    Rows are built lazily on the first note in their key & scale, and dropped when the scale set changes."""
+    NOTE_RANGE_LOW = -12  # Any lower note quantizes & limits to 0 anyway
+    NOTE_RANGE_HIGH = 143  # Any higher note quantizes & limits to 131 anyway
+
+    def __init__(self):
+        self.scales = Scales()
+        self.keys = Keys()
+
+        self.key_list = self.keys.keys_list
+        self.scale_list = self.scales.scales_list
+
+        self.key_list_interface = self.keys.keys_list_interface
+        self.scale_list_interface = self.scales.scales_list_interface
+
+        self.rows: list[list[int] | None] = []
+        self.build_table()
+
+    def build_table(self):
+        """Reset the quantize table - call again whenever the scale set changes"""
+        self.scale_list = self.scales.scales_list
+        self.rows = [None] * (len(self.key_list) * len(self.scale_list))
+
+    def _build_row(self, key_index, scale_index) -> list[int]:
+        tonic = self.key_list[key_index].value
+        scale = self.scale_list[scale_index].value
+        row = [limit_note(self._calc_quantized_note(note, tonic, scale))
+               for note in range(self.NOTE_RANGE_LOW, self.NOTE_RANGE_HIGH + 1)]
+        self.rows[key_index * len(self.scale_list) + scale_index] = row
+        return row
+
+    @staticmethod
+    def _calc_quantized_note(note, tonic, scale):
+        degree = (note - tonic) % 12
+
+        if scale[degree] == 1:
+            return note
+        else:
+            i = 1
+            while scale[(degree + i) % 12] != 1:
+                i += 1
+            offset = i
+        return note + offset
+
+    def quantize_note(self, note, key_index, scale_index):
+        note = int(note)
+        if note < self.NOTE_RANGE_LOW:
+            note = self.NOTE_RANGE_LOW
+        elif note > self.NOTE_RANGE_HIGH:
+            note = self.NOTE_RANGE_HIGH
+        row = self.rows[key_index * len(self.scale_list) + scale_index]
+        if row is None:
+            row = self._build_row(key_index, scale_index)
+        return row[note - self.NOTE_RANGE_LOW]
+
+
+@dataclass(slots=True)
+class VoiceState:
+    """Fixed-layout scheduling state of a script voice, reset whenever the voice is recycled"""
+    parent_voice: object = None
+    trigger_tick: int = None
+    release_tick: int = None
+    triggered: bool = False
+    released: bool = False
+    generation: int = 0
+
+    def reset(self, parent_voice):
+        self.parent_voice = parent_voice
+        self.trigger_tick = None
+        self.release_tick = None
+        self.triggered = False
+        self.released = False
+        self.generation += 1
+
+
+class BaseVoice(vfx.Voice):
+    state: VoiceState = None
+    note_offset: int = 0
+    velocity_multiplier = 1
+
+    @property
+    def parent_voice(self):
+        return self.state.parent_voice
+
+    def reset(self, parent_voice):
+        """Reset the per-note state, for a new or a recycled voice"""
+        if self.state is None:
+            self.state = VoiceState()
+        self.state.reset(parent_voice)
+
+class HarmonyVoice(BaseVoice):
+    delay = 0
+    repeat = 0
+
+    def reset(self, parent_voice):
+        super().reset(parent_voice)
+        self.note_offset = 0
+        self.delay = 0
+        self.repeat = 0
+
+class MainVoice(BaseVoice):
+    pass
+
+
+class VoicePool:
+    """Recycle released script voices instead of allocating new ones for every note"""
+    def __init__(self, max_size: int = Const.VOICE_POOL_SIZE):
+        self.max_size = max_size
+        self._free: dict[type, list[BaseVoice]] = {}
+
+    def acquire(self, voice_class: type, source_voice: vfx.Voice, parent_voice: vfx.Voice) -> BaseVoice:
+        free_voices = self._free.get(voice_class)
+        voice = free_voices.pop() if free_voices else voice_class()
+        voice.copyFrom(source_voice)
+        voice.reset(parent_voice)
+        return voice
+
+    def recycle(self, voice: BaseVoice):
+        free_voices = self._free.setdefault(type(voice), [])
+        if len(free_voices) < self.max_size:
+            free_voices.append(voice)
+
+
+class VoiceRegistry:
+    """Index script voices by their parent voice, so triggers & releases only touch that note's own voices.
+    Voices are keyed by id(), keeping add & remove O(1)."""
+    def __init__(self):
+        self._children: dict[int, dict[int, BaseVoice]] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, voice: BaseVoice):
+        children = self._children.setdefault(id(voice.parent_voice), {})
+        if id(voice) not in children:
+            children[id(voice)] = voice
+            self._count += 1
+
+    def remove(self, voice: BaseVoice):
+        parent_id = id(voice.parent_voice)
+        children = self._children.get(parent_id)
+        if children is not None and children.pop(id(voice), None) is not None:
+            self._count -= 1
+            if not children:
+                del self._children[parent_id]
+
+    def get_children(self, parent_voice) -> list[BaseVoice]:
+        children = self._children.get(id(parent_voice))
+        return list(children.values()) if children else []
+
+
+class VoiceScheduler:
+    """Min-heap of voice triggers & releases by absolute due tick, so onTick only handles the events that are due.
+    Rescheduling or cancelling a voice just moves its due tick - stale heap entries are skipped once popped."""
+    TRIGGER = 0  # Triggers sort before releases due on the same tick
+    RELEASE = 1
+    COMPACT_MIN_EVENTS = 64
+
+    def __init__(self):
+        self.tick = 0
+        self._events: list[tuple] = []
+        self._event_count = 0
+        self._live_events = 0
+
+    def _get_due_tick(self, delay) -> int:
+        """Countdown in ticks -> absolute tick it runs out on, which is never earlier than the next tick"""
+        return self.tick + max(math.ceil(delay), 1)
+
+    def _push(self, due_tick: int, event: int, voice: BaseVoice):
+        self._event_count += 1
+        self._live_events += 1
+        heapq.heappush(self._events, (due_tick, event, self._event_count, voice, voice.state.generation))
+
+    def schedule(self, voice: BaseVoice, trigger_delay, release_delay):
+        state = voice.state
+        state.trigger_tick = self._get_due_tick(trigger_delay)
+        state.release_tick = self._get_due_tick(release_delay)
+        self._push(state.trigger_tick, self.TRIGGER, voice)
+        self._push(state.release_tick, self.RELEASE, voice)
+
+    def reschedule_release(self, voice: BaseVoice, release_delay):
+        state = voice.state
+        if state.release_tick is not None and not state.released:
+            self._live_events -= 1
+        state.release_tick = self._get_due_tick(release_delay)
+        self._push(state.release_tick, self.RELEASE, voice)
+        self._compact_if_stale()
+
+    def cancel(self, voice: BaseVoice):
+        """Cancel a voice's pending events - call before releasing the voice by hand"""
+        state = voice.state
+        if state.trigger_tick is not None and not state.triggered:
+            self._live_events -= 1
+        if state.release_tick is not None and not state.released:
+            self._live_events -= 1
+        state.trigger_tick = None
+        state.release_tick = None
+        self._compact_if_stale()
+
+    def _is_event_live(self, due_tick: int, event: int, voice: BaseVoice, generation: int) -> bool:
+        state = voice.state
+        if generation != state.generation: # Voice was recycled since
+            return False
+        if event == self.TRIGGER:
+            return due_tick == state.trigger_tick and not state.triggered
+        return due_tick == state.release_tick and not state.released
+
+    def _compact_if_stale(self):
+        """Drop stale entries once they outnumber the live ones, so cancelled long releases don't pile up"""
+        if len(self._events) <= max(2 * self._live_events, self.COMPACT_MIN_EVENTS):
+            return
+        self._events = [entry for entry in self._events
+                        if self._is_event_live(entry[0], entry[1], entry[3], entry[4])]
+        heapq.heapify(self._events)
+        self._live_events = len(self._events)
+
+    def advance(self) -> list[BaseVoice]:
+        """Move to the next tick & run the events due on it, returns the voices released on this tick"""
+        self.tick += 1
+        released_voices = []
+        events = self._events
+        while events and events[0][0] <= self.tick:
+            due_tick, event, _, voice, generation = heapq.heappop(events)
+            if not self._is_event_live(due_tick, event, voice, generation):
+                continue
+            self._live_events -= 1
+            if event == self.TRIGGER:
+                voice.trigger()
+                voice.state.triggered = True
+            else:
+                voice.release()
+                voice.state.released = True
+                released_voices.append(voice)
+        return released_voices
+
+
+class Logger:
+    """Level-gated logger for the real-time callbacks. Messages are only formatted when their level is enabled,
+    and are kept in a bounded ring buffer that can be dumped to the script console with dump()."""
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    OFF = 100
+
+    def __init__(self, level: int = INFO, buffer_size: int = 256, echo: bool = False):
+        self.level = level
+        self.echo = echo  # Also print every kept message as it comes in
+        self.buffer: deque[str] = deque(maxlen=buffer_size)
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        self.buffer.append(message)
+        if self.echo:
+            print(message)
+
+    def debug(self, message: str, *args):
+        self.log(self.DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(self.INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(self.WARNING, message, *args)
+
+    def dump(self):
+        """Print & clear the buffered messages"""
+        while self.buffer:
+            print(self.buffer.popleft())
+
+
+log = Logger()  # Set log.level = Logger.DEBUG & log.echo = True to trace notes in the console
+
+
+class LatencyHistogram:
+    """Fixed-size histogram of wall times in log-spaced buckets, 8 per octave (~9% wide), from 0.1us to ~100ms"""
+    MIN_NS = 100
+    BUCKETS_PER_OCTAVE = 8
+    BUCKET_COUNT = 160
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.counts = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns: int):
+        index = int(math.log2(ns / self.MIN_NS) * self.BUCKETS_PER_OCTAVE) if ns > self.MIN_NS else 0
+        self.counts[min(index, self.BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, fraction: float) -> float:
+        """Upper edge of the bucket the given fraction of the samples falls in, in ns"""
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(self.MIN_NS * 2 ** ((index + 1) / self.BUCKETS_PER_OCTAVE), self.max_ns)
+        return self.max_ns
+
+
+class Profiler:
+    """Opt-in wall time histograms per callback & named stage, to find what stutters in a dense project.
+    Stages are wrapped as the script loads & only if the profiler is enabled then, so a disabled profiler costs
+    nothing - enable it with Const.PROFILE, changing enabled afterwards has no effect."""
+    def __init__(self, enabled: bool = False, report_ticks: int = 0):
+        self.enabled = enabled  # Fixed at load - the stages are wrapped or not when they're defined
+        self.report_ticks = report_ticks  # Print the report every report_ticks ticks, 0 = only on dump()
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._ticks = 0
+
+    def stage(self, name: str, counts_ticks: bool = False):
+        """Decorator timing every call of a callback or stage under name - counts_ticks marks onTick,
+        which triggers the periodic report"""
+        def decorate(func):
+            if not self.enabled:
+                return func
+            histogram = self.histograms.setdefault(name, LatencyHistogram())
+
+            @wraps(func)
+            def timed(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.add(perf_counter_ns() - start)
+                    if counts_ticks:
+                        self._count_tick()
+            return timed
+        return decorate
+
+    def _count_tick(self):
+        self._ticks += 1
+        if self.report_ticks and self._ticks % self.report_ticks == 0:
+            self.dump()
+
+    def report(self) -> list[str]:
+        """One line per stage, slowest total first - calls, p50, p99 & max"""
+        width = max((len(name) for name in self.histograms), default=5) + 2
+        lines = [f"{'stage':<{width}}{'calls':>8}{'p50':>10}{'p99':>10}{'max':>10}"]
+        for name, histogram in sorted(self.histograms.items(), key=lambda item: -item[1].total_ns):
+            if histogram.count:
+                lines.append(f"{name:<{width}}{histogram.count:>8}{histogram.percentile(0.5) / 1e3:>8.1f}us"
+                             f"{histogram.percentile(0.99) / 1e3:>8.1f}us{histogram.max_ns / 1e3:>8.1f}us")
+        return lines
+
+    def dump(self):
+        """Print the report to the script console"""
+        for line in self.report():
+            print(line)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+
+profiler = Profiler(enabled=Const.PROFILE, report_ticks=Const.PROFILE_REPORT_TICKS)  # Report with profiler.dump()
+
+
+def get_group_controller_str(group, name = ''):
+    """Get group controller string without acquiring value - for static definitions"""
+    name = name if name else group.NAME
+    return f"{group.NAME}: {name}"
+
+def get_group_controller(group, name = ''):
+    return vfx.context.form.getInputValue(get_group_controller_str(group, name))
+
+def set_group_controller(group, value, name = ''):
+    """Set group controller value"""
+    log.debug("set %s = %s", get_group_controller_str(group, name), value)
+    vfx.context.form.setNormalizedValue(get_group_controller_str(group, name), value)
+
+
+def limit_note(note: int):
+    """Make sure notes are never above 131(B10), or below 0(C0)"""
+    return max(0, min(note, 131))
+
+
+@dataclass(frozen=True, slots=True)
+class HarmonyControls:
+    """Every control value a played note needs, read from the form in one pass"""
+    active_voices: int
+    transposes: tuple[int, ...]
+    velocity_multiplier: float
+    strum_delay: int
+    is_chord_dedupe: bool
+    voice_limit: int
+    steal_mode: int
+    key: int
+    scale: int
+    is_random_relative: bool
+    is_random_min_max: bool
+    random_range_above: int
+    random_range_below: int
+    random_min: int
+    random_max: int
+    random_seed: int
+
+    @property
+    def is_strum_enabled(self) -> bool:
+        return bool(self.strum_delay)
+
+    @property
+    def is_random_enabled(self) -> bool:
+        return self.is_random_relative or self.is_random_min_max
+
+
+HARMONY_CONTROL_KEYS = (
+    *[get_group_controller_str(VoiceGroup, f"{VoiceGroup.VOICE} {i}") for i in range(1, Const.NUM_OF_VOICES + 1)],
+    *[get_group_controller_str(VoiceGroup, f"{VoiceGroup.TRANSPOSE} {i}") for i in range(1, Const.NUM_OF_VOICES + 1)],
+    get_group_controller_str(VoiceGroup, VoiceGroup.VELOCITY_MULTIPLIER),
+    get_group_controller_str(VoiceGroup, VoiceGroup.STRUM),
+    get_group_controller_str(VoiceGroup, VoiceGroup.CHORD_DEDUPE),
+    get_group_controller_str(VoiceGroup, VoiceGroup.VOICE_LIMIT),
+    get_group_controller_str(VoiceGroup, VoiceGroup.STEAL_MODE),
+    get_group_controller_str(QuantizeGroup, QuantizeGroup.KEY),
+    get_group_controller_str(QuantizeGroup, QuantizeGroup.SCALE),
+    get_group_controller_str(RandomRelativeGroup),
+    get_group_controller_str(RandomMinMaxGroup),
+    get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE),
+    get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW),
+    get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN),
+    get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX),
+    get_group_controller_str(RandomSeedGroup, RandomSeedGroup.SEED),
+)
+
+
+def build_harmony_controls(values: tuple) -> HarmonyControls:
+    """Build the controls snapshot from values read in HARMONY_CONTROL_KEYS order"""
+    voices_enabled = values[:Const.NUM_OF_VOICES]
+    transposes = values[Const.NUM_OF_VOICES:2 * Const.NUM_OF_VOICES]
+    (velocity_multiplier, strum_delay, is_chord_dedupe, voice_limit, steal_mode, key, scale, is_random_relative, is_random_min_max,
+     random_range_above, random_range_below, random_min, random_max, random_seed) = values[2 * Const.NUM_OF_VOICES:]
+    return HarmonyControls(active_voices=sum(1 for enabled in voices_enabled if enabled),
+                           transposes=tuple(transposes),
+                           velocity_multiplier=velocity_multiplier,
+                           strum_delay=strum_delay,
+                           is_chord_dedupe=bool(is_chord_dedupe),
+                           voice_limit=voice_limit,
+                           steal_mode=steal_mode,
+                           key=key,
+                           scale=scale,
+                           is_random_relative=bool(is_random_relative),
+                           is_random_min_max=bool(is_random_min_max),
+                           random_range_above=random_range_above,
+                           random_range_below=random_range_below,
+                           random_min=random_min,
+                           random_max=random_max,
+                           random_seed=int(random_seed))
+
+
+class ControlSnapshotService:
+    """Read the controls through precomputed keys at most once per tick, and rebuild the snapshot only when a
+    control actually changed. The version goes up on every rebuild."""
+    def __init__(self, control_keys: tuple[str, ...], build_snapshot):
+        self.control_keys = control_keys
+        self.build_snapshot = build_snapshot
+        self.version = 0
+        self.snapshot = None
+        self._values: tuple = ()
+        self._read_tick = None
+
+    def invalidate(self):
+        """Read the controls again on the next snapshot, even within the same tick"""
+        self._read_tick = None
+
+    def get_snapshot(self, tick: int):
+        if tick != self._read_tick:
+            self._read_tick = tick
+            get_input_value = vfx.context.form.getInputValue
+            values = tuple([get_input_value(control_key) for control_key in self.control_keys])
+            if values != self._values:
+                self._values = values
+                self.snapshot = self.build_snapshot(values)
+                self.version += 1
+        return self.snapshot
+
+
+selected = None
+random_switches = [
+    get_group_controller_str(RandomRelativeGroup),
+    get_group_controller_str(RandomMinMaxGroup)
+]
+prev_state = [0] * len(random_switches)
+voice_registry = VoiceRegistry()  # Every voice the script owns, by parent voice, until released
+scheduler = VoiceScheduler()  # Strummed voices' pending triggers & releases
+voice_pool = VoicePool()
+quantizer = ScaleQuantize()
+controls_service = ControlSnapshotService(HARMONY_CONTROL_KEYS, build_harmony_controls)
+prev_above = 1
+prev_below = 1
+prev_min = 0
+prev_max = 0
+
+
+class RandomBuffer:
+    """Per-instance random source. Values are generated in batches into a buffer that onTick tops up,
+    so notes only read values out of it. A non-zero seed makes the sequence reproducible -
+    it starts over whenever the song position jumps back, so every playback from the start plays the same."""
+    def __init__(self, size: int = Const.RANDOM_BUFFER_SIZE):
+        self.size = size
+        self.seed = None
+        self._generator = random.Random()
+        self._values: deque[float] = deque()
+        self._song_tick = None
+
+    def set_seed(self, seed: int):
+        """Restart the sequence from seed (0 - unseeded), only when the seed changed"""
+        if seed == self.seed:
+            return
+        self.seed = seed
+        self.restart()
+
+    def restart(self):
+        """Start the sequence over from the seed - an unseeded source draws a new random seed"""
+        self._generator.seed(self.seed if self.seed else random.getrandbits(64))
+        self._values.clear()
+        self.refill()
+
+    def follow_transport(self, song_tick: int):
+        """Restart when the song position went back since the last tick, e.g. when playback restarts"""
+        if self._song_tick is not None and song_tick < self._song_tick:
+            self.restart()
+        self._song_tick = song_tick
+
+    def refill(self):
+        """Top the buffer up once it's half empty - call outside the note path"""
+        if len(self._values) <= self.size // 2:
+            generate = self._generator.random
+            self._values.extend([generate() for _ in range(self.size - len(self._values))])
+
+    def random(self) -> float:
+        if not self._values:
+            self.refill()
+        return self._values.popleft()
+
+    def _index(self, length: int) -> int:
+        return min(int(self.random() * length), length - 1)
+
+    def sample(self, population, k: int) -> list:
+        values = list(population)
+        for i in range(k):
+            j = i + self._index(len(values) - i)
+            values[i], values[j] = values[j], values[i]
+        return values[:k]
+
+
+random_source = RandomBuffer()
+
+
+class RandomService:
+    def __init__(self, controls: HarmonyControls, incoming_voice: vfx.Voice):
+        self.controls = controls
+        self.active_voices = controls.active_voices
+        self.incoming_voice = incoming_voice
+        self.key = controls.key
+        self.scale = controls.scale
+        self.random_strategy = self._determine_strategy()
+
+
+    def _determine_strategy(self):
+        if self.controls.is_random_relative:
+            return self._relative_strategy
+        elif self.controls.is_random_min_max:
+            return self._min_max_strategy
+        else:
+            return None
+
+    def _relative_strategy(self):
+        candidate_notes = self._get_candidate_notes_relative()
+        return self._sample_unique_notes(candidate_notes)
+
+    def _min_max_strategy(self):
+        candidate_notes = self._get_candidate_notes_min_max()
+        return self._sample_unique_notes(candidate_notes)
+
+    @profiler.stage("RandomService.randomize_notes")
+    def randomize_notes(self) -> list:
+        """Random notes for the active voices - fewer when the range has fewer distinct scale notes"""
+        random_notes = self.random_strategy()
+        for random_note in random_notes:
+            log.debug("random note = %s", random_note)
+        return random_notes
+
+    def _get_candidate_notes_min_max(self):
+        rand_min = self.controls.random_min
+        rand_max = self.controls.random_max
+        return [i for i in range(rand_min, rand_max) if i != int(self.incoming_voice.note)]
+
+    def _get_candidate_notes_relative(self):
+        random_range_above = self.controls.random_range_above
+        random_range_below = self.controls.random_range_below
+        possible_values = [i for i in range(-1 * random_range_below, random_range_above + 1) if i != 0]
+        return [int(self.incoming_voice.note) + offset for offset in possible_values]
+
+    def _get_quantized_notes(self, random_notes: list) -> list:
+        quantized_notes = []
+        for rnd_note in random_notes:
+            rnd_note = quantizer.quantize_note(rnd_note, key_index=self.key, scale_index=self.scale)
+            quantized_notes.append(rnd_note)
+        return quantized_notes
+
+    def _sample_unique_notes(self, candidate_notes: list) -> list:
+        """Sample the active voices' notes out of the distinct quantized candidates, so no retries are needed.
+        If the range holds fewer scale notes than active voices, every scale note is used once & the rest of the
+        voices are dropped, rather than doubling a note - candidates quantized onto the played note included."""
+        unique_notes = list(dict.fromkeys(self._get_quantized_notes(candidate_notes)))
+        played_note = int(self.incoming_voice.note)
+        if played_note in unique_notes:
+            unique_notes.remove(played_note)
+        return random_source.sample(unique_notes, min(self.active_voices, len(unique_notes)))
+
+
+class HarmonyVoiceWorker:
+    def __init__(self, incoming_voice: vfx.Voice):
+        self.incoming_voice = incoming_voice
+        self.main_voice : vfx.Voice = None
+        self.harmony_voices: list[HarmonyVoice] = []
+        self.controls = controls_service.get_snapshot(scheduler.tick)
+        random_source.set_seed(self.controls.random_seed)
+        self.active_voices: int = self.controls.active_voices
+        self.is_strum_enabled = self.controls.is_strum_enabled
+        self.is_random_enabled = self.controls.is_random_enabled
+        self.key = self.controls.key
+        self.scale = self.controls.scale
+        self.velocity_multiplier = self.controls.velocity_multiplier
+        self.strum_delay = self.controls.strum_delay
+        self.random_service = RandomService(controls=self.controls, incoming_voice=self.incoming_voice)
+
+    @profiler.stage("HarmonyVoiceWorker.acquire_voices")
+    def acquire_voices(self, taken_notes: set[int] = None):
+        self.acquire_main_voice()
+        self.acquire_harmony_voices(taken_notes)
+
+    def acquire_main_voice(self):
+        self.main_voice = voice_pool.acquire(MainVoice, self.incoming_voice, parent_voice=self.incoming_voice)
+        voice_registry.add(self.main_voice)
+
+    @profiler.stage("HarmonyVoiceWorker.acquire_harmony_voices")
+    def acquire_harmony_voices(self, taken_notes: set[int] = None):
+        """Create the harmony voices - when taken_notes is given, voices landing on a taken note are dropped,
+        & the notes of the kept voices are added to it"""
+        for note, repeat in self.get_harmony_notes(taken_notes):
+            new_voice = voice_pool.acquire(HarmonyVoice, self.incoming_voice, parent_voice=self.incoming_voice)
+            new_voice.velocity *= self.velocity_multiplier
+            new_voice.note = note
+            if repeat:
+                new_voice.repeat = repeat
+                new_voice.delay = self.strum_delay
+            self.harmony_voices.append(new_voice)
+
+        for voice in self.harmony_voices:
+            if self.is_strum_enabled:
+                trigger_count = voice.repeat * Const.STRUM_RELEASE_MULTIPLIER * voice.delay + 1
+                release_count = trigger_count + Const.STRUM_MAX_LEN # Release after being triggered + after MAX LEN at most
+                scheduler.schedule(voice, trigger_count, release_count)
+            voice_registry.add(voice)
+        for voice in self.harmony_voices:
+            harmony_budget.add(voice, self.controls.voice_limit, self.controls.steal_mode)
+
+    @profiler.stage("HarmonyVoiceWorker.get_harmony_notes")
+    def get_harmony_notes(self, taken_notes: set[int] = None) -> list[tuple[int, int]]:
+        """Plan the harmony of the incoming note - returns its (note, strum repeat) list, repeat is 0 when not strummed"""
+        if self.is_random_enabled:
+            notes = self.random_service.randomize_notes() if self.active_voices else []
+        else:
+            notes = []
+            for i in range(1, self.active_voices + 1):
+                note = quantizer.quantize_note(self.incoming_voice.note + self.controls.transposes[i - 1],
+                                               key_index=self.key, scale_index=self.scale)
+                log.debug("NEW NOTE: %s", note)
+                notes.append(note)
+
+        harmony_notes = [(note, i if self.is_strum_enabled else 0) for i, note in enumerate(notes, 1)]
+        if taken_notes is not None:
+            harmony_notes = self._drop_taken_notes(harmony_notes, taken_notes)
+        return harmony_notes
+
+    @staticmethod
+    def _drop_taken_notes(harmony_notes: list[tuple[int, int]], taken_notes: set[int]) -> list[tuple[int, int]]:
+        kept_notes = []
+        for note, repeat in harmony_notes:
+            if int(note) not in taken_notes:
+                taken_notes.add(int(note))
+                kept_notes.append((note, repeat))
+        return kept_notes
+
+    def trigger_voices(self):
+        self.acquire_voices()
+        self.trigger_main_voice()
+        self.trigger_harmony_voices()
+
+    def trigger_main_voice(self):
+        self.main_voice.trigger()
+        self.main_voice.state.triggered = True
+
+    def trigger_harmony_voices(self):
+        if not self.is_strum_enabled:
+            for voice in self.harmony_voices:
+                if not voice.state.triggered:
+                    voice.trigger()
+                    voice.state.triggered = True
+
+
+def ui_relative_limits():
+    """Get state of relative above & below ranges, ensure there's a set gap between them to prevent
+     out of range voice allocation"""
+    global prev_above, prev_below
+    relative_above = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
+    relative_below = get_group_controller(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW)
+    if (relative_above + relative_below) < Const.MIN_GAP:
+        if prev_above != relative_above:
+            relative_below = abs(Const.MIN_GAP - relative_above)
+            set_group_controller(RandomRelativeGroup, relative_below / 48, RandomRelativeGroup.RANDOM_RANGE_BELOW)
+        elif prev_below != relative_below:
+            relative_above = abs(Const.MIN_GAP - relative_below)
+            set_group_controller(RandomRelativeGroup, relative_above / 48, RandomRelativeGroup.RANDOM_RANGE_ABOVE)
+    prev_above = relative_above
+    prev_below = relative_below
+
+
+def ui_min_max_limits():
+    """Get state of min & max ranges, ensure there's a set gap between them to prevent out of range voice allocation"""
+    global prev_min, prev_max
+    min_val = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN)
+    max_val = get_group_controller(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX)
+    if (max_val - min_val) < Const.MIN_GAP:
+        if prev_min != min_val:
+            max_val = min(min_val + Const.MIN_GAP, 127)
+            set_group_controller(RandomMinMaxGroup, max_val / 127, RandomMinMaxGroup.RANDOM_MAX)
+            if min_val > (127 - Const.MIN_GAP):
+                min_val = 127 - Const.MIN_GAP
+                set_group_controller(RandomMinMaxGroup, min_val / 127, RandomMinMaxGroup.RANDOM_MIN)
+        elif prev_max != max_val:
+            min_val = max(max_val - Const.MIN_GAP, 0)
+            set_group_controller(RandomMinMaxGroup, min_val / 127, RandomMinMaxGroup.RANDOM_MIN)
+            if max_val < Const.MIN_GAP:
+                max_val = Const.MIN_GAP
+                set_group_controller(RandomMinMaxGroup, max_val / 127, RandomMinMaxGroup.RANDOM_MAX)
+        prev_min = min_val
+        prev_max = max_val
+
+
+def ui_random_state():
+    """Get state of random checkboxes, ensure only 1 checkbox can be selected at most"""
+    global selected, prev_state
+    new_selected = None
+    for index, switch in enumerate(random_switches):
+        current_value = vfx.context.form.getInputValue(switch)
+        if current_value == 1 and prev_state[index] == 0:
+            new_selected = index
+        prev_state[index] = current_value
+    all_off = all(state == 0 for state in prev_state)
+    if new_selected is not None:
+        selected = new_selected
+    if not all_off and selected is not None:
+        for index, switch in enumerate(random_switches):
+            value = 1 if index == selected else 0
+            if prev_state[index] != value: # Only write switches that need to flip
+                vfx.context.form.setNormalizedValue(switch, value)
+
+
+@dataclass
+class UIRule:
+    """UI constraint, with the controls it depends on"""
+    control_keys: tuple[str, ...]
+    apply: Callable
+    last_values: tuple = ()
+
+
+class UIConstraintService:
+    """Run the UI constraints only when one of their related controls changed, instead of on every tick.
+    Polls read only the rules' own controls, not the whole controls snapshot."""
+    def __init__(self, rules: list[UIRule]):
+        self.rules = rules
+
+    @profiler.stage("UIConstraintService.check")
+    def check(self, tick: int):
+        if tick % Const.UI_POLL_TICKS:
+            return
+        self.enforce()
+
+    def enforce(self):
+        """Run the rules whose controls changed since the last run"""
+        get_input_value = vfx.context.form.getInputValue
+        for rule in self.rules:
+            values = tuple([get_input_value(control_key) for control_key in rule.control_keys])
+            if values != rule.last_values:
+                rule.last_values = values
+                rule.apply()
+
+
+ui_constraints = UIConstraintService([
+    UIRule(control_keys=tuple(random_switches), apply=ui_random_state),
+    UIRule(control_keys=(get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MIN),
+                         get_group_controller_str(RandomMinMaxGroup, RandomMinMaxGroup.RANDOM_MAX)),
+           apply=ui_min_max_limits),
+    UIRule(control_keys=(get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_ABOVE),
+                         get_group_controller_str(RandomRelativeGroup, RandomRelativeGroup.RANDOM_RANGE_BELOW)),
+           apply=ui_relative_limits),
+])
+
+
+class HarmonyVoiceBudget:
+    """Global cap on live harmony voices. Past the limit, the lowest priority voice is stolen - by age, velocity
+    or distance from its played note. Uses a lazy min-heap, so bookkeeping is O(log n) per voice."""
+    COMPACT_MIN_ENTRIES = 64
+
+    def __init__(self):
+        self._voices: dict[int, int] = {}  # id(voice) -> state generation, for the voices counted
+        self._heap: list[tuple] = []
+        self._steal_mode = StealModes.OLDEST
+        self._push_count = 0
+
+    def __len__(self):
+        return len(self._voices)
+
+    def _get_priority(self, voice: HarmonyVoice) -> float:
+        if self._steal_mode == StealModes.QUIETEST:
+            return voice.velocity
+        if self._steal_mode == StealModes.FARTHEST:
+            return -abs(voice.note - voice.parent_voice.note)
+        return 0  # Oldest - the add order breaks the tie
+
+    def _push(self, voice: HarmonyVoice):
+        self._push_count += 1
+        heapq.heappush(self._heap, (self._get_priority(voice), self._push_count, voice.state.generation, voice))
+
+    def _is_entry_live(self, entry: tuple) -> bool:
+        return self._voices.get(id(entry[3])) == entry[2]
+
+    def _rebuild(self):
+        voices = [entry[3] for entry in self._heap if self._is_entry_live(entry)]
+        self._heap = []
+        for voice in voices:
+            self._push(voice)
+
+    def add(self, voice: HarmonyVoice, voice_limit: int, steal_mode: int):
+        if steal_mode != self._steal_mode:
+            self._steal_mode = steal_mode
+            self._rebuild()
+        self._voices[id(voice)] = voice.state.generation
+        self._push(voice)
+        while voice_limit and len(self._voices) > voice_limit:
+            self._steal()
+        if len(self._heap) > max(2 * len(self._voices), self.COMPACT_MIN_ENTRIES):
+            self._rebuild()
+
+    def remove(self, voice: BaseVoice):
+        self._voices.pop(id(voice), None)
+
+    def _steal(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._is_entry_live(entry):
+                steal_voice(entry[3])
+                return
+
+
+def retire_voice(voice: BaseVoice):
+    """Forget a released voice, and return it to the pool"""
+    voice_registry.remove(voice)
+    harmony_budget.remove(voice)
+    voice_pool.recycle(voice)
+
+
+def steal_voice(voice: HarmonyVoice):
+    """Stop a harmony voice before its time - a pending strummed voice is just never triggered"""
+    scheduler.cancel(voice)
+    if voice.state.triggered:
+        voice.release()
+    voice.state.triggered = True
+    voice.state.released = True
+    retire_voice(voice)
+
+
+harmony_budget = HarmonyVoiceBudget()
+
+
+class ChordBatch:
+    """Collect the notes triggered on the same tick, and build their harmony together on the next tick.
+    Harmony notes doubling another harmony note or a played note of the chord are dropped.
+    FL doesn't signal the last note of a chord, so the next onTick is the first point the chord is known whole -
+    the harmony lags the played notes by that 1 tick."""
+    def __init__(self):
+        self._workers: dict[int, HarmonyVoiceWorker] = {}
+
+    def add(self, worker: HarmonyVoiceWorker):
+        self._workers[id(worker.incoming_voice)] = worker
+
+    def discard(self, incoming_voice: vfx.Voice):
+        self._workers.pop(id(incoming_voice), None)
+
+    @profiler.stage("ChordBatch.flush")
+    def flush(self):
+        if not self._workers:
+            return
+        workers = list(self._workers.values())
+        self._workers.clear()
+        taken_notes = {int(worker.incoming_voice.note) for worker in workers}
+        for worker in workers:
+            worker.acquire_harmony_voices(taken_notes)
+            worker.trigger_harmony_voices()
+
+
+chord_batch = ChordBatch()
+
+
+@profiler.stage("onTriggerVoice")
+def onTriggerVoice(incomingVoice):
+    random_source.follow_transport(vfx.context.ticks)
+    harmony_voice_worker = HarmonyVoiceWorker(incomingVoice)
+    if harmony_voice_worker.controls.is_chord_dedupe:
+        harmony_voice_worker.acquire_main_voice()
+        harmony_voice_worker.trigger_main_voice()
+        chord_batch.add(harmony_voice_worker)
+    else:
+        harmony_voice_worker.trigger_voices()
+
+@profiler.stage("onReleaseVoice")
+def onReleaseVoice(incomingVoice):
+    chord_batch.discard(incomingVoice)
+    for voice in voice_registry.get_children(incomingVoice):
+        if isinstance(voice, MainVoice) or voice.repeat == 0: # If not strummed, release immediately
+            voice.release()
+            voice.state.released = True
+            retire_voice(voice)
+        else: # Live Harmony Voice is strummed, release it in strum order
+            scheduler.reschedule_release(voice, voice.repeat * Const.STRUM_RELEASE_MULTIPLIER * voice.delay + 1)
+
+
+@profiler.stage("retire_due_voices")
+def retire_due_voices():
+    for voice in scheduler.advance():
+        retire_voice(voice)
+
+
+@profiler.stage("onTick", counts_ticks=True)
+def onTick():
+    random_source.follow_transport(vfx.context.ticks)
+    chord_batch.flush()
+    retire_due_voices()
+
+    ui_constraints.check(scheduler.tick)
+    random_source.refill()
+
+
+@dataclass(slots=True)
+class ScoreNote:
+    """A piano roll note for score processing - start time & length in ticks"""
+    time: int
+    length: int
+    note: int
+    velocity: float
+
+
+def process_score(notes: list[ScoreNote]) -> list[ScoreNote]:
+    """Bake the harmony of a whole pattern in one pass, with the current control values, instead of building it
+    note by note on every playback. Returns the played & harmony notes, sorted by time.
+    Chord Dedupe applies to notes starting together, the Voice Limit is not applied.
+    The UI constraints are applied first, like onTick does on playback."""
+    ui_constraints.enforce()
+    controls_service.invalidate()  # Re-read the controls the UI constraints may have just moved
+    controls = controls_service.get_snapshot(scheduler.tick)
+    random_source.set_seed(controls.random_seed)
+    random_source.restart()  # Every render of the same pattern plays the same random notes
+    chords: dict[int, list[ScoreNote]] = {}
+    for score_note in sorted(notes, key=lambda n: n.time):
+        chords.setdefault(score_note.time, []).append(score_note)
+
+    baked_notes = []
+    for chord in chords.values():
+        taken_notes = {int(score_note.note) for score_note in chord} if controls.is_chord_dedupe else None
+        for score_note in chord:
+            baked_notes.append(ScoreNote(time=score_note.time, length=score_note.length,
+                                         note=int(score_note.note), velocity=score_note.velocity))
+            harmony_velocity = score_note.velocity * controls.velocity_multiplier
+            for note, repeat in HarmonyVoiceWorker(score_note).get_harmony_notes(taken_notes):
+                strum_offset = math.ceil(repeat * Const.STRUM_RELEASE_MULTIPLIER * controls.strum_delay + 1) if repeat else 0
+                length = min(score_note.length, Const.STRUM_MAX_LEN) if repeat else score_note.length
+                baked_notes.append(ScoreNote(time=score_note.time + strum_offset, length=max(length, 1),
+                                             note=int(note), velocity=harmony_velocity))
+    baked_notes.sort(key=lambda n: n.time)
+    return baked_notes
+
+
+def createDialog():
+    form = vfx.ScriptDialog('', script_text)
+    groups = Interface.GROUPS
+    form.addGroup(groups.VOICE.NAME)
+    for i in range(1, Const.NUM_OF_VOICES + 1):
+        form.addInputCheckbox(f'{groups.VOICE.VOICE} {i}', 1, hint=f'Enable Voice {i}')
+        form.addInputKnobInt(f'{groups.VOICE.TRANSPOSE} {i}', Const.DEFAULT_TRANSPOSE_VALUES[i-1], -12, 12, hint=f'Transpose Voice {i}')
+    form.addInputKnob(groups.VOICE.VELOCITY_MULTIPLIER, 0.5, 0, 2, hint='Voice Velocity Multiplier')
+    form.addInputKnobInt(groups.VOICE.STRUM, 0, 0, 16, hint='Strum Timing')
+    form.addInputKnobInt(groups.VOICE.VOICE_LIMIT, 0, 0, Const.MAX_VOICE_LIMIT, hint='Max Harmony Voices | 0 = Unlimited')
+    form.AddInputCombo(groups.VOICE.STEAL_MODE, StealModes.steal_modes_list_interface, 0, hint='Harmony Voice to Steal at the Limit')
+    form.addInputCheckbox(groups.VOICE.CHORD_DEDUPE, 0, hint='Build Chord Harmony Together & Drop Doubled Notes | Harmony comes in 1 tick late')
+    form.endGroup()
+
+
+    form.addGroup(groups.QUANTIZE.NAME)
+    form.AddInputCombo(groups.QUANTIZE.KEY, quantizer.key_list_interface, 0, hint='Quantize to Key')
+    form.AddInputCombo(groups.QUANTIZE.SCALE, quantizer.scale_list_interface, 2, hint='Quantize to Scale')
+    form.endGroup()
+
+    form.addGroup(groups.RANDOM_RELATIVE.NAME)
+    form.addInputKnobInt(groups.RANDOM_RELATIVE.RANDOM_RANGE_ABOVE, 12, 1, 48, hint=f'Random Range for Harmony Above')
+    form.addInputKnobInt(groups.RANDOM_RELATIVE.RANDOM_RANGE_BELOW, 12, 1, 48, hint=f'Random Range for Harmony Below')
+    form.addInputCheckbox(groups.RANDOM_RELATIVE.NAME, 0, hint='Enable Relative Harmony Randomization')
+    form.endGroup()
+
+    form.addGroup(groups.RANDOM_MIN_MAX.NAME)
+    form.addInputKnobInt(groups.RANDOM_MIN_MAX.RANDOM_MIN, 49, 0, 126, hint=f'Random Min Limit for Harmony')
+    form.addInputKnobInt(groups.RANDOM_MIN_MAX.RANDOM_MAX, 89, 0, 127, hint=f'Random Max Limit for Harmony')
+    form.addInputCheckbox(groups.RANDOM_MIN_MAX.NAME, 0, hint='Enable Min/Max Harmony Randomization')
+    form.endGroup()
+
+    form.addGroup(groups.RANDOM_SEED.NAME)
+    form.addInputKnobInt(groups.RANDOM_SEED.SEED, 0, 0, 9999, hint='Randomization Seed | 0 = Unseeded')
+    form.endGroup()
+    return form
@@ -1,364 +1,962 @@
-import flvfx as vfx  # VFX Script API, for FL <-> Python communication
-from dataclasses import dataclass, field, asdict
-import random
-import math
-
-
-script_text = """Sharpend's Harp
-Harp Crescendo-like simulation by playing fast notes that progress towards target note.
-----------------------------
-Time Base: Note length to determine the Harp Crescendo base length.
-Time Multiplier: Multiplier of Time Base to determine the Harp Crescendo length.
-Polyphony Safe: Ensure every note played only starts playing after the previous note finished.
-Timing Curve: Affect the timing relationship between notes. 0 - Linear | < 0 Logarithmic | > 0 Exponential.
-
-Harp Direction: Determines the Harp Crescendo direction.
-Velocity Multiplier: Velocity Multiplier of Harp notes.
-Lower Limit: Lowest MIDI note the harp will start from (0-126)
-Higher Limit: Highest MIDI note the harp will start from (1-127)
-
-Key: Key to quantize the Harp notes to.
-Scale: Scale to quantize the Harp notes to.
-"""
-
-
-
-
-@dataclass(frozen=True)
-class QuantizeGroup:
-    NAME: str = "Quantize"
-    KEY: str = "Key"
-    SCALE: str = "Scale"
-
-@dataclass(frozen=True)
-class TimeGroup:
-    NAME: str = "Time"
-    TIME_BASE: str = "Time Base"
-    TIME_MULTIPLIER: str = "Time Multiplier"
-    POLYPHONY_SAFE: str = "Polyphony Safe"
-    TIMING_CURVE: str = "Timing Curve"
-
-@dataclass(frozen=True)
-class HarpSettingsGroup:
-    NAME: str = "Harp Settings"
-    HARP_DIRECTION: str = "Harp Direction"
-    HARP_LOW_LIMIT: str = "Lower Limit"
-    HARP_HIGH_LIMIT: str = "Higher Limit"
-    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
-
-@dataclass(frozen=True)
-class Groups:
-    QUANTIZE: QuantizeGroup = QuantizeGroup()
-    TIME: TimeGroup = TimeGroup()
-    HARP_SETTINGS: HarpSettingsGroup = HarpSettingsGroup()
-
-@dataclass(frozen=True)
-class Interface:
-    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
-    TIME_BASE: str = "Time Base"
-    TIME_MULTIPLIER: str = "Time Multiplier"
-    HARP_DIRECTION: str = "Harp Direction"
-    HARP_DIRECTION_UP: str = "Upwards"
-    HARP_DIRECTION_DOWN: str = "Downwards"
-    HARP_LOW_LIMIT: str = "Lower Limit"
-    HARP_HIGH_LIMIT: str = "Higher Limit"
-    POLYPHONY_SAFE: str = "Polyphony Safe"
-    TIMING_CURVE: str = "Timing Curve"
-    GROUPS: Groups = Groups()
-
-
-
-    SCALE_MAJOR = "Major"
-    SCALE_MINOR = "Minor"
-    SCALE_PENTATONIC_MAJOR = "Pentatonic Major"
-    SCALE_PENTATONIC_MINOR = "Pentatonic Minor"
-    SCALE_HIJAZ = "Hijaz"
-    SCALE_CHROMATIC = "Chromatic"
-
-
-@dataclass(frozen=True)
-class Const:
-    HARP_LEN: int = int(vfx.context.PPQ) // 4
-    VOICE_MAX_LEN: int = vfx.context.PPQ * 4 * 32
-
-@dataclass
-class TimeDiv:
-    key: int
-    value: float
-
-class TimeDivisions:
-    divisions_dict = {
-        "1/32": TimeDiv(key=0, value=1/32),
-        "1/16": TimeDiv(key=1, value=1/16),
-        "1/8": TimeDiv(key=2, value=1/8),
-        "1/4": TimeDiv(key=3, value=1/4),
-        "1/2": TimeDiv(key=4, value=1/2),
-        "1 Bar": TimeDiv(key=5, value=1),
-        "2 Bars": TimeDiv(key=6, value=2),
-        "4 Bars": TimeDiv(key=7, value=4),
-    }
-    divisions_list_interface = [div for div in divisions_dict.keys()]
-    divisions_list = [div for div in divisions_dict.values()]
-
-
-@dataclass
-class HarpDir:
-    key: str
-    value: int
-
-
-class HarpDirection:
-    UP: HarpDir = HarpDir(key=Interface.HARP_DIRECTION_UP, value=0)
-    DOWN: HarpDir = HarpDir(key=Interface.HARP_DIRECTION_DOWN, value=1)
-    harp_direction_list = [UP, DOWN]
-    harp_direction_list_interface = [harp_direction.key for harp_direction in harp_direction_list]
-
-@dataclass
-class Key:
-    key: str
-    value: int
-
-
-class Keys:
-    key_name_list = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    keys_list: list[Key] = [Key(key=key, value=index) for index, key in enumerate(key_name_list)]
-    keys_list_interface = [key_obj.key for key_obj in keys_list]
-
-
-@dataclass
-class Scale:
-    key: str
-    value: list
-
-class Scales:
-    scales_dict = {
-        Interface.SCALE_MAJOR: Scale(key=Interface.SCALE_MAJOR, value=[1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1]),
-        Interface.SCALE_MINOR: Scale(key=Interface.SCALE_MINOR, value=[1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0]),
-        Interface.SCALE_PENTATONIC_MAJOR: Scale(key=Interface.SCALE_PENTATONIC_MAJOR, value=[1, 0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 0]),
-        Interface.SCALE_PENTATONIC_MINOR: Scale(key=Interface.SCALE_PENTATONIC_MINOR, value=[1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0]),
-        Interface.SCALE_HIJAZ: Scale(key=Interface.SCALE_HIJAZ, value=[1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 0]),
-        Interface.SCALE_CHROMATIC: Scale(key=Interface.SCALE_CHROMATIC, value=[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]),
-    }
-    scales_list_interface = [scale.key for scale in scales_dict.values()]
-    scales_list = [scale for scale in scales_dict.values()]
-
-
-class ScaleQuantize:
-    def __init__(self):
-        self.scales = Scales()
-        self.keys = Keys()
-
-        self.key_list = self.keys.keys_list
-        self.scale_list = self.scales.scales_list
-
-        self.key_list_interface = self.keys.keys_list_interface
-        self.scale_list_interface = self.scales.scales_list_interface
-
-    def quantize_note(self, note, key_index, scale_index):
-        note = int(note)
-        key_obj = self.key_list[key_index]
-        scale_obj = self.scale_list[scale_index]
-
-        tonic = key_obj.value
-        scale = scale_obj.value
-
-        degree = (note - tonic) % 12
-
-        if scale[degree] == 1:
-            return note
-        else:
-            i = 1
-            while scale[(degree + i) % 12] != 1:
-                i += 1
-            offset = i
-        return note + offset
-
-
-class BaseVoice(vfx.Voice):
-    parent_voice = None
-    velocity_multiplier = 1
-    trigger_count = 0
-    release_count = 0
-    triggered = False
-    released = False
-
-class MainVoice(BaseVoice):
-    pass
-
-
-class HarpVoice(BaseVoice):
-    pass
-
-
-voiceList: list[BaseVoice] = []
-quantizer = ScaleQuantize()
-
-def get_group_controller(group, name):
-    return vfx.context.form.getInputValue(f"{group.NAME}: {name}")
-
-
-class HarpVoiceWorker:
-    def __init__(self, incoming_voice: vfx.Voice):
-        self.incoming_voice = incoming_voice
-        self.main_voice: vfx.Voice = None
-        self.key = get_group_controller(Interface.GROUPS.QUANTIZE, QuantizeGroup.KEY)
-        self.scale = get_group_controller(Interface.GROUPS.QUANTIZE, QuantizeGroup.SCALE)
-        self.velocity_multiplier = get_group_controller(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.VELOCITY_MULTIPLIER)
-        self.direction = get_group_controller(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.HARP_DIRECTION)
-        self.harp_low_limit = get_group_controller(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.HARP_LOW_LIMIT)
-        self.harp_high_limit = get_group_controller(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.HARP_HIGH_LIMIT)
-        self.timing_curve = get_group_controller(Interface.GROUPS.TIME, TimeGroup.TIMING_CURVE)
-
-        self.time_base = TimeDivisions.divisions_list[int(get_group_controller(Interface.GROUPS.TIME, TimeGroup.TIME_BASE))].value
-        self.time_multiplier = get_group_controller(Interface.GROUPS.TIME, TimeGroup.TIME_MULTIPLIER)
-        self.bar_length = vfx.context.PPQ * 4
-        self.is_polyphony_safe = get_group_controller(Interface.GROUPS.TIME, TimeGroup.POLYPHONY_SAFE)
-
-    def acquire_voices(self):
-        self.main_voice = MainVoice()
-        self.main_voice.copyFrom(self.incoming_voice)
-        self.main_voice.parent_voice = self.incoming_voice
-        note_list = self.get_harp_notes_list_with_direction()
-        if not note_list:
-            self.main_voice.trigger()
-            return
-        main_voices_notes = [int(v.note) for v in voiceList if isinstance(v, MainVoice)]
-        main_voices_notes.append(int(self.main_voice.note))
-        print(f"main voices: {main_voices_notes}")
-        unique_note_list = [note for note in note_list if int(note) not in main_voices_notes]
-        print(unique_note_list)
-        total = len(unique_note_list)
-        if not total:
-            self.main_voice.trigger()
-            return
-        fixed_total_duration = self.bar_length * self.time_base * self.time_multiplier
-        delays = self.get_delay_list(num_notes=total, max_delay=fixed_total_duration)
-        polyphony_releases = [delays[idx + 1] - delays[idx] for idx in range(total)]
-        max_release = 0
-        note_length = Const.HARP_LEN
-        for idx, quantized_note in enumerate(unique_note_list):
-
-
-            delay = delays[idx]
-            release_length = delay + polyphony_releases[idx] if self.is_polyphony_safe else delay + note_length
-
-            new_voice = HarpVoice()
-            new_voice.copyFrom(self.main_voice)
-            new_voice.parent_voice = self.incoming_voice
-            new_voice.velocity *= self.velocity_multiplier
-            new_voice.note = quantized_note
-            new_voice.trigger_count = delay
-            new_voice.release_count = release_length
-
-            max_release = max(max_release, new_voice.release_count)
-            voiceList.append(new_voice)
-        latest_trigger_not_polyphony_safe = max(delays) + 1
-        main_voice_trigger = max_release + 1 if self.is_polyphony_safe else latest_trigger_not_polyphony_safe
-        self.main_voice.trigger_count = main_voice_trigger
-        self.main_voice.release_count = self.main_voice.trigger_count + Const.VOICE_MAX_LEN
-        voiceList.append(self.main_voice)
-        print(self.main_voice.__dict__)
-
-
-    def get_harp_notes_list_with_direction(self):
-        note_list = []
-        range_end = int(self.main_voice.note)
-        if self.direction == HarpDirection.UP.value:
-            range_start = self.harp_low_limit
-            range_end = range_end if range_end < self.harp_high_limit else self.harp_high_limit
-            range_step = 1
-
-        elif self.direction == HarpDirection.DOWN.value:
-            range_start = self.harp_high_limit
-            range_end = range_end if range_end > self.harp_low_limit else self.harp_low_limit
-            range_step = -1
-
-        for note in range(range_start, range_end, range_step):
-            quantized_note = quantizer.quantize_note(note, key_index=self.key, scale_index=self.scale)
-            note_list.append(quantized_note)
-        return note_list
-
-    def get_delay_list(self, num_notes, max_delay):
-        values = []
-        num_notes += 1
-        curve_strength = 8 ** self.timing_curve
-        for i in range(num_notes):
-            t = i / (num_notes - 1)  # normalized x from 0 to 1
-
-            if curve_strength == 1:
-                y = t
-            elif curve_strength > 1:
-                y = t ** curve_strength  # exponential-style
-            else:
-                y = 1 - (1 - t) ** (1 / curve_strength)  # logarithmic-style
-
-            values.append(int(round(y * max_delay)))
-
-        return values
-
-
-def onTriggerVoice(incomingVoice):
-    harp_voice_worker = HarpVoiceWorker(incomingVoice)
-    harp_voice_worker.acquire_voices()
-
-
-def onTick():
-    for voice in voiceList[:]:
-        voice.trigger_count -= 1
-        if voice.trigger_count <= 0 and not voice.triggered:
-            voice.trigger()
-            voice.triggered = True
-        voice.release_count -= 1
-        if voice.release_count <= 0 and not voice.released:
-            if voice is not None:
-                voice.release()
-                voice.released = True
-            voiceList.remove(voice)
-
-
-def onReleaseVoice(incomingVoice):
-    for live_voice in vfx.context.voices:
-        if live_voice.parent_voice == incomingVoice:
-            live_voice.release()
-            live_voice.released = True
-            if live_voice in voiceList:
-                voiceList.remove(live_voice)
-    for voice in voiceList[:]:
-        if isinstance(voice, MainVoice) and voice.parent_voice == incomingVoice:
-            voice.trigger_count = 0
-            voice.release_count = 1
-
-    harm_voices = [v for v in voiceList if v.parent_voice == incomingVoice and not isinstance(v, MainVoice)]
-    for harm_voice in harm_voices:
-        if not harm_voice.triggered:
-            harm_voice.trigger()
-            harm_voice.triggered = True
-            harm_voice.release()
-            harm_voice.released = True
-            voiceList.remove(harm_voice)
-
-
-
-def createDialog():
-    form = vfx.ScriptDialog("Sharpend's Harp", script_text)
-    form.addGroup(Interface.GROUPS.TIME.NAME)
-    form.addInputCombo(Interface.GROUPS.TIME.TIME_BASE, TimeDivisions.divisions_list_interface, 2, hint='Time Base Division')
-    form.addInputKnobInt(Interface.GROUPS.TIME.TIME_MULTIPLIER, 1, 1, 16, hint='Time Multiplier')
-    form.addInputCheckbox(Interface.GROUPS.TIME.POLYPHONY_SAFE, 0, hint="Ensure Harp Notes don't Overlap")
-    form.addInputKnob(Interface.GROUPS.TIME.TIMING_CURVE, 0, -1, 1, hint='Timing Curve | 0 = Linear | < 0 = Logarithmic | > 0 = Exponential')
-    form.endGroup()
-
-    form.addGroup(Interface.GROUPS.HARP_SETTINGS.NAME)
-    form.AddInputCombo(Interface.GROUPS.HARP_SETTINGS.HARP_DIRECTION, HarpDirection.harp_direction_list_interface,
-                       HarpDirection.UP.value, hint='Harp Direction')
-    form.addInputKnob(Interface.GROUPS.HARP_SETTINGS.VELOCITY_MULTIPLIER, 0.5, 0, 2, hint='Voice Velocity Multiplier')
-    form.addInputKnobInt(Interface.GROUPS.HARP_SETTINGS.HARP_LOW_LIMIT, 48, 0, 126, hint=f'Low Limit for Harp')
-    form.addInputKnobInt(Interface.GROUPS.HARP_SETTINGS.HARP_HIGH_LIMIT, 96, 1, 127, hint=f'High Limit for Harp')
-    form.endGroup()
-
-    form.addGroup(Interface.GROUPS.QUANTIZE.NAME)
-    form.AddInputCombo(Interface.GROUPS.QUANTIZE.KEY, quantizer.key_list_interface, 0, hint='Quantize to Key')
-    form.AddInputCombo(Interface.GROUPS.QUANTIZE.SCALE, quantizer.scale_list_interface, 2, hint='Quantize to Scale')
-    form.endGroup()
-    return form
-
+import flvfx as vfx  # VFX Script API, for FL <-> Python communication
+from dataclasses import dataclass, field, asdict
+import random
+import math
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import deque, OrderedDict
+from functools import wraps
+from time import perf_counter_ns
+
+
+script_text = """Sharpend's Harp
+Harp Crescendo-like simulation by playing fast notes that progress towards target note.
+----------------------------
+Time Base: Note length to determine the Harp Crescendo base length.
+Time Multiplier: Multiplier of Time Base to determine the Harp Crescendo length.
+Polyphony Safe: Ensure every note played only starts playing after the previous note finished.
+Timing Curve: Affect the timing relationship between notes. 0 - Linear | < 0 Logarithmic | > 0 Exponential.
+
+Harp Direction: Determines the Harp Crescendo direction.
+Velocity Multiplier: Velocity Multiplier of Harp notes.
+Lower Limit: Lowest MIDI note the harp will start from (0-126)
+Higher Limit: Highest MIDI note the harp will start from (1-127)
+Max Notes: Maximum notes per harp, thinned evenly across the sweep. 0 - Unlimited.
+Release Mode: What happens to harp notes that haven't played yet when the key is released.
+    Burst - play them all at once | Drop - skip them | Compress - play them in a short tail.
+
+Key: Key to quantize the Harp notes to.
+Scale: Scale to quantize the Harp notes to.
+"""
+
+
+
+
+class QuantizeGroup:
+    NAME: str = "Quantize"
+    KEY: str = "Key"
+    SCALE: str = "Scale"
+
+class TimeGroup:
+    NAME: str = "Time"
+    TIME_BASE: str = "Time Base"
+    TIME_MULTIPLIER: str = "Time Multiplier"
+    POLYPHONY_SAFE: str = "Polyphony Safe"
+    TIMING_CURVE: str = "Timing Curve"
+
+class HarpSettingsGroup:
+    NAME: str = "Harp Settings"
+    HARP_DIRECTION: str = "Harp Direction"
+    HARP_LOW_LIMIT: str = "Lower Limit"
+    HARP_HIGH_LIMIT: str = "Higher Limit"
+    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
+    MAX_NOTES: str = "Max Notes"
+    RELEASE_MODE: str = "Release Mode"
+
+class Groups:
+    QUANTIZE: QuantizeGroup = QuantizeGroup()
+    TIME: TimeGroup = TimeGroup()
+    HARP_SETTINGS: HarpSettingsGroup = HarpSettingsGroup()
+
+class Interface:
+    VELOCITY_MULTIPLIER: str = "Velocity Multiplier"
+    TIME_BASE: str = "Time Base"
+    TIME_MULTIPLIER: str = "Time Multiplier"
+    HARP_DIRECTION: str = "Harp Direction"
+    HARP_DIRECTION_UP: str = "Upwards"
+    HARP_DIRECTION_DOWN: str = "Downwards"
+    RELEASE_MODE_BURST: str = "Burst"
+    RELEASE_MODE_DROP: str = "Drop"
+    RELEASE_MODE_COMPRESS: str = "Compress"
+    HARP_LOW_LIMIT: str = "Lower Limit"
+    HARP_HIGH_LIMIT: str = "Higher Limit"
+    POLYPHONY_SAFE: str = "Polyphony Safe"
+    TIMING_CURVE: str = "Timing Curve"
+    GROUPS: Groups = Groups()
+
+
+
+    SCALE_MAJOR = "Major"
+    SCALE_MINOR = "Minor"
+    SCALE_PENTATONIC_MAJOR = "Pentatonic Major"
+    SCALE_PENTATONIC_MINOR = "Pentatonic Minor"
+    SCALE_HIJAZ = "Hijaz"
+    SCALE_CHROMATIC = "Chromatic"
+
+
+class Const:
+    HARP_LEN: int = int(vfx.context.PPQ) // 4
+    VOICE_MAX_LEN: int = vfx.context.PPQ * 4 * 32
+    VOICE_POOL_SIZE: int = 512  # Max released voices kept for reuse, per voice type
+    DELAY_CURVE_CACHE_SIZE: int = 256
+    RELEASE_TAIL_LEN: int = max(1, int(vfx.context.PPQ) // 8)  # Length of the Compress release mode tail
+    PROFILE: bool = False  # Time callbacks & stages - read once as the script loads, so set it here
+    PROFILE_REPORT_TICKS: int = 0  # Print the profiler report every N ticks, 0 = only on profiler.dump()
+
+@dataclass
+class TimeDiv:
+    key: int
+    value: float
+
+class TimeDivisions:
+    divisions_dict = {
+        "1/32": TimeDiv(key=0, value=1/32),
+        "1/16": TimeDiv(key=1, value=1/16),
+        "1/8": TimeDiv(key=2, value=1/8),
+        "1/4": TimeDiv(key=3, value=1/4),
+        "1/2": TimeDiv(key=4, value=1/2),
+        "1 Bar": TimeDiv(key=5, value=1),
+        "2 Bars": TimeDiv(key=6, value=2),
+        "4 Bars": TimeDiv(key=7, value=4),
+    }
+    divisions_list_interface = [div for div in divisions_dict.keys()]
+    divisions_list = [div for div in divisions_dict.values()]
+
+
+@dataclass
+class HarpDir:
+    key: str
+    value: int
+
+
+class HarpDirection:
+    UP: HarpDir = HarpDir(key=Interface.HARP_DIRECTION_UP, value=0)
+    DOWN: HarpDir = HarpDir(key=Interface.HARP_DIRECTION_DOWN, value=1)
+    harp_direction_list = [UP, DOWN]
+    harp_direction_list_interface = [harp_direction.key for harp_direction in harp_direction_list]
+
+
+@dataclass
+class ReleaseMode:
+    key: str
+    value: int
+
+
+class ReleaseModes:
+    BURST: ReleaseMode = ReleaseMode(key=Interface.RELEASE_MODE_BURST, value=0)
+    DROP: ReleaseMode = ReleaseMode(key=Interface.RELEASE_MODE_DROP, value=1)
+    COMPRESS: ReleaseMode = ReleaseMode(key=Interface.RELEASE_MODE_COMPRESS, value=2)
+    release_modes_list = [BURST, DROP, COMPRESS]
+    release_modes_list_interface = [release_mode.key for release_mode in release_modes_list]
+
+@dataclass
+class Key:
+    key: str
+    value: int
+
+
+class Keys:
+    key_name_list = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+    keys_list: list[Key] = [Key(key=key, value=index) for index, key in enumerate(key_name_list)]
+    keys_list_interface = [key_obj.key for key_obj in keys_list]
+
+
+@dataclass
+class Scale:
+    key: str
+    value: list
+
+class Scales:
+    scales_dict = {
+        Interface.SCALE_MAJOR: Scale(key=Interface.SCALE_MAJOR, value=[1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1]),
+        Interface.SCALE_MINOR: Scale(key=Interface.SCALE_MINOR, value=[1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0]),
+        Interface.SCALE_PENTATONIC_MAJOR: Scale(key=Interface.SCALE_PENTATONIC_MAJOR, value=[1, 0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 0]),
+        Interface.SCALE_PENTATONIC_MINOR: Scale(key=Interface.SCALE_PENTATONIC_MINOR, value=[1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0]),
+        Interface.SCALE_HIJAZ: Scale(key=Interface.SCALE_HIJAZ, value=[1, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1, 0]),
+        Interface.SCALE_CHROMATIC: Scale(key=Interface.SCALE_CHROMATIC, value=[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]),
+    }
+    scales_list_interface = [scale.key for scale in scales_dict.values()]
+    scales_list = [scale for scale in scales_dict.values()]
+
+
+class ScaleQuantize:
+    """Quantize notes to key & scale through (key x scale) rows of a note lookup table.
+    Rows are built lazily on the first note in their key & scale, and dropped when the scale set changes.
+    Every (key x scale) also keeps its sorted distinct notes, so sweeps walk scale degrees only."""
+    NOTE_RANGE_LOW = -12  # Any lower note quantizes & limits to 0 anyway
+    NOTE_RANGE_HIGH = 143  # Any higher note quantizes & limits to 131 anyway
+
+    def __init__(self):
+        self.scales = Scales()
+        self.keys = Keys()
+
+        self.key_list = self.keys.keys_list
+        self.scale_list = self.scales.scales_list
+
+        self.key_list_interface = self.keys.keys_list_interface
+        self.scale_list_interface = self.scales.scales_list_interface
+
+        self.rows: list[list[int] | None] = []
+        self.scale_notes: list[tuple[int, ...] | None] = []
+        self.build_table()
+
+    def build_table(self):
+        """Reset the quantize table - call again whenever the scale set changes"""
+        self.scale_list = self.scales.scales_list
+        self.rows = [None] * (len(self.key_list) * len(self.scale_list))
+        self.scale_notes = [None] * len(self.rows)
+
+    def _build_row(self, key_index, scale_index) -> list[int]:
+        tonic = self.key_list[key_index].value
+        scale = self.scale_list[scale_index].value
+        row = [limit_note(self._calc_quantized_note(note, tonic, scale))
+               for note in range(self.NOTE_RANGE_LOW, self.NOTE_RANGE_HIGH + 1)]
+        self.rows[key_index * len(self.scale_list) + scale_index] = row
+        return row
+
+    @staticmethod
+    def _calc_quantized_note(note, tonic, scale):
+        degree = (note - tonic) % 12
+
+        if scale[degree] == 1:
+            return note
+        else:
+            i = 1
+            while scale[(degree + i) % 12] != 1:
+                i += 1
+            offset = i
+        return note + offset
+
+    def quantize_note(self, note, key_index, scale_index):
+        note = int(note)
+        if note < self.NOTE_RANGE_LOW:
+            note = self.NOTE_RANGE_LOW
+        elif note > self.NOTE_RANGE_HIGH:
+            note = self.NOTE_RANGE_HIGH
+        row = self.rows[key_index * len(self.scale_list) + scale_index]
+        if row is None:
+            row = self._build_row(key_index, scale_index)
+        return row[note - self.NOTE_RANGE_LOW]
+
+    def _get_scale_notes(self, key_index, scale_index) -> tuple[int, ...]:
+        """Sorted distinct quantized notes of the MIDI range (0 - 127) in a key & scale"""
+        row_index = key_index * len(self.scale_list) + scale_index
+        notes = self.scale_notes[row_index]
+        if notes is None:
+            row = self.rows[row_index] or self._build_row(key_index, scale_index)
+            notes = tuple(sorted(set(row[-self.NOTE_RANGE_LOW:128 - self.NOTE_RANGE_LOW])))
+            self.scale_notes[row_index] = notes
+        return notes
+
+    def get_sweep_notes(self, range_start, range_end, range_step, key_index, scale_index) -> list[int]:
+        """Distinct quantized notes of range(range_start, range_end, range_step), in sweep order"""
+        if range_step > 0:
+            low_note, high_note = range_start, range_end - 1
+        else:
+            low_note, high_note = range_end + 1, range_start
+        if low_note > high_note:
+            return []
+        notes = self._get_scale_notes(key_index, scale_index)
+        sweep = notes[bisect_left(notes, self.quantize_note(low_note, key_index, scale_index)):
+                      bisect_right(notes, self.quantize_note(high_note, key_index, scale_index))]
+        return list(sweep) if range_step > 0 else list(reversed(sweep))
+
+
+@dataclass(slots=True)
+class VoiceState:
+    """Fixed-layout scheduling state of a script voice, reset whenever the voice is recycled"""
+    parent_voice: object = None
+    trigger_tick: int = None
+    release_tick: int = None
+    triggered: bool = False
+    released: bool = False
+    generation: int = 0
+
+    def reset(self, parent_voice):
+        self.parent_voice = parent_voice
+        self.trigger_tick = None
+        self.release_tick = None
+        self.triggered = False
+        self.released = False
+        self.generation += 1
+
+
+class BaseVoice(vfx.Voice):
+    state: VoiceState = None
+    velocity_multiplier = 1
+
+    @property
+    def parent_voice(self):
+        return self.state.parent_voice
+
+    def reset(self, parent_voice):
+        """Reset the per-note state, for a new or a recycled voice"""
+        if self.state is None:
+            self.state = VoiceState()
+        self.state.reset(parent_voice)
+
+class MainVoice(BaseVoice):
+    pass
+
+
+class HarpVoice(BaseVoice):
+    pass
+
+
+class VoicePool:
+    """Recycle released script voices instead of allocating new ones for every note"""
+    def __init__(self, max_size: int = Const.VOICE_POOL_SIZE):
+        self.max_size = max_size
+        self._free: dict[type, list[BaseVoice]] = {}
+
+    def acquire(self, voice_class: type, source_voice: vfx.Voice, parent_voice: vfx.Voice) -> BaseVoice:
+        free_voices = self._free.get(voice_class)
+        voice = free_voices.pop() if free_voices else voice_class()
+        voice.copyFrom(source_voice)
+        voice.reset(parent_voice)
+        return voice
+
+    def recycle(self, voice: BaseVoice):
+        free_voices = self._free.setdefault(type(voice), [])
+        if len(free_voices) < self.max_size:
+            free_voices.append(voice)
+
+
+class VoiceRegistry:
+    """Index script voices by their parent voice, so triggers & releases only touch that note's own voices.
+    Voices are keyed by id(), keeping add & remove O(1)."""
+    def __init__(self):
+        self._children: dict[int, dict[int, BaseVoice]] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, voice: BaseVoice):
+        children = self._children.setdefault(id(voice.parent_voice), {})
+        if id(voice) not in children:
+            children[id(voice)] = voice
+            self._count += 1
+
+    def remove(self, voice: BaseVoice):
+        parent_id = id(voice.parent_voice)
+        children = self._children.get(parent_id)
+        if children is not None and children.pop(id(voice), None) is not None:
+            self._count -= 1
+            if not children:
+                del self._children[parent_id]
+
+    def get_children(self, parent_voice) -> list[BaseVoice]:
+        children = self._children.get(id(parent_voice))
+        return list(children.values()) if children else []
+
+
+class VoiceScheduler:
+    """Min-heap of voice triggers & releases by absolute due tick, so onTick only handles the events that are due.
+    Rescheduling or cancelling a voice just moves its due tick - stale heap entries are skipped once popped."""
+    TRIGGER = 0  # Triggers sort before releases due on the same tick
+    RELEASE = 1
+    COMPACT_MIN_EVENTS = 64
+
+    def __init__(self):
+        self.tick = 0
+        self._events: list[tuple] = []
+        self._event_count = 0
+        self._live_events = 0
+
+    def _get_due_tick(self, delay) -> int:
+        """Countdown in ticks -> absolute tick it runs out on, which is never earlier than the next tick"""
+        return self.tick + max(math.ceil(delay), 1)
+
+    def _push(self, due_tick: int, event: int, voice: BaseVoice):
+        self._event_count += 1
+        self._live_events += 1
+        heapq.heappush(self._events, (due_tick, event, self._event_count, voice, voice.state.generation))
+
+    def schedule(self, voice: BaseVoice, trigger_delay, release_delay):
+        state = voice.state
+        state.trigger_tick = self._get_due_tick(trigger_delay)
+        state.release_tick = self._get_due_tick(release_delay)
+        self._push(state.trigger_tick, self.TRIGGER, voice)
+        self._push(state.release_tick, self.RELEASE, voice)
+
+    def reschedule(self, voice: BaseVoice, trigger_delay, release_delay):
+        self.cancel(voice)
+        self.schedule(voice, trigger_delay, release_delay)
+
+    def cancel(self, voice: BaseVoice):
+        """Cancel a voice's pending events - call before releasing the voice by hand"""
+        state = voice.state
+        if state.trigger_tick is not None and not state.triggered:
+            self._live_events -= 1
+        if state.release_tick is not None and not state.released:
+            self._live_events -= 1
+        state.trigger_tick = None
+        state.release_tick = None
+        self._compact_if_stale()
+
+    def _is_event_live(self, due_tick: int, event: int, voice: BaseVoice, generation: int) -> bool:
+        state = voice.state
+        if generation != state.generation: # Voice was recycled since
+            return False
+        if event == self.TRIGGER:
+            return due_tick == state.trigger_tick and not state.triggered
+        return due_tick == state.release_tick and not state.released
+
+    def _compact_if_stale(self):
+        """Drop stale entries once they outnumber the live ones, so cancelled long releases don't pile up"""
+        if len(self._events) <= max(2 * self._live_events, self.COMPACT_MIN_EVENTS):
+            return
+        self._events = [entry for entry in self._events
+                        if self._is_event_live(entry[0], entry[1], entry[3], entry[4])]
+        heapq.heapify(self._events)
+        self._live_events = len(self._events)
+
+    def advance(self) -> list[BaseVoice]:
+        """Move to the next tick & run the events due on it, returns the voices released on this tick"""
+        self.tick += 1
+        released_voices = []
+        events = self._events
+        while events and events[0][0] <= self.tick:
+            due_tick, event, _, voice, generation = heapq.heappop(events)
+            if not self._is_event_live(due_tick, event, voice, generation):
+                continue
+            self._live_events -= 1
+            if event == self.TRIGGER:
+                voice.trigger()
+                voice.state.triggered = True
+            else:
+                voice.release()
+                voice.state.released = True
+                released_voices.append(voice)
+        return released_voices
+
+
+def limit_note(note: int):
+    """Make sure notes are never above 131(B10), or below 0(C0)"""
+    return max(0, min(note, 131))
+
+
+class HeldNoteMask:
+    """Bitmask of the notes held by main voices, for O(1) harp note collision tests.
+    A note stays set while any main voice still holds it."""
+    def __init__(self):
+        self.mask = 0
+        self._notes: dict[int, int] = {}  # Held note by main voice id()
+        self._note_counts = [0] * 132
+
+    def add(self, voice: BaseVoice):
+        if id(voice) in self._notes:
+            return
+        note = int(voice.note)
+        self._notes[id(voice)] = note
+        self._note_counts[note] += 1
+        self.mask |= 1 << note
+
+    def discard(self, voice: BaseVoice):
+        note = self._notes.pop(id(voice), None)
+        if note is None:
+            return
+        self._note_counts[note] -= 1
+        if not self._note_counts[note]:
+            self.mask &= ~(1 << note)
+
+
+voice_registry = VoiceRegistry()  # Every voice the script owns, by parent voice, until released
+held_notes = HeldNoteMask()  # Notes of main voices waiting for their harp to finish
+scheduler = VoiceScheduler()
+voice_pool = VoicePool()
+quantizer = ScaleQuantize()
+
+
+class Logger:
+    """Level-gated logger for the real-time callbacks. Messages are only formatted when their level is enabled,
+    and are kept in a bounded ring buffer that can be dumped to the script console with dump()."""
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    OFF = 100
+
+    def __init__(self, level: int = INFO, buffer_size: int = 256, echo: bool = False):
+        self.level = level
+        self.echo = echo  # Also print every kept message as it comes in
+        self.buffer: deque[str] = deque(maxlen=buffer_size)
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        self.buffer.append(message)
+        if self.echo:
+            print(message)
+
+    def debug(self, message: str, *args):
+        self.log(self.DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(self.INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(self.WARNING, message, *args)
+
+    def dump(self):
+        """Print & clear the buffered messages"""
+        while self.buffer:
+            print(self.buffer.popleft())
+
+
+log = Logger()  # Set log.level = Logger.DEBUG & log.echo = True to trace notes in the console
+
+
+class LatencyHistogram:
+    """Fixed-size histogram of wall times in log-spaced buckets, 8 per octave (~9% wide), from 0.1us to ~100ms"""
+    MIN_NS = 100
+    BUCKETS_PER_OCTAVE = 8
+    BUCKET_COUNT = 160
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.counts = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns: int):
+        index = int(math.log2(ns / self.MIN_NS) * self.BUCKETS_PER_OCTAVE) if ns > self.MIN_NS else 0
+        self.counts[min(index, self.BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, fraction: float) -> float:
+        """Upper edge of the bucket the given fraction of the samples falls in, in ns"""
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(self.MIN_NS * 2 ** ((index + 1) / self.BUCKETS_PER_OCTAVE), self.max_ns)
+        return self.max_ns
+
+
+class Profiler:
+    """Opt-in wall time histograms per callback & named stage, to find what stutters in a dense project.
+    Stages are wrapped as the script loads & only if the profiler is enabled then, so a disabled profiler costs
+    nothing - enable it with Const.PROFILE, changing enabled afterwards has no effect."""
+    def __init__(self, enabled: bool = False, report_ticks: int = 0):
+        self.enabled = enabled  # Fixed at load - the stages are wrapped or not when they're defined
+        self.report_ticks = report_ticks  # Print the report every report_ticks ticks, 0 = only on dump()
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._ticks = 0
+
+    def stage(self, name: str, counts_ticks: bool = False):
+        """Decorator timing every call of a callback or stage under name - counts_ticks marks onTick,
+        which triggers the periodic report"""
+        def decorate(func):
+            if not self.enabled:
+                return func
+            histogram = self.histograms.setdefault(name, LatencyHistogram())
+
+            @wraps(func)
+            def timed(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.add(perf_counter_ns() - start)
+                    if counts_ticks:
+                        self._count_tick()
+            return timed
+        return decorate
+
+    def _count_tick(self):
+        self._ticks += 1
+        if self.report_ticks and self._ticks % self.report_ticks == 0:
+            self.dump()
+
+    def report(self) -> list[str]:
+        """One line per stage, slowest total first - calls, p50, p99 & max"""
+        width = max((len(name) for name in self.histograms), default=5) + 2
+        lines = [f"{'stage':<{width}}{'calls':>8}{'p50':>10}{'p99':>10}{'max':>10}"]
+        for name, histogram in sorted(self.histograms.items(), key=lambda item: -item[1].total_ns):
+            if histogram.count:
+                lines.append(f"{name:<{width}}{histogram.count:>8}{histogram.percentile(0.5) / 1e3:>8.1f}us"
+                             f"{histogram.percentile(0.99) / 1e3:>8.1f}us{histogram.max_ns / 1e3:>8.1f}us")
+        return lines
+
+    def dump(self):
+        """Print the report to the script console"""
+        for line in self.report():
+            print(line)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+
+profiler = Profiler(enabled=Const.PROFILE, report_ticks=Const.PROFILE_REPORT_TICKS)  # Report with profiler.dump()
+
+
+def get_group_controller_str(group, name):
+    """Get group controller string without acquiring value - for static definitions"""
+    return f"{group.NAME}: {name}"
+
+
+@dataclass(frozen=True, slots=True)
+class HarpControls:
+    """Every control value a played note needs, read from the form in one pass"""
+    key: int
+    scale: int
+    velocity_multiplier: float
+    direction: int
+    harp_low_limit: int
+    harp_high_limit: int
+    max_notes: int
+    release_mode: int
+    timing_curve: float
+    time_base: float
+    time_multiplier: int
+    is_polyphony_safe: int
+
+
+HARP_CONTROL_KEYS = (
+    get_group_controller_str(Interface.GROUPS.QUANTIZE, QuantizeGroup.KEY),
+    get_group_controller_str(Interface.GROUPS.QUANTIZE, QuantizeGroup.SCALE),
+    get_group_controller_str(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.VELOCITY_MULTIPLIER),
+    get_group_controller_str(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.HARP_DIRECTION),
+    get_group_controller_str(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.HARP_LOW_LIMIT),
+    get_group_controller_str(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.HARP_HIGH_LIMIT),
+    get_group_controller_str(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.MAX_NOTES),
+    get_group_controller_str(Interface.GROUPS.HARP_SETTINGS, HarpSettingsGroup.RELEASE_MODE),
+    get_group_controller_str(Interface.GROUPS.TIME, TimeGroup.TIMING_CURVE),
+    get_group_controller_str(Interface.GROUPS.TIME, TimeGroup.TIME_BASE),
+    get_group_controller_str(Interface.GROUPS.TIME, TimeGroup.TIME_MULTIPLIER),
+    get_group_controller_str(Interface.GROUPS.TIME, TimeGroup.POLYPHONY_SAFE),
+)
+
+
+def build_harp_controls(values: tuple) -> HarpControls:
+    """Build the controls snapshot from values read in HARP_CONTROL_KEYS order"""
+    (key, scale, velocity_multiplier, direction, harp_low_limit, harp_high_limit, max_notes,
+     release_mode, timing_curve, time_base, time_multiplier, is_polyphony_safe) = values
+    return HarpControls(key=key,
+                        scale=scale,
+                        velocity_multiplier=velocity_multiplier,
+                        direction=direction,
+                        harp_low_limit=harp_low_limit,
+                        harp_high_limit=harp_high_limit,
+                        max_notes=int(max_notes),
+                        release_mode=int(release_mode),
+                        timing_curve=timing_curve,
+                        time_base=TimeDivisions.divisions_list[int(time_base)].value,
+                        time_multiplier=time_multiplier,
+                        is_polyphony_safe=is_polyphony_safe)
+
+
+class ControlSnapshotService:
+    """Read the controls through precomputed keys at most once per tick, and rebuild the snapshot only when a
+    control actually changed. The version goes up on every rebuild."""
+    def __init__(self, control_keys: tuple[str, ...], build_snapshot):
+        self.control_keys = control_keys
+        self.build_snapshot = build_snapshot
+        self.version = 0
+        self.snapshot = None
+        self._values: tuple = ()
+        self._read_tick = None
+
+    def get_snapshot(self, tick: int):
+        if tick != self._read_tick:
+            self._read_tick = tick
+            get_input_value = vfx.context.form.getInputValue
+            values = tuple([get_input_value(control_key) for control_key in self.control_keys])
+            if values != self._values:
+                self._values = values
+                self.snapshot = self.build_snapshot(values)
+                self.version += 1
+        return self.snapshot
+
+
+controls_service = ControlSnapshotService(HARP_CONTROL_KEYS, build_harp_controls)
+
+
+class DelayCurveCache:
+    """LRU cache of normalized (0 - 1) harp delay curves, keyed on point count & timing curve.
+    Harp notes only rescale a cached curve by the harp duration."""
+    def __init__(self, max_size: int = Const.DELAY_CURVE_CACHE_SIZE):
+        self.max_size = max_size
+        self._curves: OrderedDict[tuple, tuple[float, ...]] = OrderedDict()
+
+    def get_curve(self, num_points: int, timing_curve: float) -> tuple[float, ...]:
+        key = (num_points, timing_curve)
+        curve = self._curves.get(key)
+        if curve is not None:
+            self._curves.move_to_end(key)
+            return curve
+        curve = self._build_curve(num_points, timing_curve)
+        self._curves[key] = curve
+        if len(self._curves) > self.max_size:
+            self._curves.popitem(last=False)
+        return curve
+
+    @staticmethod
+    def _build_curve(num_points: int, timing_curve: float) -> tuple[float, ...]:
+        last_point = num_points - 1
+        curve_strength = 8 ** timing_curve
+        if curve_strength == 1:
+            return tuple(i / last_point for i in range(num_points))
+        if curve_strength > 1:
+            return tuple((i / last_point) ** curve_strength for i in range(num_points))  # exponential-style
+        inverse_strength = 1 / curve_strength
+        return tuple(1 - (1 - i / last_point) ** inverse_strength for i in range(num_points))  # logarithmic-style
+
+
+delay_curves = DelayCurveCache()
+
+
+class HarpVoiceWorker:
+    def __init__(self, incoming_voice: vfx.Voice):
+        self.incoming_voice = incoming_voice
+        self.main_voice: vfx.Voice = None
+        self.controls = controls_service.get_snapshot(scheduler.tick)
+        self.key = self.controls.key
+        self.scale = self.controls.scale
+        self.velocity_multiplier = self.controls.velocity_multiplier
+        self.direction = self.controls.direction
+        self.harp_low_limit = self.controls.harp_low_limit
+        self.harp_high_limit = self.controls.harp_high_limit
+        self.max_notes = self.controls.max_notes
+        self.timing_curve = self.controls.timing_curve
+
+        self.time_base = self.controls.time_base
+        self.time_multiplier = self.controls.time_multiplier
+        self.bar_length = vfx.context.PPQ * 4
+        self.is_polyphony_safe = self.controls.is_polyphony_safe
+
+    @profiler.stage("HarpVoiceWorker.acquire_voices")
+    def acquire_voices(self):
+        self.main_voice = voice_pool.acquire(MainVoice, self.incoming_voice, parent_voice=self.incoming_voice)
+        voice_registry.add(self.main_voice)
+        harp_notes, main_voice_trigger = self.get_harp_plan(held_notes.mask)
+        if not harp_notes:
+            self.main_voice.trigger()
+            self.main_voice.state.triggered = True
+            return
+        for quantized_note, delay, release_length in harp_notes:
+            new_voice = voice_pool.acquire(HarpVoice, self.main_voice, parent_voice=self.incoming_voice)
+            new_voice.velocity *= self.velocity_multiplier
+            new_voice.note = quantized_note
+            scheduler.schedule(new_voice, delay, release_length)
+            voice_registry.add(new_voice)
+        scheduler.schedule(self.main_voice, main_voice_trigger, main_voice_trigger + Const.VOICE_MAX_LEN)
+        held_notes.add(self.main_voice)
+        log.debug("main voice: %s", self.main_voice.state)
+
+    @profiler.stage("HarpVoiceWorker.get_harp_plan")
+    def get_harp_plan(self, held_mask: int) -> tuple[list[tuple[int, int, int]], int]:
+        """Plan the harp of the incoming note, skipping notes in held_mask - returns its
+        (note, trigger delay, release delay) list & the main voice trigger delay"""
+        note_list = self.get_harp_notes_list_with_direction()
+        if not note_list:
+            return [], 0
+        held_mask |= 1 << int(self.incoming_voice.note)
+        log.debug("main voices mask: %x", held_mask)
+        unique_note_list = self.thin_notes([note for note in note_list if not held_mask >> int(note) & 1])
+        log.debug("harp notes: %s", unique_note_list)
+        total = len(unique_note_list)
+        if not total:
+            return [], 0
+        fixed_total_duration = self.bar_length * self.time_base * self.time_multiplier
+        delays = self.get_delay_list(num_notes=total, max_delay=fixed_total_duration)
+        polyphony_releases = [delays[idx + 1] - delays[idx] for idx in range(total)]
+        max_release = 0
+        note_length = Const.HARP_LEN
+        harp_notes = []
+        for idx, quantized_note in enumerate(unique_note_list):
+            delay = delays[idx]
+            release_length = delay + polyphony_releases[idx] if self.is_polyphony_safe else delay + note_length
+            harp_notes.append((quantized_note, delay, release_length))
+            max_release = max(max_release, release_length)
+        latest_trigger_not_polyphony_safe = max(delays) + 1
+        main_voice_trigger = max_release + 1 if self.is_polyphony_safe else latest_trigger_not_polyphony_safe
+        return harp_notes, main_voice_trigger
+
+    @profiler.stage("HarpVoiceWorker.get_harp_notes_list_with_direction")
+    def get_harp_notes_list_with_direction(self):
+        range_end = int(self.incoming_voice.note)
+        if self.direction == HarpDirection.UP.value:
+            range_start = self.harp_low_limit
+            range_end = range_end if range_end < self.harp_high_limit else self.harp_high_limit
+            range_step = 1
+
+        elif self.direction == HarpDirection.DOWN.value:
+            range_start = self.harp_high_limit
+            range_end = range_end if range_end > self.harp_low_limit else self.harp_low_limit
+            range_step = -1
+
+        return quantizer.get_sweep_notes(range_start, range_end, range_step,
+                                         key_index=self.key, scale_index=self.scale)
+
+    def thin_notes(self, note_list):
+        """Keep at most max_notes, evenly spread across the sweep & always ending next to the target note"""
+        total = len(note_list)
+        if not self.max_notes or total <= self.max_notes:
+            return note_list
+        if self.max_notes == 1:
+            return note_list[-1:]
+        step = (total - 1) / (self.max_notes - 1)
+        return [note_list[round(idx * step)] for idx in range(self.max_notes)]
+
+    def get_delay_list(self, num_notes, max_delay):
+        curve = delay_curves.get_curve(num_points=num_notes + 1, timing_curve=self.timing_curve)
+        return [int(round(y * max_delay)) for y in curve]
+
+
+@profiler.stage("onTriggerVoice")
+def onTriggerVoice(incomingVoice):
+    harp_voice_worker = HarpVoiceWorker(incomingVoice)
+    harp_voice_worker.acquire_voices()
+
+
+@profiler.stage("onTick", counts_ticks=True)
+def onTick():
+    for voice in scheduler.advance():
+        held_notes.discard(voice)
+        voice_registry.remove(voice)
+        voice_pool.recycle(voice)
+
+
+@profiler.stage("release_pending_voices")
+def release_pending_voices(pending_voices: list[HarpVoice], release_mode: int) -> int:
+    """Handle harp voices that haven't played yet on key release, in sweep order.
+    Returns the delay in ticks the main voice should wait for the remaining harp notes."""
+    if release_mode == ReleaseModes.COMPRESS.value:
+        tail_step = Const.RELEASE_TAIL_LEN / len(pending_voices)
+        for idx, voice in enumerate(pending_voices):
+            trigger_delay = idx * tail_step
+            scheduler.reschedule(voice, trigger_delay, trigger_delay + max(tail_step, 1))
+        return Const.RELEASE_TAIL_LEN
+
+    for voice in pending_voices:
+        scheduler.cancel(voice)
+        if release_mode == ReleaseModes.BURST.value:
+            voice.trigger()
+            voice.release()
+        voice.state.triggered = True
+        voice.state.released = True
+        voice_registry.remove(voice)
+        voice_pool.recycle(voice)
+    return 0
+
+
+@profiler.stage("onReleaseVoice")
+def onReleaseVoice(incomingVoice):
+    main_voices = []
+    pending_voices = []
+    for voice in voice_registry.get_children(incomingVoice):
+        state = voice.state
+        if state.triggered and not state.released:
+            scheduler.cancel(voice)
+            voice.release()
+            state.released = True
+            held_notes.discard(voice)
+            voice_registry.remove(voice)
+            voice_pool.recycle(voice)
+        elif isinstance(voice, MainVoice):
+            main_voices.append(voice)
+        elif not state.triggered:
+            pending_voices.append(voice)
+
+    main_voice_delay = 0
+    if pending_voices:
+        release_mode = controls_service.get_snapshot(scheduler.tick).release_mode
+        main_voice_delay = release_pending_voices(pending_voices, release_mode)
+    for voice in main_voices:
+        scheduler.reschedule(voice, main_voice_delay, main_voice_delay + 1)
+
+
+
+@dataclass(slots=True)
+class ScoreNote:
+    """A piano roll note for score processing - start time & length in ticks"""
+    time: int
+    length: int
+    note: int
+    velocity: float
+
+
+def process_score(notes: list[ScoreNote]) -> list[ScoreNote]:
+    """Bake the harp of a whole pattern in one pass, with the current control values, instead of scheduling it
+    tick by tick on every playback. Returns the harp & main notes, sorted by time.
+    Delays land on the same due ticks as the scheduler's - never on the tick the note starts or ends.
+    Harp notes still unplayed when a note ends follow the Release Mode, like released keys do,
+    except that baked notes always last at least 1 tick."""
+    def due(delay) -> int:
+        return max(math.ceil(delay), 1)
+
+    controls = controls_service.get_snapshot(scheduler.tick)
+    score_held_notes = HeldNoteMask()
+    held_until: list[tuple[int, int, ScoreNote]] = []  # Heap of (main note end, id, note) for the harp collision mask
+    baked_notes = []
+    for score_note in sorted(notes, key=lambda n: n.time):
+        start, end = score_note.time, score_note.time + score_note.length
+        while held_until and held_until[0][0] <= start:
+            score_held_notes.discard(heapq.heappop(held_until)[2])
+
+        harp_notes, main_trigger = HarpVoiceWorker(score_note).get_harp_plan(score_held_notes.mask)
+        harp_velocity = score_note.velocity * controls.velocity_multiplier
+        pending_notes = []
+        for note, delay, release_length in harp_notes:
+            note_start = start + due(delay)
+            if note_start <= end:
+                note_end = min(start + due(release_length), end)
+                baked_notes.append(ScoreNote(time=note_start, length=max(note_end - note_start, 1), note=note,
+                                             velocity=harp_velocity))
+            else:
+                pending_notes.append(note)
+
+        main_start, main_end = (start + due(main_trigger), end) if harp_notes else (start, end)
+        if main_start > end:  # The key was released before the main voice played
+            tail_length = 0
+            if controls.release_mode == ReleaseModes.COMPRESS.value and pending_notes:
+                tail_step = Const.RELEASE_TAIL_LEN / len(pending_notes)
+                for idx, note in enumerate(pending_notes):
+                    note_start, note_end = end + due(idx * tail_step), end + due(idx * tail_step + max(tail_step, 1))
+                    baked_notes.append(ScoreNote(time=note_start, length=max(note_end - note_start, 1), note=note,
+                                                 velocity=harp_velocity))
+                tail_length = Const.RELEASE_TAIL_LEN
+            elif controls.release_mode == ReleaseModes.BURST.value:
+                baked_notes.extend(ScoreNote(time=end, length=1, note=note, velocity=harp_velocity)
+                                   for note in pending_notes)
+            main_start, main_end = end + due(tail_length), end + due(tail_length + 1)
+        baked_notes.append(ScoreNote(time=main_start, length=max(main_end - main_start, 1),
+                                     note=int(score_note.note), velocity=score_note.velocity))
+        if harp_notes:
+            score_held_notes.add(score_note)
+            heapq.heappush(held_until, (main_end, id(score_note), score_note))
+    baked_notes.sort(key=lambda n: n.time)
+    return baked_notes
+
+
+def createDialog():
+    form = vfx.ScriptDialog("Sharpend's Harp", script_text)
+    form.addGroup(Interface.GROUPS.TIME.NAME)
+    form.addInputCombo(Interface.GROUPS.TIME.TIME_BASE, TimeDivisions.divisions_list_interface, 2, hint='Time Base Division')
+    form.addInputKnobInt(Interface.GROUPS.TIME.TIME_MULTIPLIER, 1, 1, 16, hint='Time Multiplier')
+    form.addInputCheckbox(Interface.GROUPS.TIME.POLYPHONY_SAFE, 0, hint="Ensure Harp Notes don't Overlap")
+    form.addInputKnob(Interface.GROUPS.TIME.TIMING_CURVE, 0, -1, 1, hint='Timing Curve | 0 = Linear | < 0 = Logarithmic | > 0 = Exponential')
+    form.endGroup()
+
+    form.addGroup(Interface.GROUPS.HARP_SETTINGS.NAME)
+    form.AddInputCombo(Interface.GROUPS.HARP_SETTINGS.HARP_DIRECTION, HarpDirection.harp_direction_list_interface,
+                       HarpDirection.UP.value, hint='Harp Direction')
+    form.addInputKnob(Interface.GROUPS.HARP_SETTINGS.VELOCITY_MULTIPLIER, 0.5, 0, 2, hint='Voice Velocity Multiplier')
+    form.addInputKnobInt(Interface.GROUPS.HARP_SETTINGS.HARP_LOW_LIMIT, 48, 0, 126, hint=f'Low Limit for Harp')
+    form.addInputKnobInt(Interface.GROUPS.HARP_SETTINGS.HARP_HIGH_LIMIT, 96, 1, 127, hint=f'High Limit for Harp')
+    form.addInputKnobInt(Interface.GROUPS.HARP_SETTINGS.MAX_NOTES, 0, 0, 128, hint='Max Harp Notes | 0 = Unlimited')
+    form.AddInputCombo(Interface.GROUPS.HARP_SETTINGS.RELEASE_MODE, ReleaseModes.release_modes_list_interface,
+                       ReleaseModes.BURST.value, hint='Unplayed Harp Notes on Key Release')
+    form.endGroup()
+
+    form.addGroup(Interface.GROUPS.QUANTIZE.NAME)
+    form.AddInputCombo(Interface.GROUPS.QUANTIZE.KEY, quantizer.key_list_interface, 0, hint='Quantize to Key')
+    form.AddInputCombo(Interface.GROUPS.QUANTIZE.SCALE, quantizer.scale_list_interface, 2, hint='Quantize to Scale')
+    form.endGroup()
+    return form
+
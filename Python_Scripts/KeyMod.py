@@ -1,298 +1,582 @@
-import flvfx as vfx
-import random
-from dataclasses import dataclass, field
-
-
-@dataclass(frozen=True)
-class PitchGroup:
-    NAME: str = "Pitch"
-    PITCH_SEMITONES: str = "Transpose Semi"
-    PITCH_OCTAVE: str = "Transpose Oct"
-
-
-@dataclass(frozen=True)
-class VelocityRandomGroup:
-    NAME: str = "Velocity Randomization"
-    ENABLE_RANDOMIZATION: str = "Enable"
-    RANDOMIZE_RELATIVE_PERCENT: str = "Relative %"
-    RANDOMIZE_RELATIVE_OFFSET: str = "Relative +/-"
-    RANDOMIZE_ABSOLUTE: str = "Absolute"
-    RANDOMIZATION_MODE: str = "Mode"
-    RANDOMIZATION_MODE_OPTIONS = [
-        RANDOMIZE_ABSOLUTE,
-        RANDOMIZE_RELATIVE_PERCENT,
-        RANDOMIZE_RELATIVE_OFFSET
-    ]
-    RANDOM_RELATIVE_ABOVE: str = "Relative Above"
-    RANDOM_RELATIVE_BELOW: str = "Relative Below"
-
-
-@dataclass(frozen=True)
-class VelocityMultOffsetGroup:
-    NAME: str = "Velocity Multiplier & Offset"
-    VELOCITY_MULTIPLIER: str = "Multiplier"
-    VELOCITY_BASE: str = "Base Offset"
-
-
-@dataclass(frozen=True)
-class VelocityThresholdGroup:
-    NAME: str = "Velocity Thresholds"
-    VELOCITY_MIN: str = "Min"
-    VELOCITY_MAX: str = "Max"
-
-
-@dataclass
-class Interface:
-    PITCH_GROUP: PitchGroup = PitchGroup()
-    VELOCITY_RANDOM_GROUP: VelocityRandomGroup = VelocityRandomGroup()
-    VELOCITY_MULT_OFFSET_GROUP: VelocityMultOffsetGroup = VelocityMultOffsetGroup()
-    VELOCITY_THRESHOLD_GROUP: VelocityThresholdGroup = VelocityThresholdGroup()
-
-
-script_text = f"""Sharpend's KeyMod
-Modify Velocity & Note offset without MIDI keyboard menu diving
-New in v1.1: 2 Relative Velocity Randomization Modes
-----------------------------
-{PitchGroup.PITCH_SEMITONES}: Note Pitch offset in Semitones.
-{PitchGroup.PITCH_OCTAVE}: Note Pitch offset in Octaves.
-
-{VelocityRandomGroup.ENABLE_RANDOMIZATION}: Enable Velocity Randomization. 
-{VelocityRandomGroup.RANDOMIZATION_MODE}: Velocity Randomization Mode: {VelocityRandomGroup.RANDOMIZATION_MODE_OPTIONS}.
-{VelocityRandomGroup.RANDOM_RELATIVE_ABOVE}: Random Range for Velocity Above played Velocity.
-{VelocityRandomGroup.RANDOM_RELATIVE_BELOW}: Random Range for Velocity Below played Velocity.
-
-{VelocityMultOffsetGroup.VELOCITY_MULTIPLIER}: Velocity Multiplier.
-{VelocityMultOffsetGroup.VELOCITY_BASE}: Velocity Base Offset.
-
-{VelocityThresholdGroup.VELOCITY_MIN}: Velocity Minimum.
-{VelocityThresholdGroup.VELOCITY_MAX}: Velocity Maximum.
-"""
-
-
-def get_group_controller_str(group, name=''):
-    """Get group controller string without acquiring value - for static definitions"""
-    name = name if name else group.NAME
-    return f"{group.NAME}: {name}"
-
-
-def get_group_controller(group, name=''):
-    return vfx.context.form.getInputValue(get_group_controller_str(group, name))
-
-
-class RandomService:
-    def __init__(self, velocity, min_velocity, max_velocity):
-        self._velocity = velocity
-        self._min_velocity = min_velocity
-        self._max_velocity = max_velocity
-        self._randomization_type = self._get_randomization_type()
-        self._random_strategy = self._determine_strategy()
-
-    def _get_randomization_type(self):
-        random_mode_idx = get_group_controller(
-            group=VelocityRandomGroup,
-            name=Interface.VELOCITY_RANDOM_GROUP.RANDOMIZATION_MODE)
-        self._randomization_type = Interface.VELOCITY_RANDOM_GROUP.RANDOMIZATION_MODE_OPTIONS[random_mode_idx]
-        print(self._randomization_type)
-        return self._randomization_type
-
-    def _determine_strategy(self):
-        if self._randomization_type == Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_ABSOLUTE:
-            return self._randomize_absolute
-        elif self._randomization_type in [
-            Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_RELATIVE_PERCENT,
-            Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_RELATIVE_OFFSET]:
-            return self._randomize_relative
-        else:
-            raise KeyError('Non existing relative random range!')
-
-    def randomize_velocity(self):
-        self._random_strategy()
-        return self._velocity
-
-    def _randomize_absolute(self):
-        self._velocity = random.uniform(self._min_velocity, self._max_velocity)
-
-    @staticmethod
-    def _get_relative_direction(above, below):
-        go_above = True
-        if above > 0 and below > 0:  # both ranges are enabled
-            go_above = random.choice([True, False])  # choose whether to go above or below played velocity
-        else:  # only 1 range is enabled
-            if above > 0:
-                go_above = True
-            elif below > 0:
-                go_above = False
-        return go_above
-
-    def _randomize_relative_percent(self, is_dir_above: bool, above, below):
-        if is_dir_above:
-            multiplier = 1 + above
-        else:
-            multiplier = 1 - below
-        self._velocity = self._velocity * multiplier
-
-    def _randomize_relative_offset(self, is_dir_above: bool, above, below):
-        if is_dir_above:
-            offset = above
-        else:
-            offset = below * -1
-        self._velocity = self._velocity + offset
-
-    def _randomize_relative(self):
-        below_input = get_group_controller(group=VelocityRandomGroup,
-                                           name=Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_BELOW) / 100
-        above_input = get_group_controller(group=VelocityRandomGroup,
-                                           name=Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_ABOVE) / 100
-        below = random.uniform(0, below_input)
-        above = random.uniform(0, above_input)
-        is_dir_above = self._get_relative_direction(above, below)
-
-        if self._randomization_type == Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_RELATIVE_PERCENT:
-            self._randomize_relative_percent(is_dir_above, above, below)
-        elif self._randomization_type == Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_RELATIVE_OFFSET:
-            self._randomize_relative_offset(is_dir_above, above, below)
-        else:
-            raise KeyError('Non existing relative random range!')
-
-
-class VelocityMod:
-    def __init__(self, velocity):
-        self.velocity = velocity
-        self.min_velocity = self.get_min()
-        self.max_velocity = self.get_max()
-        self.base_velocity = self.get_base()
-        self.multiplier_velocity = self.get_multiplier()
-        self.is_randomization_enabled = self.get_is_randomization_enabled()
-        self.random_service = RandomService(velocity=self.velocity,
-                                            min_velocity=self.min_velocity, max_velocity=self.max_velocity)
-
-    def get_min(self):
-        self.min_velocity = get_group_controller(group=VelocityThresholdGroup,
-                                                 name=Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MIN)
-        return self.min_velocity
-
-    def get_max(self):
-        self.max_velocity = get_group_controller(group=VelocityThresholdGroup,
-                                                 name=Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MAX)
-        return self.max_velocity
-
-    def get_base(self):
-        self.base_velocity = get_group_controller(
-            group=VelocityMultOffsetGroup,
-            name=Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_BASE)
-        return self.base_velocity
-
-    def get_multiplier(self):
-        self.multiplier_velocity = get_group_controller(
-            group=VelocityMultOffsetGroup,
-            name=Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_MULTIPLIER)
-        return self.multiplier_velocity
-
-    def get_is_randomization_enabled(self):
-        self.is_randomization_enabled = bool(get_group_controller(
-            group=VelocityRandomGroup,
-            name=Interface.VELOCITY_RANDOM_GROUP.ENABLE_RANDOMIZATION))
-        return self.is_randomization_enabled
-
-    def randomize_velocity(self):
-        self.velocity = self.random_service.randomize_velocity()
-
-    def multiply_velocity(self):
-        self.get_multiplier()
-        self.velocity = self.velocity * self.multiplier_velocity
-
-    def add_base_to_velocity(self):
-        self.get_base()
-        self.velocity = self.velocity + self.base_velocity
-
-    def apply_thresholds_to_velocity(self):
-        self.get_min()
-        self.get_max()
-        self.velocity = self.min_velocity if self.velocity < self.min_velocity else self.velocity
-        self.velocity = self.max_velocity if self.velocity > self.max_velocity else self.velocity
-
-
-def modify_velocity(velocity) -> float:
-    """Modify velocity according to user params"""
-    mod = VelocityMod(velocity)
-
-    if mod.is_randomization_enabled:
-        mod.randomize_velocity()
-    mod.multiply_velocity()
-    mod.add_base_to_velocity()
-    mod.apply_thresholds_to_velocity()
-
-    return mod.velocity
-
-
-class ModifiedVoice(vfx.Voice):
-    def __init__(self, incoming_voice: vfx.Voice):
-        self.parent_voice = incoming_voice
-        self.copyFrom(self.parent_voice)
-        self.offset_semi = get_group_controller(PitchGroup, Interface.PITCH_GROUP.PITCH_SEMITONES)
-        self.offset_oct = get_group_controller(PitchGroup, Interface.PITCH_GROUP.PITCH_OCTAVE)
-        self.modified_note = self._calc_modified_note()
-        self.modified_velocity = modify_velocity(self.velocity)
-
-    def _calc_modified_note(self):
-        min_note = 0
-        max_note = 127
-        note_offset = self.offset_semi + (self.offset_oct * 12)
-        if self.note + note_offset < min_note:
-            return min_note
-        elif self.note + note_offset > max_note:
-            return max_note
-        else:
-            return self.note + note_offset
-
-
-def onTriggerVoice(incomingVoice):
-    # Init the new voice immediately with incomingVoice ensures no race condition between incoming voices
-    v = ModifiedVoice(incoming_voice=incomingVoice)
-    v.note = v.modified_note
-    v.velocity = v.modified_velocity
-    v.trigger()
-
-
-def onTick():
-    for v in vfx.context.voices:
-        v.copyFrom(v.parent_voice)
-        v.note = v.modified_note
-        v.velocity = v.modified_velocity
-
-
-def onReleaseVoice(incomingVoice):
-    for v in vfx.context.voices:
-        if v.parent_voice == incomingVoice:
-            v.release()
-
-
-def createDialog():
-    form = vfx.ScriptDialog("Sharpend's KeyMod", script_text)
-    form.addGroup(Interface.PITCH_GROUP.NAME)
-    form.addInputKnobInt(Interface.PITCH_GROUP.PITCH_SEMITONES, 0, -12, 12, hint='Pitch offset in semitones')
-    form.addInputKnobInt(Interface.PITCH_GROUP.PITCH_OCTAVE, 0, -4, 4, hint='Pitch offset in Octaves')
-    form.endGroup()
-
-    form.addGroup(Interface.VELOCITY_RANDOM_GROUP.NAME)
-    form.addInputCheckbox(Interface.VELOCITY_RANDOM_GROUP.ENABLE_RANDOMIZATION, 0,
-                          hint='Enable Velocity Randomization')
-    form.addInputCombo(Interface.VELOCITY_RANDOM_GROUP.RANDOMIZATION_MODE,
-                       VelocityRandomGroup.RANDOMIZATION_MODE_OPTIONS, 1, 'Velocity Randomization Mode')
-    form.addInputKnobInt(Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_ABOVE, 0, 0, 100,
-                         hint="Random Range for Velocity above played Velocity")
-    form.addInputKnobInt(Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_BELOW, 0, 0, 100,
-                         hint="Random Range for Velocity below played Velocity")
-    form.endGroup()
-
-    form.addGroup(Interface.VELOCITY_MULT_OFFSET_GROUP.NAME)
-    form.addInputKnob(Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_MULTIPLIER, 1, 0, 2, hint='Velocity Multiplier')
-    form.addInputKnob(Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_BASE, 0, -1, 1, hint='Velocity Base Offset')
-    form.endGroup()
-
-    form.addGroup(Interface.VELOCITY_THRESHOLD_GROUP.NAME)
-    form.addInputKnob(Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MIN, 0, 0, 1, hint='Velocity Minimum')
-    form.addInputKnob(Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MAX, 1, 0, 1, hint='Velocity Maximum')
-    form.endGroup()
-
-    return form
+import flvfx as vfx
+import random
+from collections import deque
+from functools import lru_cache
+from operator import attrgetter
+from dataclasses import dataclass, field
+
+
+class PitchGroup:
+    NAME: str = "Pitch"
+    PITCH_SEMITONES: str = "Transpose Semi"
+    PITCH_OCTAVE: str = "Transpose Oct"
+
+
+class VelocityRandomGroup:
+    NAME: str = "Velocity Randomization"
+    ENABLE_RANDOMIZATION: str = "Enable"
+    RANDOMIZE_RELATIVE_PERCENT: str = "Relative %"
+    RANDOMIZE_RELATIVE_OFFSET: str = "Relative +/-"
+    RANDOMIZE_ABSOLUTE: str = "Absolute"
+    RANDOMIZATION_MODE: str = "Mode"
+    RANDOMIZATION_MODE_OPTIONS = [
+        RANDOMIZE_ABSOLUTE,
+        RANDOMIZE_RELATIVE_PERCENT,
+        RANDOMIZE_RELATIVE_OFFSET
+    ]
+    RANDOM_RELATIVE_ABOVE: str = "Relative Above"
+    RANDOM_RELATIVE_BELOW: str = "Relative Below"
+    SEED: str = "Seed"
+
+
+class VelocityMultOffsetGroup:
+    NAME: str = "Velocity Multiplier & Offset"
+    VELOCITY_MULTIPLIER: str = "Multiplier"
+    VELOCITY_BASE: str = "Base Offset"
+
+
+class VelocityCurveGroup:
+    NAME: str = "Velocity Curve"
+    CURVE: str = "Curve"
+    CURVE_LINEAR: str = "Linear"
+    CURVE_EXPONENTIAL: str = "Exponential"
+    CURVE_LOGARITHMIC: str = "Logarithmic"
+    CURVE_S: str = "S-Curve"
+    CURVE_BREAKPOINTS: str = "Breakpoints"
+    CURVE_OPTIONS = [
+        CURVE_LINEAR,
+        CURVE_EXPONENTIAL,
+        CURVE_LOGARITHMIC,
+        CURVE_S,
+        CURVE_BREAKPOINTS
+    ]
+    AMOUNT: str = "Amount"
+    POINT_25: str = "Point 25%"
+    POINT_50: str = "Point 50%"
+    POINT_75: str = "Point 75%"
+
+
+class VelocityThresholdGroup:
+    NAME: str = "Velocity Thresholds"
+    VELOCITY_MIN: str = "Min"
+    VELOCITY_MAX: str = "Max"
+
+
+class VoiceUpdateGroup:
+    NAME: str = "Voice Update"
+    UPDATE_TICKS: str = "Update Ticks"
+
+
+class Interface:
+    PITCH_GROUP: PitchGroup = PitchGroup()
+    VELOCITY_RANDOM_GROUP: VelocityRandomGroup = VelocityRandomGroup()
+    VELOCITY_MULT_OFFSET_GROUP: VelocityMultOffsetGroup = VelocityMultOffsetGroup()
+    VELOCITY_CURVE_GROUP: VelocityCurveGroup = VelocityCurveGroup()
+    VELOCITY_THRESHOLD_GROUP: VelocityThresholdGroup = VelocityThresholdGroup()
+    VOICE_UPDATE_GROUP: VoiceUpdateGroup = VoiceUpdateGroup()
+
+
+class Const:
+    CONTROL_POLL_TICKS: int = max(1, int(vfx.context.PPQ) // 16)  # Ticks between control change checks in onTick
+    VELOCITY_CURVE_RESOLUTION: int = 1024  # Velocity curve lookup table steps
+    RANDOM_BUFFER_SIZE: int = 256
+
+
+script_text = f"""Sharpend's KeyMod
+Modify Velocity & Note offset without MIDI keyboard menu diving
+New in v1.1: 2 Relative Velocity Randomization Modes
+----------------------------
+{PitchGroup.PITCH_SEMITONES}: Note Pitch offset in Semitones.
+{PitchGroup.PITCH_OCTAVE}: Note Pitch offset in Octaves.
+
+{VelocityRandomGroup.ENABLE_RANDOMIZATION}: Enable Velocity Randomization. 
+{VelocityRandomGroup.RANDOMIZATION_MODE}: Velocity Randomization Mode: {VelocityRandomGroup.RANDOMIZATION_MODE_OPTIONS}.
+{VelocityRandomGroup.RANDOM_RELATIVE_ABOVE}: Random Range for Velocity Above played Velocity.
+{VelocityRandomGroup.RANDOM_RELATIVE_BELOW}: Random Range for Velocity Below played Velocity.
+{VelocityRandomGroup.SEED}: Randomization Seed - the same seed repeats the same random velocities. 0 - Unseeded.
+
+{VelocityMultOffsetGroup.VELOCITY_MULTIPLIER}: Velocity Multiplier.
+{VelocityMultOffsetGroup.VELOCITY_BASE}: Velocity Base Offset.
+
+{VelocityCurveGroup.CURVE}: Velocity Response Curve: {VelocityCurveGroup.CURVE_OPTIONS}.
+{VelocityCurveGroup.AMOUNT}: Strength of the Exponential, Logarithmic & S-Curve curves.
+{VelocityCurveGroup.POINT_25} / {VelocityCurveGroup.POINT_50} / {VelocityCurveGroup.POINT_75}: Output Velocity at 25% / 50% / 75% played Velocity, for {VelocityCurveGroup.CURVE_BREAKPOINTS}.
+
+{VelocityThresholdGroup.VELOCITY_MIN}: Velocity Minimum.
+{VelocityThresholdGroup.VELOCITY_MAX}: Velocity Maximum.
+
+{VoiceUpdateGroup.UPDATE_TICKS}: Ticks between following slides & pitch bend of the played notes. Higher is lighter on CPU.
+"""
+
+
+class Logger:
+    """Level-gated logger for the real-time callbacks. Messages are only formatted when their level is enabled,
+    and are kept in a bounded ring buffer that can be dumped to the script console with dump()."""
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    OFF = 100
+
+    def __init__(self, level: int = INFO, buffer_size: int = 256, echo: bool = False):
+        self.level = level
+        self.echo = echo  # Also print every kept message as it comes in
+        self.buffer: deque[str] = deque(maxlen=buffer_size)
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        self.buffer.append(message)
+        if self.echo:
+            print(message)
+
+    def debug(self, message: str, *args):
+        self.log(self.DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(self.INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(self.WARNING, message, *args)
+
+    def dump(self):
+        """Print & clear the buffered messages"""
+        while self.buffer:
+            print(self.buffer.popleft())
+
+
+log = Logger()  # Set log.level = Logger.DEBUG & log.echo = True to trace notes in the console
+
+
+def get_group_controller_str(group, name=''):
+    """Get group controller string without acquiring value - for static definitions"""
+    name = name if name else group.NAME
+    return f"{group.NAME}: {name}"
+
+
+@dataclass(frozen=True, slots=True)
+class KeyModControls:
+    """Every control value a played note needs, read from the form in one pass"""
+    offset_semi: int
+    offset_oct: int
+    is_randomization_enabled: bool
+    randomization_mode: int
+    random_relative_above: float
+    random_relative_below: float
+    random_seed: int
+    velocity_multiplier: float
+    velocity_base: float
+    velocity_curve: int
+    velocity_curve_amount: float
+    velocity_curve_points: tuple[float, float, float]
+    velocity_min: float
+    velocity_max: float
+    update_ticks: int
+
+
+KEYMOD_CONTROL_KEYS = (
+    get_group_controller_str(PitchGroup, Interface.PITCH_GROUP.PITCH_SEMITONES),
+    get_group_controller_str(PitchGroup, Interface.PITCH_GROUP.PITCH_OCTAVE),
+    get_group_controller_str(VelocityRandomGroup, Interface.VELOCITY_RANDOM_GROUP.ENABLE_RANDOMIZATION),
+    get_group_controller_str(VelocityRandomGroup, Interface.VELOCITY_RANDOM_GROUP.RANDOMIZATION_MODE),
+    get_group_controller_str(VelocityRandomGroup, Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_ABOVE),
+    get_group_controller_str(VelocityRandomGroup, Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_BELOW),
+    get_group_controller_str(VelocityRandomGroup, Interface.VELOCITY_RANDOM_GROUP.SEED),
+    get_group_controller_str(VelocityMultOffsetGroup, Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_MULTIPLIER),
+    get_group_controller_str(VelocityMultOffsetGroup, Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_BASE),
+    get_group_controller_str(VelocityCurveGroup, Interface.VELOCITY_CURVE_GROUP.CURVE),
+    get_group_controller_str(VelocityCurveGroup, Interface.VELOCITY_CURVE_GROUP.AMOUNT),
+    get_group_controller_str(VelocityCurveGroup, Interface.VELOCITY_CURVE_GROUP.POINT_25),
+    get_group_controller_str(VelocityCurveGroup, Interface.VELOCITY_CURVE_GROUP.POINT_50),
+    get_group_controller_str(VelocityCurveGroup, Interface.VELOCITY_CURVE_GROUP.POINT_75),
+    get_group_controller_str(VelocityThresholdGroup, Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MIN),
+    get_group_controller_str(VelocityThresholdGroup, Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MAX),
+    get_group_controller_str(VoiceUpdateGroup, Interface.VOICE_UPDATE_GROUP.UPDATE_TICKS),
+)
+
+
+def build_keymod_controls(values: tuple) -> KeyModControls:
+    """Build the controls snapshot from values read in KEYMOD_CONTROL_KEYS order"""
+    (offset_semi, offset_oct, is_randomization_enabled, randomization_mode, random_relative_above,
+     random_relative_below, random_seed, velocity_multiplier, velocity_base, velocity_curve, velocity_curve_amount,
+     point_25, point_50, point_75, velocity_min, velocity_max, update_ticks) = values
+    return KeyModControls(offset_semi=offset_semi,
+                          offset_oct=offset_oct,
+                          is_randomization_enabled=bool(is_randomization_enabled),
+                          randomization_mode=randomization_mode,
+                          random_relative_above=random_relative_above / 100,
+                          random_relative_below=random_relative_below / 100,
+                          random_seed=int(random_seed),
+                          velocity_multiplier=velocity_multiplier,
+                          velocity_base=velocity_base,
+                          velocity_curve=velocity_curve,
+                          velocity_curve_amount=velocity_curve_amount,
+                          velocity_curve_points=(point_25, point_50, point_75),
+                          velocity_min=velocity_min,
+                          velocity_max=velocity_max,
+                          update_ticks=max(int(update_ticks), 1))
+
+
+class ControlSnapshotService:
+    """Read the controls through precomputed keys at most once per tick, and rebuild the snapshot only when a
+    control actually changed. The version goes up on every rebuild."""
+    def __init__(self, control_keys: tuple[str, ...], build_snapshot):
+        self.control_keys = control_keys
+        self.build_snapshot = build_snapshot
+        self.version = 0
+        self.snapshot = None
+        self._values: tuple = ()
+        self._read_tick = None
+
+    def get_snapshot(self, tick: int):
+        if tick != self._read_tick:
+            self._read_tick = tick
+            get_input_value = vfx.context.form.getInputValue
+            values = tuple([get_input_value(control_key) for control_key in self.control_keys])
+            if values != self._values:
+                self._values = values
+                self.snapshot = self.build_snapshot(values)
+                self.version += 1
+        return self.snapshot
+
+
+class RandomBuffer:
+    """Per-instance random source. Values are generated in batches into a buffer that onTick tops up,
+    so notes only read values out of it. A non-zero seed makes the sequence reproducible -
+    it starts over whenever the song position jumps back, so every playback from the start plays the same."""
+    def __init__(self, size: int = Const.RANDOM_BUFFER_SIZE):
+        self.size = size
+        self.seed = None
+        self._generator = random.Random()
+        self._values: deque[float] = deque()
+        self._song_tick = None
+
+    def set_seed(self, seed: int):
+        """Restart the sequence from seed (0 - unseeded), only when the seed changed"""
+        if seed == self.seed:
+            return
+        self.seed = seed
+        self.restart()
+
+    def restart(self):
+        """Start the sequence over from the seed - an unseeded source draws a new random seed"""
+        self._generator.seed(self.seed if self.seed else random.getrandbits(64))
+        self._values.clear()
+        self.refill()
+
+    def follow_transport(self, song_tick: int):
+        """Restart when the song position went back since the last tick, e.g. when playback restarts"""
+        if self._song_tick is not None and song_tick < self._song_tick:
+            self.restart()
+        self._song_tick = song_tick
+
+    def refill(self):
+        """Top the buffer up once it's half empty - call outside the note path"""
+        if len(self._values) <= self.size // 2:
+            generate = self._generator.random
+            self._values.extend([generate() for _ in range(self.size - len(self._values))])
+
+    def random(self) -> float:
+        if not self._values:
+            self.refill()
+        return self._values.popleft()
+
+    def uniform(self, a, b) -> float:
+        return a + (b - a) * self.random()
+
+    def _index(self, length: int) -> int:
+        return min(int(self.random() * length), length - 1)
+
+    def choice(self, values):
+        return values[self._index(len(values))]
+
+
+random_source = RandomBuffer()
+
+
+class RandomService:
+    """Velocity randomization, with the mode & ranges resolved once per control change"""
+    def __init__(self, controls: KeyModControls):
+        self._min_velocity = controls.velocity_min
+        self._max_velocity = controls.velocity_max
+        self._above_range = controls.random_relative_above
+        self._below_range = controls.random_relative_below
+        self._randomization_type = Interface.VELOCITY_RANDOM_GROUP.RANDOMIZATION_MODE_OPTIONS[
+            controls.randomization_mode]
+        log.debug("velocity randomization: %s", self._randomization_type)
+        self.randomize_velocity = self._determine_strategy()
+
+    def _determine_strategy(self):
+        if self._randomization_type == Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_ABSOLUTE:
+            return self._randomize_absolute
+        elif self._randomization_type == Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_RELATIVE_PERCENT:
+            return self._randomize_relative_percent
+        elif self._randomization_type == Interface.VELOCITY_RANDOM_GROUP.RANDOMIZE_RELATIVE_OFFSET:
+            return self._randomize_relative_offset
+        else:
+            raise KeyError('Non existing relative random range!')
+
+    def _randomize_absolute(self, velocity):
+        return random_source.uniform(self._min_velocity, self._max_velocity)
+
+    @staticmethod
+    def _get_relative_direction(above, below):
+        go_above = True
+        if above > 0 and below > 0:  # both ranges are enabled
+            go_above = random_source.choice([True, False])  # choose whether to go above or below played velocity
+        else:  # only 1 range is enabled
+            if above > 0:
+                go_above = True
+            elif below > 0:
+                go_above = False
+        return go_above
+
+    def _get_relative_jitter(self):
+        """Random step above (positive) or below (negative) the played velocity"""
+        below = random_source.uniform(0, self._below_range)
+        above = random_source.uniform(0, self._above_range)
+        return above if self._get_relative_direction(above, below) else -below
+
+    def _randomize_relative_percent(self, velocity):
+        return velocity * (1 + self._get_relative_jitter())
+
+    def _randomize_relative_offset(self, velocity):
+        return velocity + self._get_relative_jitter()
+
+
+class VelocityCurve:
+    """Velocity response curve, evaluated once into a lookup table of Const.VELOCITY_CURVE_RESOLUTION steps
+    over played velocities 0 - 1"""
+    def __init__(self, curve: str, amount: float, points: tuple[float, float, float]):
+        self.curve = curve
+        self.amount = amount
+        self.points = points
+        curve_function = self._get_curve_function()
+        resolution = Const.VELOCITY_CURVE_RESOLUTION
+        self.table = tuple(curve_function(step / resolution) for step in range(resolution + 1))
+
+    def _get_curve_function(self):
+        exponent = 1 + 3 * self.amount
+        if self.curve == Interface.VELOCITY_CURVE_GROUP.CURVE_EXPONENTIAL:
+            return lambda x: x ** exponent
+        elif self.curve == Interface.VELOCITY_CURVE_GROUP.CURVE_LOGARITHMIC:
+            return lambda x: 1 - (1 - x) ** exponent
+        elif self.curve == Interface.VELOCITY_CURVE_GROUP.CURVE_S:
+            return lambda x: x + self.amount * (x * x * (3 - 2 * x) - x)  # Blend towards smoothstep
+        elif self.curve == Interface.VELOCITY_CURVE_GROUP.CURVE_BREAKPOINTS:
+            return self._interpolate_breakpoints
+        else:
+            raise KeyError('Non existing velocity curve!')
+
+    def _interpolate_breakpoints(self, x):
+        breakpoints = (0, *self.points, 1)
+        segment = min(int(x * 4), 3)
+        position = x * 4 - segment
+        return breakpoints[segment] + (breakpoints[segment + 1] - breakpoints[segment]) * position
+
+    def apply(self, velocity):
+        step = int(velocity * Const.VELOCITY_CURVE_RESOLUTION + 0.5)
+        if step < 0:
+            step = 0
+        elif step > Const.VELOCITY_CURVE_RESOLUTION:
+            step = Const.VELOCITY_CURVE_RESOLUTION
+        return self.table[step]
+
+
+@lru_cache(maxsize=8)
+def get_velocity_curve(curve_index: int, amount: float, points: tuple[float, float, float]) -> VelocityCurve | None:
+    """Velocity curve by its controls - None for linear. Tables are kept, so only curve changes rebuild one"""
+    curve = Interface.VELOCITY_CURVE_GROUP.CURVE_OPTIONS[curve_index]
+    if curve == Interface.VELOCITY_CURVE_GROUP.CURVE_LINEAR:
+        return None
+    return VelocityCurve(curve, amount, points)
+
+
+class KeyModTransform:
+    """Note & velocity modification compiled from one controls snapshot - a 128-entry note map, and the
+    velocity stages resolved to constants. Rebuilt only when a control changes."""
+    def __init__(self, controls: KeyModControls):
+        self.controls = controls
+        self._note_offset = controls.offset_semi + (controls.offset_oct * 12)
+        self.note_map = tuple(min(max(note + self._note_offset, 0), 127) for note in range(128))
+        self.random_service = RandomService(controls) if controls.is_randomization_enabled else None
+        self._multiplier = controls.velocity_multiplier
+        self._base = controls.velocity_base
+        self.velocity_curve = get_velocity_curve(controls.velocity_curve, controls.velocity_curve_amount,
+                                                 controls.velocity_curve_points)
+        self._min_velocity = controls.velocity_min
+        self._max_velocity = controls.velocity_max
+
+    def modify_note(self, note):
+        """Whole MIDI notes go through the note map, fractional & out of range notes keep the plain arithmetic"""
+        whole_note = int(note)
+        if whole_note == note and 0 <= whole_note <= 127:
+            return self.note_map[whole_note]
+        note += self._note_offset
+        return 0 if note < 0 else 127 if note > 127 else note
+
+    def modify_velocity(self, velocity) -> float:
+        """Modify velocity according to user params"""
+        if self.random_service is not None:
+            velocity = self.random_service.randomize_velocity(velocity)
+        if self.velocity_curve is not None:
+            velocity = self.velocity_curve.apply(velocity)
+        velocity = velocity * self._multiplier + self._base
+        velocity = self._min_velocity if velocity < self._min_velocity else velocity
+        return self._max_velocity if velocity > self._max_velocity else velocity
+
+
+def build_keymod_transform(values: tuple) -> KeyModTransform:
+    return KeyModTransform(build_keymod_controls(values))
+
+
+controls_service = ControlSnapshotService(KEYMOD_CONTROL_KEYS, build_keymod_transform)
+
+
+read_live_properties = attrgetter("finePitch", "pan", "fcut", "fres", "pitchofs")  # Parent properties that move while held
+
+
+class ModifiedVoice(vfx.Voice):
+    def __init__(self, incoming_voice: vfx.Voice, transform: KeyModTransform):
+        self.parent_voice = incoming_voice
+        self.copyFrom(self.parent_voice)
+        self.parent_properties = read_live_properties(self.parent_voice)
+        self.modified_note = transform.modify_note(self.note)
+        self.modified_velocity = transform.modify_velocity(self.velocity)
+
+    def refresh(self):
+        """Follow the parent voice, keeping the modified note & velocity - only when the parent actually changed"""
+        parent_properties = read_live_properties(self.parent_voice)
+        if parent_properties == self.parent_properties:
+            return
+        self.parent_properties = parent_properties
+        self.copyFrom(self.parent_voice)
+        self.note = self.modified_note
+        self.velocity = self.modified_velocity
+
+
+class VoiceRegistry:
+    """Index script voices by their parent voice, so triggers & releases only touch that note's own voices.
+    Voices are keyed by id(), keeping add & remove O(1)."""
+    def __init__(self):
+        self._children: dict[int, dict[int, vfx.Voice]] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, voice: vfx.Voice):
+        children = self._children.setdefault(id(voice.parent_voice), {})
+        if id(voice) not in children:
+            children[id(voice)] = voice
+            self._count += 1
+
+    def remove(self, voice: vfx.Voice):
+        parent_id = id(voice.parent_voice)
+        children = self._children.get(parent_id)
+        if children is not None and children.pop(id(voice), None) is not None:
+            self._count -= 1
+            if not children:
+                del self._children[parent_id]
+
+    def pop_children(self, parent_voice) -> list[vfx.Voice]:
+        children = self._children.pop(id(parent_voice), None)
+        if not children:
+            return []
+        self._count -= len(children)
+        return list(children.values())
+
+
+class VoiceRefresher:
+    """Refresh the modified voices from their parents once every Update Ticks ticks"""
+    def __init__(self):
+        self.tick = 0
+
+    def refresh(self):
+        """Update Ticks comes from the last controls snapshot, which onTick keeps current"""
+        self.tick += 1
+        transform = controls_service.snapshot
+        update_ticks = transform.controls.update_ticks if transform is not None else 1
+        if self.tick % update_ticks:
+            return
+        for v in vfx.context.voices:
+            v.refresh()
+
+
+voice_registry = VoiceRegistry()
+voice_refresher = VoiceRefresher()
+
+
+def onTriggerVoice(incomingVoice):
+    random_source.follow_transport(vfx.context.ticks)
+    transform = controls_service.get_snapshot(voice_refresher.tick)
+    random_source.set_seed(transform.controls.random_seed)
+    # Init the new voice immediately with incomingVoice ensures no race condition between incoming voices
+    v = ModifiedVoice(incoming_voice=incomingVoice, transform=transform)
+    v.note = v.modified_note
+    v.velocity = v.modified_velocity
+    v.trigger()
+    voice_registry.add(v)
+
+
+def onTick():
+    random_source.follow_transport(vfx.context.ticks)
+    voice_refresher.refresh()
+    random_source.refill()
+    if not voice_refresher.tick % Const.CONTROL_POLL_TICKS:
+        controls_service.get_snapshot(voice_refresher.tick)  # Rebuild on control changes here, not on the next note
+
+
+def onReleaseVoice(incomingVoice):
+    for v in voice_registry.pop_children(incomingVoice):
+        v.release()
+
+
+def createDialog():
+    form = vfx.ScriptDialog("Sharpend's KeyMod", script_text)
+    form.addGroup(Interface.PITCH_GROUP.NAME)
+    form.addInputKnobInt(Interface.PITCH_GROUP.PITCH_SEMITONES, 0, -12, 12, hint='Pitch offset in semitones')
+    form.addInputKnobInt(Interface.PITCH_GROUP.PITCH_OCTAVE, 0, -4, 4, hint='Pitch offset in Octaves')
+    form.endGroup()
+
+    form.addGroup(Interface.VELOCITY_RANDOM_GROUP.NAME)
+    form.addInputCheckbox(Interface.VELOCITY_RANDOM_GROUP.ENABLE_RANDOMIZATION, 0,
+                          hint='Enable Velocity Randomization')
+    form.addInputCombo(Interface.VELOCITY_RANDOM_GROUP.RANDOMIZATION_MODE,
+                       VelocityRandomGroup.RANDOMIZATION_MODE_OPTIONS, 1, 'Velocity Randomization Mode')
+    form.addInputKnobInt(Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_ABOVE, 0, 0, 100,
+                         hint="Random Range for Velocity above played Velocity")
+    form.addInputKnobInt(Interface.VELOCITY_RANDOM_GROUP.RANDOM_RELATIVE_BELOW, 0, 0, 100,
+                         hint="Random Range for Velocity below played Velocity")
+    form.addInputKnobInt(Interface.VELOCITY_RANDOM_GROUP.SEED, 0, 0, 9999, hint='Randomization Seed | 0 = Unseeded')
+    form.endGroup()
+
+    form.addGroup(Interface.VELOCITY_MULT_OFFSET_GROUP.NAME)
+    form.addInputKnob(Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_MULTIPLIER, 1, 0, 2, hint='Velocity Multiplier')
+    form.addInputKnob(Interface.VELOCITY_MULT_OFFSET_GROUP.VELOCITY_BASE, 0, -1, 1, hint='Velocity Base Offset')
+    form.endGroup()
+
+    form.addGroup(Interface.VELOCITY_CURVE_GROUP.NAME)
+    form.addInputCombo(Interface.VELOCITY_CURVE_GROUP.CURVE, VelocityCurveGroup.CURVE_OPTIONS, 0,
+                       'Velocity Response Curve')
+    form.addInputKnob(Interface.VELOCITY_CURVE_GROUP.AMOUNT, 0.5, 0, 1, hint='Velocity Curve Strength')
+    form.addInputKnob(Interface.VELOCITY_CURVE_GROUP.POINT_25, 0.25, 0, 1, hint='Output Velocity at 25% Velocity')
+    form.addInputKnob(Interface.VELOCITY_CURVE_GROUP.POINT_50, 0.5, 0, 1, hint='Output Velocity at 50% Velocity')
+    form.addInputKnob(Interface.VELOCITY_CURVE_GROUP.POINT_75, 0.75, 0, 1, hint='Output Velocity at 75% Velocity')
+    form.endGroup()
+
+    form.addGroup(Interface.VELOCITY_THRESHOLD_GROUP.NAME)
+    form.addInputKnob(Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MIN, 0, 0, 1, hint='Velocity Minimum')
+    form.addInputKnob(Interface.VELOCITY_THRESHOLD_GROUP.VELOCITY_MAX, 1, 0, 1, hint='Velocity Maximum')
+    form.endGroup()
+
+    form.addGroup(Interface.VOICE_UPDATE_GROUP.NAME)
+    form.addInputKnobInt(Interface.VOICE_UPDATE_GROUP.UPDATE_TICKS, 1, 1, 24,
+                         hint='Ticks between following slides & pitch bend')
+    form.endGroup()
+
+    return form
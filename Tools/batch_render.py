@@ -0,0 +1,222 @@
+"""Render MIDI files through a VFX script headlessly, across a pool of worker processes.
+
+Every input file is played through a fresh copy of the script at the file's PPQ, and the notes the script sends
+to its output are streamed to a MIDI file of the same name in the output directory.
+Tempo, time & key signatures are copied over. --score bakes the file with the script's process_score(notes)
+instead of playing it tick by tick - Harmonize.py & Harp.py only.
+
+Usage:
+    python Tools/batch_render.py Python_Scripts/Harp.py midi_in/ rendered/ --param "Time: Polyphony Safe=1"
+    python Tools/batch_render.py Python_Scripts/Harmonize.py midi_in/ rendered/ --workers 8 --score
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+
+from midi_file import MidiFileWriter, read_midi_file
+from vfx_host import VFXHost, load_script, parse_params, vfx
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+
+
+class MidiStream:
+    """Host listener writing every voice the script triggers & releases straight to a MIDI file"""
+
+    def __init__(self, writer: MidiFileWriter, meta_events):
+        self.writer = writer
+        self._meta_events = list(reversed(meta_events))  # Popped from the end, in tick order
+        self._voice_notes: dict[int, int] = {}  # id(voice) -> note it was triggered with
+
+    def flush_meta(self, tick):
+        while self._meta_events and self._meta_events[-1][0] <= tick:
+            self.writer.meta(*self._meta_events.pop())
+
+    def on_voice_trigger(self, voice):
+        tick = vfx.context.ticks
+        self.flush_meta(tick)
+        self._voice_notes[id(voice)] = int(voice.note)
+        self.writer.note_on(tick, voice.note, voice.velocity)
+
+    def on_voice_release(self, voice):
+        note = self._voice_notes.pop(id(voice), None)
+        if note is not None:
+            self.writer.note_off(vfx.context.ticks, note)
+
+
+def load_render_script(script_path, ppq, params=None):
+    """Load a fresh copy of the script for one render, with its seeded random sequence started over"""
+    script = load_script(script_path, ppq=ppq, params=params)
+    random_source = getattr(script, "random_source", None)
+    if random_source is not None:
+        random_source.restart()
+    return script
+
+
+def render_live(script_path, score, writer: MidiFileWriter, params=None, tail=8):
+    """Play the score's notes into the script tick by tick, `tail` beats past the last note.
+    Every note is held for at least 1 tick, so its release never comes before its trigger."""
+    script = load_render_script(script_path, score.ppq, params=params)
+    host = VFXHost(script)
+    host.record_output = False
+    stream = MidiStream(writer, score.meta_events)
+    vfx.context.listeners.append(stream)
+    events = sorted([(note.time, 1, idx) for idx, note in enumerate(score.notes)] +
+                    [(note.time + max(note.length, 1), 0, idx) for idx, note in enumerate(score.notes)])
+    played = {}  # score note index -> incoming voice
+    for tick, is_note_on, idx in events:
+        if host.tick < tick:
+            host.advance(tick - host.tick)
+        if is_note_on:
+            played[idx] = host.note_on(score.notes[idx].note, score.notes[idx].velocity)
+        else:
+            host.note_off(played.pop(idx))
+    host.advance(int(score.ppq * tail))
+    stream.flush_meta(host.tick)
+
+
+def render_score(script_path, score, writer: MidiFileWriter, params=None):
+    """Bake the score in one pass with the script's process_score, then write its notes in tick order"""
+    script = load_render_script(script_path, score.ppq, params=params)
+    if not hasattr(script, "process_score"):
+        raise ValueError(f"{script_path} has no process_score - render it without --score")
+    baked_notes = script.process_score([script.ScoreNote(time=note.time, length=note.length, note=note.note,
+                                                         velocity=note.velocity) for note in score.notes])
+    events = sorted([(note.time, 1, note.note, note.velocity) for note in baked_notes] +
+                    [(note.time + note.length, 0, note.note, 0) for note in baked_notes])
+    stream = MidiStream(writer, score.meta_events)
+    for tick, is_note_on, note, velocity in events:
+        stream.flush_meta(tick)
+        if is_note_on:
+            writer.note_on(tick, note, velocity)
+        else:
+            writer.note_off(tick, note)
+    stream.flush_meta(float("inf"))
+
+
+def check_script(script_path, params=None, use_score=False):
+    """Load the script once before any file renders - returns why it can't render the batch, or None"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        script = load_script(script_path)
+    control_names = vfx.context.form.get_input_names()
+    unknown_names = [name for name in params or {} if name not in control_names]
+    if unknown_names:
+        return (f"{script_path} has no control {', '.join(map(repr, unknown_names))} - "
+                f"its controls are: {', '.join(control_names)}")
+    if use_score and not hasattr(script, "process_score"):
+        return f"{script_path} has no process_score - render it without --score"
+    return None
+
+
+def render_file(job):
+    """Worker entry point - render one file & return its stats.
+    A file that fails to render is reported in the stats' "error", its partial output is removed."""
+    script_path, input_path, output_path, params, use_score, tail = job
+    result = {
+        "worker": multiprocessing.current_process().name,
+        "input": input_path,
+        "output": output_path,
+        "notes_in": 0,
+        "notes_out": 0,
+        "seconds": 0.0,
+        "error": None,
+    }
+    start = time.perf_counter()
+    try:
+        score = read_midi_file(input_path)
+        result["notes_in"] = len(score.notes)
+        with contextlib.redirect_stdout(io.StringIO()), MidiFileWriter(output_path, score.ppq) as writer:
+            if use_score:
+                render_score(script_path, score, writer, params=params)
+            else:
+                render_live(script_path, score, writer, params=params, tail=tail)
+        result["notes_out"] = writer.notes_written
+    except Exception as error:  # One bad file shouldn't stop the batch
+        result["error"] = f"{type(error).__name__}: {error}"
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def find_midi_files(input_dir):
+    midi_files = []
+    for root, _, files in os.walk(input_dir):
+        midi_files.extend(os.path.join(root, name) for name in files if name.lower().endswith(MIDI_EXTENSIONS))
+    return sorted(midi_files)
+
+
+def render_directory(script_path, input_dir, output_dir, params=None, workers=None, use_score=False, tail=8,
+                     on_result=None):
+    """Render every MIDI file under input_dir into output_dir, keeping the folder layout - returns the file stats"""
+    jobs = []
+    for input_path in find_midi_files(input_dir):
+        output_path = os.path.join(output_dir, os.path.relpath(input_path, input_dir))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        jobs.append((os.path.abspath(script_path), input_path, output_path, params, use_score, tail))
+    results = []
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(render_file, jobs):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
+
+
+def print_file_result(result):
+    if result["error"]:
+        print(f"  {result['input']}: FAILED - {result['error']} ({result['worker']})")
+        return
+    print(f"  {result['input']} -> {result['output']}: {result['notes_in']} notes in, "
+          f"{result['notes_out']} out, {result['seconds'] * 1e3:.1f}ms ({result['worker']})")
+
+
+def print_worker_report(results, wall_seconds):
+    workers = {}
+    failed = 0
+    for result in results:
+        if result["error"]:
+            failed += 1
+            continue
+        stats = workers.setdefault(result["worker"], {"files": 0, "notes_in": 0, "notes_out": 0, "seconds": 0.0})
+        for key in ("notes_in", "notes_out", "seconds"):
+            stats[key] += result[key]
+        stats["files"] += 1
+    total_in = sum(stats["notes_in"] for stats in workers.values())
+    print(f"{len(results) - failed} files, {total_in} notes in {wall_seconds:.2f}s - "
+          f"{total_in / wall_seconds if wall_seconds else 0:.0f} notes/s overall"
+          + (f" - {failed} files failed" if failed else ""))
+    for name, stats in sorted(workers.items()):
+        notes_per_second = stats["notes_in"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"  {name}: {stats['files']} files, {stats['notes_in']} notes in, {stats['notes_out']} out, "
+              f"{notes_per_second:.0f} notes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("script", help="Path to KeyMod.py, Harmonize.py or Harp.py")
+    parser.add_argument("input_dir", help="Folder of .mid files, searched recursively")
+    parser.add_argument("output_dir", help="Folder for the rendered files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--score", action="store_true", help="Bake with process_score instead of playing live")
+    parser.add_argument("--tail", type=float, default=8, help="Beats to keep ticking after the last note")
+    parser.add_argument("--param", action="append", metavar="'GROUP: CONTROL=VALUE'",
+                        help="Set a script control before rendering, can be repeated")
+    args = parser.parse_args()
+    params = parse_params(args.param)
+    error = check_script(args.script, params=params, use_score=args.score)
+    if error:
+        parser.error(error)
+    start = time.perf_counter()
+    results = render_directory(args.script, args.input_dir, args.output_dir, params=params,
+                               workers=args.workers, use_score=args.score, tail=args.tail,
+                               on_result=print_file_result)
+    print_worker_report(results, time.perf_counter() - start)
+    if any(result["error"] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Headless stand-in for FL Studio's flvfx module - lets the VFX scripts run outside FL Studio.
+
+Only the parts of the VFX Script API the scripts in Python_Scripts/ use are covered:
+Voice, context.form, context.voices, context.PPQ, context.ticks & ScriptDialog.
+"""
+
+VOICE_PROPERTIES = ("note", "finePitch", "pan", "velocity", "color", "fcut", "fres", "pitchofs", "output", "length")
+
+
+class Voice:
+    """Script voice - properties live on the class so subclasses may skip calling __init__, like in FL"""
+    note = 60.0
+    finePitch = 0.0
+    pan = 0.0
+    velocity = 0.8
+    color = 0
+    fcut = 0.0
+    fres = 0.0
+    pitchofs = 0.0
+    output = 0
+    length = -1
+
+    def copyFrom(self, other):
+        for name in VOICE_PROPERTIES:
+            setattr(self, name, getattr(other, name))
+
+    def trigger(self):
+        context.on_voice_trigger(self)
+
+    def release(self):
+        context.on_voice_release(self)
+
+
+class ScriptDialog:
+    def __init__(self, title='', description=''):
+        self.title = title
+        self.description = description
+        self._group = ''
+        self._inputs = {}
+
+    def _add_input(self, name, value, min_value, max_value, is_int, options=None):
+        full_name = f"{self._group}: {name}" if self._group else name
+        self._inputs[full_name] = {"value": value, "min": min_value, "max": max_value,
+                                   "is_int": is_int, "options": options}
+
+    def addGroup(self, name):
+        self._group = name
+
+    def endGroup(self):
+        self._group = ''
+
+    def addInputKnob(self, name, value, min_value, max_value, hint=''):
+        self._add_input(name, float(value), min_value, max_value, is_int=False)
+
+    def addInputKnobInt(self, name, value, min_value, max_value, hint=''):
+        self._add_input(name, int(value), min_value, max_value, is_int=True)
+
+    def addInputCheckbox(self, name, value, hint=''):
+        self._add_input(name, int(value), 0, 1, is_int=True)
+
+    def addInputCombo(self, name, options, value, hint=''):
+        self._add_input(name, int(value), 0, len(options) - 1, is_int=True, options=list(options))
+
+    AddInputCombo = addInputCombo
+
+    def getInputValue(self, name):
+        return self._inputs[name]["value"]
+
+    def setInputValue(self, name, value):
+        control = self._inputs[name]
+        value = max(control["min"], min(value, control["max"]))
+        control["value"] = int(round(value)) if control["is_int"] else float(value)
+
+    def getNormalizedValue(self, name):
+        control = self._inputs[name]
+        span = control["max"] - control["min"]
+        return (control["value"] - control["min"]) / span if span else 0
+
+    def setNormalizedValue(self, name, value):
+        control = self._inputs[name]
+        self.setInputValue(name, control["min"] + value * (control["max"] - control["min"]))
+
+    def get_input_names(self):
+        return list(self._inputs)
+
+
+class Context:
+    def __init__(self):
+        self.PPQ = 96
+        self.ticks = 0
+        self.form = None
+        self._voices = {}
+        self.listeners = []
+
+    @property
+    def voices(self):
+        return list(self._voices.values())
+
+    @property
+    def voice_count(self):
+        return len(self._voices)
+
+    def reset(self, ppq=96):
+        self.PPQ = ppq
+        self.ticks = 0
+        self.form = None
+        self._voices = {}
+        self.listeners = []
+
+    def on_voice_trigger(self, voice):
+        self._voices[id(voice)] = voice
+        for listener in self.listeners:
+            listener.on_voice_trigger(voice)
+
+    def on_voice_release(self, voice):
+        if self._voices.pop(id(voice), None) is None:
+            return
+        for listener in self.listeners:
+            listener.on_voice_release(voice)
+
+
+context = Context()
@@ -0,0 +1,97 @@
+"""Stress a VFX script headlessly: random chords at a set rate, chord size, hold time & PPQ.
+
+Usage:
+    python Tools/load_test.py Python_Scripts/Harp.py --note-rate 4 --chord-size 3 --hold 1 --ppq 960
+    python Tools/load_test.py Python_Scripts/Harmonize.py --param "Voices: Strum=2"
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from vfx_host import VFXHost, load_script, parse_params
+
+
+def run_load(script_path, note_rate=2.0, chord_size=3, hold=1.0, ppq=96, beats=64, tail=8, seed=0,
+             params=None, low_note=36, high_note=96):
+    """Play `beats` beats of random chords - note_rate chords per beat, each held for `hold` beats"""
+    rng = random.Random(seed)
+    random.seed(seed)
+    script = load_script(script_path, ppq=ppq, params=params)
+    host = VFXHost(script)
+    host.record_output = False
+    chord_interval = max(1, int(ppq / note_rate))
+    hold_ticks = max(1, int(ppq * hold))
+    total_ticks = int(ppq * beats)
+    releases = {}  # tick -> voices to release on it
+    live_samples = 0
+    live_total = 0
+    notes_in = 0
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for tick in range(total_ticks + int(ppq * tail)):
+            for voice in releases.pop(tick, ()):
+                host.note_off(voice)
+            if tick < total_ticks and tick % chord_interval == 0:
+                chord = rng.sample(range(low_note, high_note), chord_size)
+                voices = [host.note_on(note, rng.uniform(0.3, 1)) for note in chord]
+                releases.setdefault(tick + hold_ticks, []).extend(voices)
+                notes_in += chord_size
+            host.advance()
+            live_samples += 1
+            live_total += host.live_voices
+    elapsed = time.perf_counter() - start
+
+    return {
+        "script": script_path,
+        "ppq": ppq,
+        "notes_in": notes_in,
+        "ticks": live_samples,
+        "seconds": elapsed,
+        "notes_per_second": notes_in / elapsed if elapsed else 0.0,
+        "ticks_per_second": live_samples / elapsed if elapsed else 0.0,
+        "peak_voices": host.peak_voices,
+        "average_voices": live_total / live_samples if live_samples else 0.0,
+        "callback_counts": host.callback_counts,
+        "callback_seconds": host.callback_seconds,
+        "slowest_callbacks": sorted(host.slowest_callbacks, reverse=True),
+    }
+
+
+def print_report(report):
+    print(f"{report['script']} @ PPQ {report['ppq']}")
+    print(f"  {report['notes_in']} notes in, {report['ticks']} ticks in {report['seconds']:.3f}s")
+    print(f"  throughput: {report['notes_per_second']:.0f} notes/s, {report['ticks_per_second']:.0f} ticks/s")
+    print(f"  live voices: peak {report['peak_voices']}, average {report['average_voices']:.1f}")
+    for name, count in report["callback_counts"].items():
+        seconds = report["callback_seconds"][name]
+        average_us = seconds / count * 1e6 if count else 0.0
+        print(f"  {name}: {count} calls, {seconds * 1e3:.1f}ms total, {average_us:.1f}us average")
+    print("  slowest callbacks:")
+    for seconds, name, tick in report["slowest_callbacks"]:
+        print(f"    {seconds * 1e6:9.1f}us  {name} @ tick {tick}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("script", help="Path to KeyMod.py, Harmonize.py or Harp.py")
+    parser.add_argument("--note-rate", type=float, default=2.0, help="Chords per beat")
+    parser.add_argument("--chord-size", type=int, default=3, help="Notes per chord")
+    parser.add_argument("--hold", type=float, default=1.0, help="Chord hold time in beats")
+    parser.add_argument("--ppq", type=int, default=96, help="Ticks per quarter note")
+    parser.add_argument("--beats", type=float, default=64, help="Length of the played part in beats")
+    parser.add_argument("--tail", type=float, default=8, help="Beats to keep ticking after the last chord")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--param", action="append", metavar="'GROUP: CONTROL=VALUE'",
+                        help="Set a script control before playing, can be repeated")
+    args = parser.parse_args()
+    report = run_load(args.script, note_rate=args.note_rate, chord_size=args.chord_size, hold=args.hold,
+                      ppq=args.ppq, beats=args.beats, tail=args.tail, seed=args.seed,
+                      params=parse_params(args.param))
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
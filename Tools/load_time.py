@@ -0,0 +1,67 @@
+"""Measure how long VFX scripts take to load - FL Studio recompiles & reloads a script on every preset load & code edit.
+
+Every run compiles the script source & executes the module - timed together, as FL does both on every load -
+then builds its dialog.
+
+Example:
+    python Tools/load_time.py Python_Scripts/KeyMod.py Python_Scripts/Harmonize.py Python_Scripts/Harp.py --runs 50
+"""
+import argparse
+import os
+import time
+import types
+
+from vfx_host import vfx
+
+STAGES = ("compile+execute", "createDialog")
+
+
+def load_once(path, source, ppq=96):
+    """Load a script from source like FL does - returns {stage: seconds}"""
+    vfx.context.reset(ppq=ppq)
+    seconds = {}
+    script = types.ModuleType(os.path.splitext(os.path.basename(path))[0])
+    script.__file__ = path
+    start = time.perf_counter()
+    exec(compile(source, path, "exec"), script.__dict__)
+    seconds["compile+execute"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vfx.context.form = script.createDialog()
+    seconds["createDialog"] = time.perf_counter() - start
+    return seconds
+
+
+def measure_load(path, runs=20, ppq=96):
+    """Load a script `runs` times - returns {stage: [seconds per run]}, with a "total" stage"""
+    with open(path, encoding="utf-8") as script_file:
+        source = script_file.read()
+    timings = {stage: [] for stage in (*STAGES, "total")}
+    for _ in range(runs):
+        seconds = load_once(path, source, ppq)
+        for stage in STAGES:
+            timings[stage].append(seconds[stage])
+        timings["total"].append(sum(seconds.values()))
+    return timings
+
+
+def print_timings(path, timings):
+    print(f"{path}: {len(timings['total'])} loads")
+    for stage, seconds in timings.items():
+        average_ms = sum(seconds) / len(seconds) * 1e3
+        print(f"  {stage:>15}: {average_ms:7.2f}ms average, {min(seconds) * 1e3:7.2f}ms min, "
+              f"{max(seconds) * 1e3:7.2f}ms max")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scripts", nargs="+", help="Paths to KeyMod.py, Harmonize.py or Harp.py")
+    parser.add_argument("--runs", type=int, default=20, help="Loads per script")
+    parser.add_argument("--ppq", type=int, default=96, help="Ticks per quarter note")
+    args = parser.parse_args()
+    for path in args.scripts:
+        print_timings(path, measure_load(path, runs=args.runs, ppq=args.ppq))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Minimal Standard MIDI File reader & streaming writer - notes & tempo map only, no dependencies.
+
+Reads format 0 & 1 files into paired notes, and writes format 0 files event by event as they are produced,
+patching the track length when the file is closed.
+"""
+import struct
+from dataclasses import dataclass
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+META = 0xFF
+SYSEX = 0xF0
+SYSEX_ESCAPE = 0xF7
+META_END_OF_TRACK = 0x2F
+KEPT_META_TYPES = (0x51, 0x58, 0x59)  # Tempo, time signature & key signature - copied to rendered files
+CHANNEL_DATA_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+
+
+class MidiFileError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class MidiNote:
+    """A paired note - start time & length in ticks, velocity in 0-1 like VFX voices"""
+    time: int
+    length: int
+    note: int
+    velocity: float
+    channel: int = 0
+
+
+@dataclass
+class MidiScore:
+    ppq: int
+    notes: list[MidiNote]
+    meta_events: list[tuple[int, int, bytes]]  # (tick, meta type, data)
+
+
+def _read_variable_length(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    while True:
+        if pos >= len(data):
+            raise MidiFileError("Truncated variable length value")
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def _encode_variable_length(value: int) -> bytes:
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(encoded))
+
+
+def _iter_chunks(data: bytes):
+    pos = 0
+    while pos + 8 <= len(data):
+        chunk_type, length = struct.unpack(">4sI", data[pos:pos + 8])
+        yield chunk_type, data[pos + 8:pos + 8 + length]
+        pos += 8 + length
+
+
+def _read_track(track: bytes, notes: list[MidiNote], meta_events: list):
+    """Pair every note on with the first open note off of its channel & pitch.
+    Notes ending on the tick they start are kept as 1 tick notes."""
+    open_notes: dict[tuple[int, int], list[tuple[int, float]]] = {}
+    tick = 0
+    pos = 0
+    status = 0
+    while pos < len(track):
+        delta, pos = _read_variable_length(track, pos)
+        tick += delta
+        if track[pos] & 0x80:
+            status = track[pos]
+            pos += 1
+        elif not status:
+            raise MidiFileError("Running status without a previous status byte")
+
+        if status == META:
+            meta_type = track[pos]
+            length, pos = _read_variable_length(track, pos + 1)
+            if meta_type in KEPT_META_TYPES:
+                meta_events.append((tick, meta_type, track[pos:pos + length]))
+            pos += length
+            if meta_type == META_END_OF_TRACK:
+                break
+            continue
+        if status in (SYSEX, SYSEX_ESCAPE):
+            length, pos = _read_variable_length(track, pos)
+            pos += length
+            continue
+
+        kind, channel = status & 0xF0, status & 0x0F
+        data = track[pos:pos + CHANNEL_DATA_LENGTHS[kind]]
+        pos += CHANNEL_DATA_LENGTHS[kind]
+        if kind == NOTE_ON and data[1]:
+            open_notes.setdefault((channel, data[0]), []).append((tick, data[1] / 127))
+        elif kind in (NOTE_ON, NOTE_OFF) and open_notes.get((channel, data[0])):
+            start, velocity = open_notes[(channel, data[0])].pop(0)
+            notes.append(MidiNote(time=start, length=max(tick - start, 1), note=data[0], velocity=velocity, channel=channel))
+
+    for (channel, note), starts in open_notes.items():  # Notes never released end with their track
+        notes.extend(MidiNote(time=start, length=max(tick - start, 1), note=note, velocity=velocity, channel=channel)
+                     for start, velocity in starts)
+
+
+def read_midi_file(path) -> MidiScore:
+    with open(path, "rb") as midi_file:
+        data = midi_file.read()
+    chunks = list(_iter_chunks(data))
+    if not chunks or chunks[0][0] != b"MThd":
+        raise MidiFileError(f"{path} is not a Standard MIDI File")
+    _, _, division = struct.unpack(">HHH", chunks[0][1][:6])
+    if division & 0x8000:
+        raise MidiFileError(f"{path} uses SMPTE time division, only ticks per quarter note are supported")
+
+    notes: list[MidiNote] = []
+    meta_events: list[tuple[int, int, bytes]] = []
+    for chunk_type, track in chunks[1:]:
+        if chunk_type == b"MTrk":
+            _read_track(track, notes, meta_events)
+    notes.sort(key=lambda n: (n.time, n.note))
+    meta_events.sort(key=lambda event: event[0])
+    return MidiScore(ppq=division, notes=notes, meta_events=meta_events)
+
+
+class MidiFileWriter:
+    """Write a format 0 file one event at a time - events must come in tick order.
+    Notes still sounding on close are ended on the last tick."""
+
+    def __init__(self, path, ppq: int, channel: int = 0):
+        self.path = path
+        self.ppq = ppq
+        self.channel = channel
+        self.notes_written = 0
+        self._file = None
+        self._track_start = 0
+        self._tick = 0
+        self._sounding: dict[int, int] = {}  # note -> note ons without a note off yet
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(struct.pack(">4sIHHH", b"MThd", 6, 0, 1, self.ppq))
+        self._file.write(b"MTrk\0\0\0\0")  # Length is patched on close
+        self._track_start = self._file.tell()
+
+    def _write_event(self, tick: int, event: bytes):
+        tick = max(tick, self._tick)
+        self._file.write(_encode_variable_length(tick - self._tick) + event)
+        self._tick = tick
+
+    def meta(self, tick: int, meta_type: int, data: bytes):
+        self._write_event(tick, bytes((META, meta_type)) + _encode_variable_length(len(data)) + data)
+
+    def note_on(self, tick: int, note: int, velocity: float):
+        note = max(0, min(int(note), 127))
+        midi_velocity = max(1, min(round(velocity * 127), 127))
+        self._write_event(tick, bytes((NOTE_ON | self.channel, note, midi_velocity)))
+        self._sounding[note] = self._sounding.get(note, 0) + 1
+        self.notes_written += 1
+
+    def note_off(self, tick: int, note: int):
+        note = max(0, min(int(note), 127))
+        if not self._sounding.get(note):
+            return
+        self._sounding[note] -= 1
+        self._write_event(tick, bytes((NOTE_OFF | self.channel, note, 0)))
+
+    def close(self):
+        if self._file is None:
+            return
+        for note, count in self._sounding.items():
+            for _ in range(count):
+                self._write_event(self._tick, bytes((NOTE_OFF | self.channel, note, 0)))
+        self._sounding.clear()
+        self._write_event(self._tick, bytes((META, META_END_OF_TRACK, 0)))
+        track_length = self._file.tell() - self._track_start
+        self._file.seek(self._track_start - 4)
+        self._file.write(struct.pack(">I", track_length))
+        self._file.close()
+        self._file = None
@@ -0,0 +1,96 @@
+"""Load a VFX script against the headless flvfx stand-in & drive its callbacks the way FL Studio does."""
+import heapq
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import flvfx as vfx  # noqa: E402 - the stand-in has to be importable before any script loads
+
+_loaded_scripts = 0
+
+
+def load_script(path, ppq=96, params=None):
+    """Import a script as a fresh module, build its dialog & apply {control name: value} params"""
+    global _loaded_scripts
+    vfx.context.reset(ppq=ppq)
+    _loaded_scripts += 1
+    module_name = f"vfx_script_{_loaded_scripts}_{os.path.splitext(os.path.basename(path))[0]}"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    vfx.context.form = script.createDialog()
+    for name, value in (params or {}).items():
+        vfx.context.form.setInputValue(name, value)
+    return script
+
+
+def parse_params(param_strings):
+    """["Group: Control=value", ...] -> {"Group: Control": value}"""
+    params = {}
+    for param in param_strings or []:
+        name, _, value = param.rpartition("=")
+        params[name.strip()] = float(value)
+    return params
+
+
+class VFXHost:
+    """Feed notes into a loaded script, tick it, time every callback & record what it sends to the MIDI output"""
+
+    def __init__(self, script, slowest_size=10):
+        self.script = script
+        self.output_events = []  # (tick, 'on'/'off', note, velocity)
+        self.record_output = True
+        self.callback_counts = {"onTriggerVoice": 0, "onReleaseVoice": 0, "onTick": 0}
+        self.callback_seconds = {"onTriggerVoice": 0.0, "onReleaseVoice": 0.0, "onTick": 0.0}
+        self.slowest_size = slowest_size
+        self.slowest_callbacks = []  # min-heap of (seconds, callback name, tick)
+        self.peak_voices = 0
+        self._on_tick = getattr(script, "onTick", None)
+        vfx.context.listeners.append(self)
+
+    @property
+    def tick(self):
+        return vfx.context.ticks
+
+    def on_voice_trigger(self, voice):
+        if self.record_output:
+            self.output_events.append((self.tick, "on", int(voice.note), voice.velocity))
+        self.peak_voices = max(self.peak_voices, vfx.context.voice_count)
+
+    def on_voice_release(self, voice):
+        if self.record_output:
+            self.output_events.append((self.tick, "off", int(voice.note), voice.velocity))
+
+    def _timed(self, name, callback, *args):
+        start = time.perf_counter()
+        callback(*args)
+        seconds = time.perf_counter() - start
+        self.callback_counts[name] += 1
+        self.callback_seconds[name] += seconds
+        entry = (seconds, name, self.tick)
+        if len(self.slowest_callbacks) < self.slowest_size:
+            heapq.heappush(self.slowest_callbacks, entry)
+        elif seconds > self.slowest_callbacks[0][0]:
+            heapq.heapreplace(self.slowest_callbacks, entry)
+
+    def note_on(self, note, velocity=0.8):
+        voice = vfx.Voice()
+        voice.note = float(note)
+        voice.velocity = velocity
+        self._timed("onTriggerVoice", self.script.onTriggerVoice, voice)
+        return voice
+
+    def note_off(self, voice):
+        self._timed("onReleaseVoice", self.script.onReleaseVoice, voice)
+
+    def advance(self, ticks=1):
+        for _ in range(ticks):
+            vfx.context.ticks += 1
+            if self._on_tick is not None:
+                self._timed("onTick", self._on_tick)
+
+    @property
+    def live_voices(self):
+        return vfx.context.voice_count